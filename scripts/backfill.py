@@ -0,0 +1,175 @@
+'''
+File: backfill.py
+Downloads the complete history of Chainlink and Tellor feeds into the local store, in parallel and resumably
+
+Notes:
+- Run with: python -m scripts.backfill [--pairs BTC/USD] [--oracles chainlink tellor] [--workers 8]
+- A Chainlink feed is split per phase into ranges of RANGE_SIZE round IDs, a Tellor request ID into ranges
+  of value indices. Ranges start at fixed multiples of RANGE_SIZE from the first round, so their keys stay
+  the same as new rounds arrive. Rounds already in the store are left out, so a range only fetches what is missing
+- Ranges run newest first on a process pool. Each worker writes what it fetched to a checkpoint file in
+  CHECKPOINT_DIR; the main process merges the file into the store, deletes it, and marks the range done in
+  the manifest once every round in it is stored or known not to exist. Only the main process writes to the store
+- Workers are spawned rather than forked, so none of them inherits the main process's open connections.
+  Each one has its own endpoint pool, so each is given an equal share of rpcpool.RATE
+- An interrupted run resumes where it stopped: checkpoints left behind are merged first, and ranges in the
+  manifest are skipped. Rows that can still change (see each module's is_final) are not stored
+'''
+
+''' Libraries '''
+import argparse
+import concurrent.futures
+import glob
+import gzip
+import json
+import multiprocessing
+import os
+import scripts.chainlink
+import scripts.helpers.catalog
+import scripts.helpers.contract
+import scripts.helpers.store
+import scripts.tellor
+
+''' Constants '''
+ORACLES = ['chainlink', 'tellor'] # Oracles with on-chain history to walk
+RANGE_SIZE = 2000 # Round IDs (or value indices) per range, and per checkpoint file
+WORKERS = 8 # Processes fetching ranges at once
+CHECKPOINT_DIR = 'data/backfill' # Where checkpoints and the manifest live
+
+def store_key(oracle, pair):
+    '''
+    Returns (oracle module, feed name in the store) for a pair
+    '''
+    if oracle == 'chainlink':
+        return scripts.chainlink, scripts.chainlink.feed_address(pair).lower()
+    return scripts.tellor, str(scripts.tellor.feed_id(pair))
+
+def partition(oracle, pair, size=RANGE_SIZE):
+    '''
+    Splits the whole history of a feed into [first, last] ranges of round IDs or indices, newest first.
+    Ranges start at low + k * size, so only the newest one changes as the feed grows
+    '''
+    ranges = []
+    if oracle == 'chainlink':
+        for phase, low, high in scripts.chainlink.get_phase_ranges(scripts.chainlink.feed_address(pair)):
+            offset = phase << scripts.chainlink.PHASE_OFFSET
+            for first in reversed(range(low, high + 1, size)):
+                ranges.append([offset + first, offset + min(first + size - 1, high)])
+    else:
+        last = scripts.tellor.get_index_range(scripts.tellor.feed_id(pair), 0)[1]
+        for first in reversed(range(0, last + 1, size)):
+            ranges.append([first, min(first + size - 1, last)])
+    return ranges
+
+def init_worker(rate):
+    '''
+    Runs in each worker before its first range: the endpoints' rate limit is shared between workers
+    '''
+    scripts.helpers.contract.RPC_RATE = rate
+
+def fetch_range(oracle, pair, round_ids, path):
+    '''
+    Worker: fetches round_ids of a feed and writes them to the checkpoint at path. Returns path.
+    Rounds that revert are left out of the rows, which tells merge() they do not exist
+    '''
+    if oracle == 'chainlink':
+        rows = scripts.chainlink.fetch_rounds(scripts.chainlink.feed_address(pair), round_ids, allow_failure=True)
+    else:
+        rows = scripts.tellor.fetch_rows(scripts.tellor.feed_id(pair), round_ids)
+    with gzip.open(path + '.tmp', 'wt') as f:
+        json.dump({'oracle': oracle, 'pair': pair, 'round_ids': list(round_ids), 'rows': [list(row) for row in rows if row is not None]}, f)
+    os.replace(path + '.tmp', path)
+    return path
+
+def merge(path):
+    '''
+    Saves the final rows of a checkpoint into the store and deletes it. Returns (rows saved, rows left
+    out because they can still change); a range is complete when the second is 0
+    '''
+    with gzip.open(path, 'rt') as f:
+        data = json.load(f)
+    module, feed = store_key(data['oracle'], data['pair'])
+    rows = [row for row in data['rows'] if module.is_final(row)]
+    scripts.helpers.store.save_rounds(module.STORE_NAME, feed, rows)
+    os.remove(path)
+    return len(rows), len(data['rows']) - len(rows)
+
+def read_manifest(checkpoint_dir):
+    path = os.path.join(checkpoint_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def write_manifest(checkpoint_dir, manifest):
+    path = os.path.join(checkpoint_dir, 'manifest.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+def run(pairs=None, oracles=ORACLES, workers=WORKERS, size=RANGE_SIZE, checkpoint_dir=CHECKPOINT_DIR):
+    '''
+    Backfills every oracle's full history of pairs (every catalog pair by default). Returns the rows saved
+    '''
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    saved = 0
+
+    # Whatever an interrupted run fetched but never merged goes in first
+    for path in glob.glob(os.path.join(checkpoint_dir, '*.json.gz')):
+        saved += merge(path)[0]
+    manifest = read_manifest(checkpoint_dir)
+
+    # Work out what each range is still missing
+    jobs = []
+    for oracle in oracles:
+        for pair in (pairs if pairs is not None else scripts.helpers.catalog.pairs(oracle)):
+            if not scripts.helpers.catalog.supports(pair, oracle):
+                continue
+            module, feed = store_key(oracle, pair)
+            for first, last in partition(oracle, pair, size):
+                key = oracle + ':' + feed + ':' + str(first) + '-' + str(last)
+                if manifest.get(key) == 'done':
+                    continue
+                stored = {row[0] for row in scripts.helpers.store.load_range(module.STORE_NAME, feed, first, last)}
+                missing = [round_id for round_id in range(last, first - 1, -1) if round_id not in stored]
+                if not missing:
+                    manifest[key] = 'done'
+                    continue
+                path = os.path.join(checkpoint_dir, oracle + '-' + feed + '-' + str(first) + '-' + str(last) + '.json.gz')
+                jobs.append([key, oracle, pair, missing, path])
+    write_manifest(checkpoint_dir, manifest)
+    print(str(len(jobs)) + ' ranges to fetch')
+
+    import scripts.helpers.rpcpool
+    rate = scripts.helpers.rpcpool.RATE / max(min(workers, len(jobs)), 1)
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                      initializer=init_worker, initargs=(rate,))
+    futures = {executor.submit(fetch_range, *job[1:]): job for job in jobs}
+    try:
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            key = futures[future][0]
+            if future.exception() is not None:
+                print(key + ': failed (' + repr(future.exception()) + '), left for the next run')
+                continue
+            count, pending = merge(future.result())
+            saved += count
+            if pending == 0:
+                manifest[key] = 'done'
+                write_manifest(checkpoint_dir, manifest)
+            print(key + ': ' + str(count) + ' rows' + (', ' + str(pending) + ' not final yet' if pending else '')
+                  + ' (' + str(done) + '/' + str(len(jobs)) + ')')
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+    return saved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Download the full history of Chainlink and Tellor feeds into the local store')
+    parser.add_argument('--pairs', nargs='+', default=None, help='Pairs to backfill (default: every catalog pair the oracle serves)')
+    parser.add_argument('--oracles', nargs='+', default=ORACLES, choices=ORACLES, help='Oracles to backfill')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Processes fetching ranges at once')
+    parser.add_argument('--range-size', type=int, default=RANGE_SIZE, help='Round IDs or indices per range')
+    parser.add_argument('--checkpoints', default=CHECKPOINT_DIR, help='Folder for checkpoints and the manifest')
+    args = parser.parse_args()
+    print(str(run(args.pairs, args.oracles, args.workers, args.range_size, args.checkpoints)) + ' rows saved')
@@ -4,6 +4,7 @@ Getting data from the Band Protocol network
 '''
 
 ''' Libraries '''
+import scripts.helpers.catalog
 import scripts.helpers.contract
 
 ''' Constants '''
@@ -12,7 +13,7 @@ bases = ['BTC', 'ETH'] # For base of conversion
 converts = ['USD', 'ETH'] # For what is going to be converted into
 
 ''' Smart Contract Set-Up '''
-band_contract = scripts.helpers.contract.get_contract('contracts/bandchain.json', '0xDA7a001b254CD22e46d3eAB04d937489c93174C3')
+band_contract = scripts.helpers.contract.LazyContract('contracts/bandchain.json', '0xDA7a001b254CD22e46d3eAB04d937489c93174C3')
 
 """
 Function: get_values()
@@ -35,12 +36,56 @@ def return_prices(coin):
    '''
    return band_contract.functions.getReferenceData(str(coin), 'USD').call()[0] / granularity
 
-def grab_gas_estimate(coin_name):
+def snapshot(feeds=None):
+   '''
+   Returns the latest value of each pair (e.g. 'BTC/USD', all catalog pairs by default) as
+   rows of {'oracle', 'pair', 'price', 'timestamp'}, using a single getReferenceDataBulk call.
+   Pairs without a Band symbol in the catalog get a price of None without being asked for.
+   If any other pair is not supported the bulk call reverts, so pairs are then batched one
+   by one and the unsupported ones get a price of None too
+   '''
+   if feeds is None:
+      feeds = scripts.helpers.catalog.pairs('band')
+   served = [pair for pair in feeds if scripts.helpers.catalog.supports(pair, 'band')]
+   bases = [scripts.helpers.catalog.lookup(pair, 'band')['symbol'] for pair in served]
+   quotes = [pair.split('/')[1] for pair in served]
+   results = []
+   if served:
+      try:
+         results = band_contract.functions.getReferenceDataBulk(bases, quotes).call()
+      except ValueError:
+         calls = [band_contract.functions.getReferenceData(base, quote) for base, quote in zip(bases, quotes)]
+         results = scripts.helpers.contract.batch_call(calls, allow_failure=True)
+   by_pair = dict(zip(served, results))
+   rows = []
+   for pair in feeds:
+      result = by_pair.get(pair)
+      if result is None:
+         rows.append({'oracle': 'Band', 'pair': pair, 'price': None, 'timestamp': None})
+      else:
+         rows.append({'oracle': 'Band', 'pair': pair, 'price': result[0] / granularity, 'timestamp': result[1]})
+   return rows
+
+def gas_paths(feeds):
+   '''
+   Read paths of feeds for the gas profile: getReferenceData of each feed, and (for more
+   than one feed) one getReferenceDataBulk call covering all of them
+   '''
+   bases = [scripts.helpers.catalog.lookup(pair, 'band')['symbol'] for pair in feeds]
+   quotes = [pair.split('/')[1] for pair in feeds]
+   paths = [{'function': 'getReferenceData', 'pairs': [pair], 'values': 1, 'call': band_contract.functions.getReferenceData(base, quote)}
+            for pair, base, quote in zip(feeds, bases, quotes)]
+   if len(feeds) > 1:
+      paths.append({'function': 'getReferenceDataBulk', 'pairs': list(feeds), 'values': len(feeds), 'call': band_contract.functions.getReferenceDataBulk(bases, quotes)})
+   return paths
+
+def grab_gas_estimate(pair):
    '''
    Gets the estimate of gas from pulling info from one data 
-   point from the oracle.
+   point (a catalog pair, e.g. 'BTC/USD') from the oracle.
    '''
-   return band_contract.functions.getReferenceData(str(coin_name), 'USD').estimateGas()
+   symbol = scripts.helpers.catalog.lookup(pair, 'band')['symbol']
+   return scripts.helpers.contract.batch_estimate([band_contract.functions.getReferenceData(symbol, pair.split('/')[1])])[0]
 
 if __name__ == "__main__":
    '''
@@ -4,18 +4,30 @@ Retrieves necessary data and prices from Chainlink!
 
 Notes:
 - Round Data format = [roundId, answer, startedAt, updatedAt, answeredInRound, decimals]
+- Proxy round IDs are (phaseId << 64) | aggregator round ID, and aggregator rounds start at 1 in every phase
 '''
 
 ''' Libraries necessary for development '''
-from datetime import datetime, timedelta
+from datetime import datetime
 import math
+import scripts.helpers.cassette
+import scripts.helpers.catalog
 import scripts.helpers.contract
+import scripts.helpers.logs
+import scripts.helpers.series
+import scripts.helpers.store
+import scripts.helpers.stream
 
 ''' Constants '''
-REF_PATH = 'feeds/chainlink.json' # Path for external data
 NUM_VALS = 100 # Number of past values to grab for looking at history
 TIME_CHANGE = 20 # Number of time changes to look at
 DAYS_BACK = 8 # Number of days to look in past
+BATCH_SIZE = scripts.helpers.contract.BATCH_SIZE # Number of rounds fetched per batched request
+ABI_PATH = 'contracts/chainlink.json' # ABI shared by proxies and their phase aggregators
+PHASE_OFFSET = 64 # Bits the phase ID is shifted by inside a proxy round ID
+SEARCH_FANOUT = 16 # Timestamps probed per batched request while searching for a round
+STORE_NAME = 'chainlink' # Oracle name for rounds kept in the local store
+INGEST_SIZE = 1000 # Rounds decoded from event logs before they are written to the store
 
 def calculate_price(price, decimals):
     '''
@@ -24,101 +36,338 @@ def calculate_price(price, decimals):
     '''
     return float(price) / (10 ** decimals)
 
+def feed_address(pair):
+    '''
+    Proxy address of a pair's feed, from the feed catalog
+    '''
+    return scripts.helpers.catalog.lookup(pair, 'chainlink')['address']
+
 def get_chainlink_data(address):
     '''
     Grabs the value of all Chainlink Data for the latest round
     '''
-    contract = scripts.helpers.contract.get_contract('contracts/chainlink.json', address)
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
     num_decimals = contract.functions.decimals().call()
     latestData = contract.functions.latestRoundData().call()
     latestData.append(num_decimals)
     return latestData
 
+def snapshot(feeds=None):
+    '''
+    Grabs the latest value of every feed (all of them by default) in one batched request,
+    as rows of {'oracle', 'pair', 'price', 'timestamp'}
+    '''
+    if feeds is None:
+        feeds = scripts.helpers.catalog.pairs('chainlink')
+    calls = []
+    for pair in feeds:
+        contract = scripts.helpers.contract.get_contract(ABI_PATH, feed_address(pair))
+        calls += [contract.functions.decimals(), contract.functions.latestRoundData()]
+    results = scripts.helpers.contract.batch_call(calls)
+    rows = []
+    for i, pair in enumerate(feeds):
+        decimals, roundData = results[2 * i], results[2 * i + 1]
+        rows.append({'oracle': 'Chainlink', 'pair': pair, 'price': calculate_price(roundData[1], decimals), 'timestamp': roundData[3]})
+    return rows
+
 def grab_feeds():
     '''
     Grabs all of the existing data feeds, and then parses the JSON
     to get all of the addresses
     '''
-    prices = []
-    data = scripts.helpers.contract.reference_data(REF_PATH)
-    for elem in data:
-        roundData = get_chainlink_data(data[elem]['address'])
-        prices.append(calculate_price(roundData[1], roundData[5]))
-    return prices
+    return [row['price'] for row in snapshot()]
+
+def fetch_rounds(address, round_ids, chunk_size=BATCH_SIZE, allow_failure=False):
+    '''
+    Get data from many rounds straight from the chain, sending chunk_size rounds per batched request.
+    With allow_failure, rounds that revert come back as None. Final rounds stay in the eth_call cache
+    '''
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
+    calls = [contract.functions.getRoundData(roundId) for roundId in round_ids]
+    return scripts.helpers.contract.batch_call(calls, chunk_size, allow_failure, final=lambda function, roundData: is_final(roundData))
+
+def is_final(roundData):
+    '''
+    A round can no longer change once it has been answered in its own round
+    '''
+    return roundData[3] != 0 and roundData[0] == roundData[4]
+
+def grab_rounds(address, round_ids, chunk_size=BATCH_SIZE):
+    '''
+    Get data from many rounds at once. Rounds already in the local store are read from
+    disk, and only the rest are fetched (and saved once final)
+    '''
+    fetch = lambda missing: fetch_rounds(address, missing, chunk_size)
+    return scripts.helpers.store.read_through(STORE_NAME, address.lower(), round_ids, fetch, is_final)
+
+def sync_history(address, num_rounds):
+    '''
+    Brings the local store up to date for the last num_rounds rounds of a feed, only fetching
+    rounds newer than the newest one already stored, and returns the latest round data.
+    Rounds that are not final yet are kept as the feed's recent rows
+    '''
+    roundData = get_chainlink_data(address)
+    oldest = max(roundData[0] - num_rounds, (roundData[0] >> PHASE_OFFSET) << PHASE_OFFSET)
+    high_water_mark = scripts.helpers.store.high_water_mark(STORE_NAME, address.lower())
+    if high_water_mark is not None:
+        oldest = max(oldest, high_water_mark)
+    rounds = grab_rounds(address, range(roundData[0], oldest, -1))
+    scripts.helpers.store.save_recent(STORE_NAME, address.lower(), [elem for elem in rounds if not is_final(elem)])
+    return roundData
+
+def ingest_logs(address, from_block, to_block='latest', phase=None):
+    '''
+    Fills the local store from the AnswerUpdated/NewRound events of a feed's aggregator
+    (the current phase by default) between two blocks, instead of reading rounds one view
+    call at a time. Returns the number of rounds stored
+    '''
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
+    if phase is None:
+        phase = contract.functions.phaseId().call()
+    aggregator = scripts.helpers.contract.get_contract(ABI_PATH, contract.functions.phaseAggregators(phase).call())
+    offset = phase << PHASE_OFFSET
+    events = [aggregator.events.AnswerUpdated, aggregator.events.NewRound]
+
+    # Events come back oldest first, so later answers for a round replace earlier ones
+    started = {}
+    rows = []
+    total = 0
+    for event in scripts.helpers.logs.get_events(events, aggregator.address, from_block, to_block):
+        round_id = offset + event['args']['roundId']
+        if event['event'] == 'NewRound':
+            started[round_id] = event['args']['startedAt']
+            continue
+        updated = event['args']['updatedAt']
+        rows.append([round_id, event['args']['current'], started.get(round_id, updated), updated, round_id])
+        if len(rows) >= INGEST_SIZE:
+            scripts.helpers.store.save_rounds(STORE_NAME, address.lower(), rows)
+            total += len(rows)
+            rows = []
+    scripts.helpers.store.save_rounds(STORE_NAME, address.lower(), rows)
+    return total + len(rows)
+
+def sync_logs(address, num_of_days):
+    '''
+    Ingests the current phase's rounds of a feed from event logs since the last sync (at least
+    num_of_days back). Returns the number of rounds stored
+    '''
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
+    phase = contract.functions.phaseId().call()
+    aggregator = contract.functions.phaseAggregators(phase).call().lower()
+    blocks = scripts.helpers.logs.pending_range(STORE_NAME, aggregator, num_of_days)
+    if blocks is None:
+        return 0
+    count = ingest_logs(address, blocks[0], blocks[1], phase)
+    scripts.helpers.store.save_log_mark(STORE_NAME, aggregator, blocks[1])
+    return count
 
 def grab_round(address, roundId):
     '''
     Get data from a specific round
     '''
-    contract = scripts.helpers.contract.get_contract('contracts/chainlink.json', address)
-    return contract.functions.getRoundData(roundId).call()
+    return grab_rounds(address, [roundId])[0]
 
 def grab_price_change(exchange):
     '''
     Grab last NUM_VALS rounds of chainlink data for a specific exchange
     '''
-    all_prices = []
-    data = scripts.helpers.contract.reference_data(REF_PATH)
-    roundData = get_chainlink_data(data[exchange]['address'])
-    all_prices.append(calculate_price(roundData[1], roundData[5]))
-    for i in range(0, NUM_VALS - 1):
-            roundData = grab_round(data[exchange]['address'], roundData[0] - 1)
-            all_prices.append(calculate_price(roundData[1], roundData[5]))
+    address = feed_address(exchange)
+    roundData = get_chainlink_data(address)
+    decimals = roundData[5]
+    rounds = [roundData] + grab_rounds(address, range(roundData[0] - 1, roundData[0] - NUM_VALS, -1))
+    all_prices = [calculate_price(elem[1], decimals) for elem in rounds]
     return all_prices[::-1]
 
-def get_better_price(exchange, number_values, num_of_days):
+def get_phase_ranges(address):
     '''
-    Get the change in price over a certain amount of time!
+    Returns [phaseId, first round, last round] for every phase of a proxy, newest phase first
     '''
-    all_prices = []
-    data = scripts.helpers.contract.reference_data(REF_PATH)
-    old_date = datetime.timestamp(datetime.now() - timedelta(days=num_of_days)) # Number of days to look back
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
+    latest_round = contract.functions.latestRoundData().call()[0]
+    phase = latest_round >> PHASE_OFFSET
+    ranges = [[phase, 1, latest_round - (phase << PHASE_OFFSET)]]
 
-    # Get current data
-    roundData = get_chainlink_data(data[exchange]['address'])
-    decimals = roundData[5]
-    all_prices.append(calculate_price(roundData[1], decimals))
-    while (old_date < roundData[2]):
-        roundData = grab_round(data[exchange]['address'], roundData[0] - 1)
-        all_prices.append(calculate_price(roundData[1], decimals))
-    
-    # Cuts down number of values to appropriate amount to display
-    round_factor = math.floor(len(all_prices) / number_values)
-    if len(all_prices) < number_values:
-        round_factor = number_values
-    all_prices = all_prices[::round_factor]
-    last_offset = abs(len(all_prices) - number_values)
-    return all_prices[last_offset:]
+    # Older phases live in their own aggregators, so ask each one for its last round
+    old_phases = list(range(phase - 1, 0, -1))
+    aggregators = scripts.helpers.contract.batch_call([contract.functions.phaseAggregators(elem) for elem in old_phases])
+    calls = [scripts.helpers.contract.get_contract(ABI_PATH, elem).functions.latestRound() for elem in aggregators]
+    for old_phase, last_round in zip(old_phases, scripts.helpers.contract.batch_call(calls)):
+        ranges.append([old_phase, 1, last_round])
+    return ranges
+
+def locate_round(address, timestamp, ranges=None):
+    '''
+    Finds the last round updated at or before timestamp, searching across phases. Each step
+    probes SEARCH_FANOUT rounds in one batch, so this costs O(log n) requests rather than O(n)
+    '''
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
+    if ranges is None:
+        ranges = get_phase_ranges(address)
+    for phase, low, high in ranges:
+        offset = phase << PHASE_OFFSET
+        if contract.functions.getTimestamp(offset + low).call() > timestamp:
+            continue
+
+        # Invariant: round low is at or before timestamp, and every round after high is past it
+        while low < high:
+            probes = sorted(set(low + math.ceil((high - low) * (i + 1) / SEARCH_FANOUT) for i in range(SEARCH_FANOUT)))
+            calls = [contract.functions.getTimestamp(offset + elem) for elem in probes]
+            for probe, probe_time in zip(probes, scripts.helpers.contract.batch_call(calls)):
+                if (probe_time == 0 or probe_time > timestamp):
+                    high = probe - 1
+                    break
+                low = probe
+        return offset + low
+
+    # Everything on record is newer than timestamp, so start from the very first round
+    phase, low, high = ranges[-1]
+    return (phase << PHASE_OFFSET) + low
+
+def sample_rounds(ranges, start_round, number_values):
+    '''
+    Picks number_values evenly spaced round IDs between start_round and the latest round
+    of the phase ranges, newest first. number_values=None keeps every round, and 1 the latest
+    '''
+    all_rounds = []
+    for phase, low, high in ranges:
+        offset = phase << PHASE_OFFSET
+        if (start_round >> PHASE_OFFSET) > phase:
+            break
+        if (start_round >> PHASE_OFFSET) == phase:
+            low = start_round - offset
+        all_rounds.append(range(offset + high, offset + low - 1, -1))
+
+    # Index into the phases as if they were a single list of rounds
+    total = sum(len(elem) for elem in all_rounds)
+    if number_values is None or total <= number_values:
+        positions = range(0, total)
+    elif number_values <= 1:
+        positions = range(0, max(number_values, 0)) # No spacing to spread over: the newest round, if any
+    else:
+        positions = sorted(set(round(i * (total - 1) / (number_values - 1)) for i in range(number_values)))
+    sampled = []
+    for position in positions:
+        for elem in all_rounds:
+            if position < len(elem):
+                sampled.append(elem[position])
+                break
+            position -= len(elem)
+    return sampled
+
+def iter_rounds(address, start_round=None, chunk_size=BATCH_SIZE):
+    '''
+    Yields round data newest first, starting at start_round (the latest round by default) and
+    crossing into older phases. Rounds are fetched chunk_size at a time, only as they are
+    consumed, so stopping early stops the walk
+    '''
+    ranges = get_phase_ranges(address)
+    if start_round is None:
+        start_round = (ranges[0][0] << PHASE_OFFSET) + ranges[0][2]
+    for phase, low, high in ranges:
+        offset = phase << PHASE_OFFSET
+        if (start_round >> PHASE_OFFSET) < phase:
+            continue
+        if (start_round >> PHASE_OFFSET) == phase:
+            high = min(high, start_round - offset)
+        for top in range(high, low - 1, -chunk_size):
+            round_ids = range(offset + top, offset + max(top - chunk_size, low - 1), -1)
+            for elem in grab_rounds(address, round_ids, chunk_size):
+                yield elem
+
+def iter_history(exchange, num_of_days, chunk_size=BATCH_SIZE):
+    '''
+    Yields the rounds of the last num_of_days newest first (plus the first round before the
+    window, like get_better_price used to), for the streaming helpers in stream.py
+    '''
+    old_date = scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60
+    return scripts.helpers.stream.until(iter_rounds(feed_address(exchange), None, chunk_size), old_date)
+
+def get_price_series(exchange, number_values, num_of_days, chunk_size=BATCH_SIZE):
+    '''
+    Get number_values evenly spaced rounds over the last num_of_days as a RoundSeries (every
+    round in the window when number_values is None). Only the sampled rounds are fetched
+    '''
+    address = feed_address(exchange)
+    old_date = scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60 # Number of days to look back
+    decimals = get_chainlink_data(address)[5]
+
+    # Locate the first round of the window, then grab only the rounds we display
+    ranges = get_phase_ranges(address)
+    start_round = locate_round(address, old_date, ranges)
+    round_ids = sample_rounds(ranges, start_round, number_values)
+    return scripts.helpers.series.RoundSeries.from_rows(grab_rounds(address, round_ids, chunk_size), decimals)
+
+def stored_decimals(exchange):
+    '''
+    Decimals of a feed as last saved by the collector, or None before its first sync
+    '''
+    values = scripts.helpers.store.load_values('decimals')
+    if (STORE_NAME, exchange) not in values:
+        return None
+    return int(values[(STORE_NAME, exchange)][0])
+
+def stored_series(exchange, rows):
+    '''
+    Stored rows as a RoundSeries; empty until the collector has saved the feed's decimals
+    '''
+    decimals = stored_decimals(exchange)
+    if decimals is None:
+        return scripts.helpers.series.RoundSeries.from_rows([], 0)
+    return scripts.helpers.series.RoundSeries.from_rows(rows, decimals)
+
+def read_price_series(exchange, num_of_days):
+    '''
+    Every round of the last num_of_days as a RoundSeries, read only from the local store
+    (which the collector keeps up to date). Empty when nothing was collected yet
+    '''
+    old_date = scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60
+    rows = scripts.helpers.store.load_since(STORE_NAME, feed_address(exchange).lower(), int(old_date))
+    return stored_series(exchange, rows)
+
+def get_better_price(exchange, number_values, num_of_days, chunk_size=BATCH_SIZE):
+    '''
+    Get the change in price over a certain amount of time! Prices come back newest first
+    '''
+    return get_price_series(exchange, number_values, num_of_days, chunk_size).prices[::-1].tolist()
+
+def get_time_series(exchange, num_rounds):
+    '''
+    Get the latest round and the num_rounds before it as a RoundSeries
+    '''
+    address = feed_address(exchange)
+    roundData = sync_history(address, num_rounds)
+    rounds = [roundData] + grab_rounds(address, range(roundData[0] - 1, roundData[0] - 1 - num_rounds, -1))
+    return scripts.helpers.series.RoundSeries.from_rows(rounds, roundData[5])
   
+def read_time_series(exchange, num_rounds):
+    '''
+    The latest round and the num_rounds before it, read only from the local store
+    '''
+    rows = scripts.helpers.store.load_newest(STORE_NAME, feed_address(exchange).lower(), num_rounds + 1)
+    return stored_series(exchange, rows)
+
 def grab_time_change(exchange, num_rounds):
     '''
     Grab the time in between each request for last TIME_VALUE rounds of chainlink data for an exchange
     '''
-    all_diffs = []
-    all_timestamps = []
-    old_timestamp = datetime.now()
-    new_timestamp = datetime.now()
-    data = scripts.helpers.contract.reference_data(REF_PATH)
-    roundData = get_chainlink_data(data[str(exchange)]['address'])
-    new_timestamp = datetime.utcfromtimestamp(roundData[3])
-    all_timestamps.append(datetime.fromtimestamp(roundData[3]))
-    for i in range(0, num_rounds):
-        roundData = grab_round(data[str(exchange)]['address'], roundData[0] - 1)
-        new_timestamp = datetime.utcfromtimestamp(roundData[3])
-        all_timestamps.append(datetime.fromtimestamp(roundData[3]))
-        time_diff = new_timestamp - old_timestamp
-        all_diffs.append(time_diff.seconds)
-        new_timestamp = old_timestamp
-    return all_diffs[::-1], all_timestamps[:num_rounds]
+    series = get_time_series(exchange, num_rounds)
+    all_timestamps = [datetime.fromtimestamp(int(elem)) for elem in series.timestamps[::-1]]
+    return series.intervals().tolist(), all_timestamps[:num_rounds]
+
+def gas_paths(feeds):
+    '''
+    Read paths of feeds for the gas profile: latestRoundData of each feed's proxy (there is no bulk read)
+    '''
+    return [{'function': 'latestRoundData', 'pairs': [pair], 'values': 1,
+             'call': scripts.helpers.contract.get_contract(ABI_PATH, feed_address(pair)).functions.latestRoundData()} for pair in feeds]
 
 def grab_gas_estimate(id_name):
     '''
     Grabs the gas estimate for getting the latest value of an exchange
     '''
-    data = scripts.helpers.contract.reference_data(REF_PATH)
-    address = (data[id_name]['address'])
-    contract = scripts.helpers.contract.get_contract('contracts/chainlink.json', address)
-    return (contract.functions.latestRoundData().estimateGas())
+    address = feed_address(id_name)
+    contract = scripts.helpers.contract.get_contract(ABI_PATH, address)
+    return scripts.helpers.contract.batch_estimate([contract.functions.latestRoundData()])[0]
 
 def print_info(name, roundId, answer, startedAt, updatedAt, answeredInRound, decimals):
     '''
@@ -0,0 +1,165 @@
+'''
+File: collector.py
+Long-running service that keeps the local store up to date, so the dashboard only reads from disk
+
+Notes:
+- Run with: python -m scripts.collector [--pairs BTC/USD ETH/USD] [--once]
+- One task per (oracle, pair): Tellor and Chainlink sync their round history and save their newest price,
+  Band and DIA save their latest snapshot, and DIA's on-chain updates are ingested from event logs every
+  LOGS_INTERVAL. Per-block gas data is synced every BLOCKS_INTERVAL, and the gas
+  profile of every collected pair's read paths (gasprofile.py) is saved every PROFILE_INTERVAL
+- Each task is polled on its own Cadence (cadence.py), learned from the update times it finds, so polls
+  bunch up around a feed's expected heartbeat and thin out while it is idle
+- The first poll of a history task backfills NUM_DAYS of rounds, which is what the dashboard can show
+- Polls run on the shared pipeline; a failed poll is logged and tried again after at least DEFAULT_INTERVAL
+- The RPC usage of every poll since the collector started is saved to metrics.SUMMARY_PATH every
+  METRICS_INTERVAL (and when a --once run ends), for the dashboard's "RPC usage" panel
+'''
+
+''' Libraries '''
+import argparse
+import concurrent.futures
+import heapq
+import time
+import scripts.chainlink
+import scripts.dia
+import scripts.gas
+import scripts.gasprofile
+import scripts.tellor
+import scripts.helpers.cadence
+import scripts.helpers.cassette
+import scripts.helpers.catalog
+import scripts.helpers.metrics
+import scripts.helpers.pipeline
+import scripts.helpers.store
+import scripts.sweep
+
+''' Constants '''
+NUM_DAYS = 30 # Days of history kept up to date (the dashboard's longest window)
+NUM_ROUNDS = 300 # Newest rounds synced on every poll (the dashboard's largest round count)
+HISTORY_ORACLES = ['tellor', 'chainlink'] # Oracles whose round history is synced
+SNAPSHOT_ORACLES = ['band', 'dia'] # Oracles only read for their latest value
+PROFILE_INTERVAL = 3600 # Seconds between two gas profiles
+BLOCKS_INTERVAL = 60 # Seconds between two syncs of per-block gas data
+LOGS_INTERVAL = 300 # Seconds between two ingestions of DIA's event logs
+INTERVALS = {'profile': PROFILE_INTERVAL, 'blocks': BLOCKS_INTERVAL, 'logs': LOGS_INTERVAL} # Task kinds polled on a fixed schedule
+TIMEOUT = 600 # Seconds a single poll (including its backfill) may take
+METRICS_INTERVAL = 60 # Seconds between two saves of the RPC usage summary
+
+''' Shared state '''
+_backfilled = set() # History tasks whose NUM_DAYS window was fetched already
+_pairs = None # Pairs being collected, which the gas profile covers
+
+def make_tasks(pairs):
+    '''
+    Returns the (oracle, pair, kind) tasks for pairs, where kind is 'history', 'snapshot', 'logs', 'blocks' or 'profile'
+    '''
+    tasks = []
+    for pair in pairs:
+        tasks += [(oracle, pair, 'history') for oracle in HISTORY_ORACLES if scripts.helpers.catalog.supports(pair, oracle)]
+        tasks += [(oracle, pair, 'snapshot') for oracle in SNAPSHOT_ORACLES if scripts.helpers.catalog.supports(pair, oracle)]
+    if any(scripts.helpers.catalog.supports(pair, 'dia') and scripts.dia.coin_name(pair) is not None for pair in pairs):
+        tasks.append(('dia', 'all', 'logs'))
+    tasks.append(('gas', 'all', 'blocks'))
+    tasks.append(('gas', 'all', 'profile'))
+    return tasks
+
+def sync(oracle, pair):
+    '''
+    Syncs one feed's history into the store, saves its newest price, and returns its stored update times.
+    A feed with nothing stored yet (no values reported) returns no times and saves no price
+    '''
+    now = int(scripts.helpers.cassette.now())
+    if oracle == 'tellor':
+        feed = str(scripts.tellor.feed_id(pair))
+        scripts.tellor.sync_history(int(feed), NUM_ROUNDS)
+        rows = scripts.helpers.store.load_newest(scripts.tellor.STORE_NAME, feed, NUM_ROUNDS)
+        if rows:
+            scripts.helpers.store.save_value(oracle, pair, 'price', rows[-1][1] / scripts.tellor.GRANULAITY, rows[-1][3], now)
+        return [row[3] for row in rows]
+    address = scripts.chainlink.feed_address(pair)
+    roundData = scripts.chainlink.sync_history(address, NUM_ROUNDS)
+    rows = scripts.helpers.store.load_newest(scripts.chainlink.STORE_NAME, address.lower(), NUM_ROUNDS)
+    if roundData is None or not rows or not roundData[3]:
+        return [row[3] for row in rows]
+    scripts.helpers.store.save_value(oracle, pair, 'price', scripts.chainlink.calculate_price(roundData[1], roundData[5]), roundData[3], now)
+    scripts.helpers.store.save_value(oracle, pair, 'decimals', roundData[5], None, now)
+    return [row[3] for row in rows]
+
+def poll(oracle, pair, kind):
+    '''
+    Runs one task, and returns the update times it found (numbers only)
+    '''
+    now = int(scripts.helpers.cassette.now())
+    if kind == 'logs':
+        scripts.dia.sync_logs(NUM_DAYS)
+        return []
+    if kind == 'blocks':
+        scripts.gas.sync_block_gas(NUM_DAYS)
+        return []
+    if kind == 'profile':
+        scripts.gasprofile.save(scripts.gasprofile.profile(_pairs))
+        return []
+    module = scripts.sweep.oracle_module(oracle)
+    if kind == 'snapshot':
+        row = module.snapshot([pair])[0]
+        scripts.helpers.store.save_value(oracle, pair, 'price', row['price'], row['timestamp'] if isinstance(row['timestamp'], int) else None, now)
+        return [row['timestamp']] if isinstance(row['timestamp'], int) else []
+    if (oracle, pair) not in _backfilled:
+        module.get_price_series(pair, None, NUM_DAYS)
+        _backfilled.add((oracle, pair))
+    return sync(oracle, pair)
+
+def run(pairs=None, once=False, timeout=TIMEOUT):
+    '''
+    Polls every task of pairs (the whole catalog by default) forever, or each one once with once
+    '''
+    global _pairs
+    _pairs = pairs if pairs is not None else scripts.helpers.catalog.pairs()
+    tasks = make_tasks(_pairs)
+    cadences = {task: scripts.helpers.cadence.Cadence(task[0], task[1]) for task in tasks}
+    queue = [(0, i, task) for i, task in enumerate(tasks)]
+    count = len(queue)
+    running = {}
+    next_save = time.time() + METRICS_INTERVAL
+    while queue or running:
+
+        # Save RPC usage so far for the dashboard
+        if time.time() >= next_save:
+            scripts.helpers.metrics.dump(scripts.helpers.metrics.SUMMARY_PATH)
+            next_save = time.time() + METRICS_INTERVAL
+
+        # Start every task that is due
+        now = time.time()
+        while queue and queue[0][0] <= now:
+            task = heapq.heappop(queue)[2]
+            running[scripts.helpers.pipeline.submit(poll, *task, timeout=timeout)] = task
+
+        # Wait for a poll to finish, the next task to come due or the next save, then schedule the finished ones again
+        wait = max(min(queue[0][0] if queue else next_save, next_save) - now, 0)
+        if not running:
+            time.sleep(wait)
+            continue
+        done, _ = concurrent.futures.wait(list(running), timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            task = running.pop(future)
+            cadence = cadences[task]
+            now = time.time()
+            try:
+                found = cadence.observe(future.result(), now)
+                delay = INTERVALS.get(task[2]) or cadence.next_delay(now)
+                print(' '.join(task) + (': new update' if found else ': no change') + ', next poll in ' + str(round(delay)) + 's')
+            except Exception as error:
+                delay = max(cadence.next_delay(now), scripts.helpers.cadence.DEFAULT_INTERVAL)
+                print(' '.join(task) + ': failed (' + repr(error) + '), next poll in ' + str(round(delay)) + 's')
+            if not once:
+                heapq.heappush(queue, (now + delay, count, task))
+                count += 1
+    scripts.helpers.metrics.dump(scripts.helpers.metrics.SUMMARY_PATH)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Keep the local store up to date for the dashboard')
+    parser.add_argument('--pairs', nargs='+', default=None, help='Pairs to collect (default: the whole catalog)')
+    parser.add_argument('--once', action='store_true', help='Poll every task once and exit')
+    args = parser.parse_args()
+    run(args.pairs, args.once)
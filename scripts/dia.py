@@ -4,21 +4,32 @@ Get important data for the DIA Oracle
 
 Notes: 
 - Only takes in Bitcoin, Litecoin, and Ethereum through their ABI
+- On-chain history comes from newCoinInfo events, stored with the update timestamp as the round ID
+- The REST API is keyed by symbol ('BTC') and the contract by coin name ('Bitcoin'); both come from the feed catalog
 '''
 
 ''' Libraries '''
-import requests
+from datetime import datetime
+import scripts.helpers.cassette
+import scripts.helpers.catalog
 import scripts.helpers.contract
+import scripts.helpers.logs
+import scripts.helpers.series
+import scripts.helpers.store
+
+''' Constants '''
+ADDRESS = '0xD47FDf51D61c100C447E2D4747c7126F19fa23Ef' # Address of smart contract on mainnet
+PRICE_DECIMALS = 5 # Decimals of the prices written on-chain
+STORE_NAME = 'dia' # Oracle name for updates kept in the local store
 
 ''' Smart Contract Set-Up '''
-dia_contract = scripts.helpers.contract.get_contract('contracts/dia.json', '0xD47FDf51D61c100C447E2D4747c7126F19fa23Ef')
+dia_contract = scripts.helpers.contract.LazyContract('contracts/dia.json', ADDRESS)
 
 def get_value(coin):
     '''
     Get the value of the coin given the response from the DIA API Endpoint
     '''
-    r = requests.get("https://api.diadata.org/v1/quotation/" + coin)
-    return r.json()
+    return scripts.helpers.contract.get_json("https://api.diadata.org/v1/quotation/" + coin)
 
 def return_price(coin):
     '''
@@ -27,11 +38,86 @@ def return_price(coin):
     coin_json = get_value(coin)
     return coin_json['Price']
 
-def grab_gas_estimate(coin_name):
+def coin_name(pair):
+    '''
+    On-chain coin name of a pair (e.g. 'Bitcoin'), or None when DIA only serves it over REST
+    '''
+    return scripts.helpers.catalog.lookup(pair, 'dia').get('name')
+
+def snapshot(feeds=None):
+    '''
+    Returns the latest value of each pair (e.g. 'BTC/USD', all catalog pairs by default) as
+    rows of {'oracle', 'pair', 'price', 'timestamp'}. The REST API has no bulk endpoint, so
+    this is one request per coin over the shared session
+    '''
+    if feeds is None:
+        feeds = scripts.helpers.catalog.pairs('dia')
+    rows = []
+    for pair in feeds:
+        coin_json = get_value(scripts.helpers.catalog.lookup(pair, 'dia')['symbol'])
+        rows.append({'oracle': 'DIA', 'pair': pair, 'price': coin_json['Price'], 'timestamp': coin_json.get('Time')})
+    return rows
+
+def ingest_logs(from_block, to_block='latest'):
+    '''
+    Fills the local store with every newCoinInfo update between two blocks, keyed by coin
+    name (e.g. 'Bitcoin'). Returns the number of updates stored
+    '''
+    rows = {}
+    for event in scripts.helpers.logs.get_events([dia_contract.events.newCoinInfo], ADDRESS, from_block, to_block):
+        timestamp = event['args']['lastUpdateTimestamp']
+        row = [timestamp, event['args']['price'], timestamp, timestamp, timestamp]
+        rows.setdefault(event['args']['name'], []).append(row)
+    for name in rows:
+        scripts.helpers.store.save_rounds(STORE_NAME, name, rows[name])
+    return sum(len(elem) for elem in rows.values())
+
+def sync_logs(num_of_days):
+    '''
+    Ingests the newCoinInfo updates since the last sync (at least num_of_days back). Returns the number stored
+    '''
+    blocks = scripts.helpers.logs.pending_range(STORE_NAME, ADDRESS.lower(), num_of_days)
+    if blocks is None:
+        return 0
+    count = ingest_logs(*blocks)
+    scripts.helpers.store.save_log_mark(STORE_NAME, ADDRESS.lower(), blocks[1])
+    return count
+
+def get_history_series(pair, num_of_days):
+    '''
+    Returns the stored on-chain updates of a pair over the last num_of_days as a RoundSeries
+    (empty for pairs DIA does not write on-chain)
+    '''
+    name = coin_name(pair)
+    if name is None:
+        return scripts.helpers.series.RoundSeries.from_rows([], PRICE_DECIMALS)
+    old_date = int(scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60)
+    rows = scripts.helpers.store.load_range(STORE_NAME, name, old_date, int(scripts.helpers.cassette.now()))
+    return scripts.helpers.series.RoundSeries.from_rows(rows, PRICE_DECIMALS)
+
+def get_history(pair, num_of_days):
+    '''
+    Returns the stored on-chain prices and timestamps of a pair over the last num_of_days, oldest first
+    '''
+    series = get_history_series(pair, num_of_days)
+    return series.prices.tolist(), [datetime.fromtimestamp(int(elem)) for elem in series.timestamps]
+
+def gas_paths(feeds):
+    '''
+    Read paths of feeds for the gas profile: getCoinInfo of each coin written on-chain (there is no bulk read)
+    '''
+    return [{'function': 'getCoinInfo', 'pairs': [pair], 'values': 1, 'call': dia_contract.functions.getCoinInfo(coin_name(pair))}
+            for pair in feeds if coin_name(pair) is not None]
+
+def grab_gas_estimate(pair):
     '''
-    Gets the estimate of gas from pulling info from one data point from the oracle
+    Gets the estimate of gas from pulling info from one data point from the oracle, or None
+    for a pair DIA only serves over REST (nothing on-chain to read)
     '''
-    return dia_contract.functions.getCoinInfo((coin_name)).estimateGas()
+    name = coin_name(pair)
+    if name is None:
+        return None
+    return scripts.helpers.contract.batch_estimate([dia_contract.functions.getCoinInfo(name)])[0]
 
 def print_info(name, price, comparison, time):
     '''
@@ -1,51 +1,155 @@
 '''
 File: gas.py
-Get historical gas prices using Chainlink oracle
+Get historical gas prices, per block from the node or per round from Chainlink's fast gas feed
 
 Notes:
 - Round Data format = [roundId, answer, startedAt, updatedAt, answeredInRound, decimals]
+- Block gas comes from eth_feeHistory (base fee, gas used ratio and priority fee percentiles for up to
+  FEE_HISTORY_BLOCKS blocks per call), with every call of a range sent in JSON-RPC batches
+- eth_feeHistory has no timestamps, so headers are read every HEADER_SPACING blocks (plus the last one)
+  and the blocks in between are interpolated; slots are 12 seconds, so the error is a few seconds at most
+- Block gas lives in the local store's 'blocks' table; BlockGas holds a stretch of it as NumPy columns
 '''
 
 ''' Libraries '''
-from datetime import datetime
+import numpy as np
+import scripts.chainlink
+import scripts.helpers.align
 import scripts.helpers.contract
+import scripts.helpers.series
+import scripts.helpers.store
 
 ''' Constants '''
 TIME_CHANGE = 20 
+GAS_ADDRESS = '0x169E633A2D1E6c10dD91238Ba11c4A708dfEF37C' # Chainlink fast gas aggregator on mainnet
+FEE_HISTORY_BLOCKS = 1024 # Most blocks one eth_feeHistory call may cover
+PERCENTILES = [10, 50, 90] # Priority fee percentiles asked for in every block
+HEADER_SPACING = 256 # Blocks between two headers read for timestamps
+BLOCK_TIME = 12 # Seconds per block, to turn a number of days into a block range
+PRICE_TOLERANCE = 2 * BLOCK_TIME # Seconds an update may be from a block and still be given its gas price
+BATCH_SIZE = scripts.helpers.contract.BATCH_SIZE # Requests per JSON-RPC batch
 
 ''' Smart Contract Set-Up'''
-gas_contract = scripts.helpers.contract.get_contract('contracts/chainlink_gas.json', '0x169E633A2D1E6c10dD91238Ba11c4A708dfEF37C')
+gas_contract = scripts.helpers.contract.LazyContract('contracts/chainlink_gas.json', GAS_ADDRESS)
+
+def get_gas_series(num_rounds):
+    '''
+    Get the last num_rounds gas price updates as a RoundSeries. The fast gas feed is a regular
+    Chainlink aggregator, so its rounds go through the same local store
+    '''
+    data = scripts.chainlink.sync_history(GAS_ADDRESS, num_rounds)
+    rounds = scripts.chainlink.grab_rounds(GAS_ADDRESS, range(data[0], data[0] - num_rounds, -1))
+    return scripts.helpers.series.RoundSeries.from_rows(rounds, 0)
 
 def get_timestamps(num_rounds):
     '''
-    Get the values and the timestamps for each value
-    '''
-    timestamps = []
-    gas_prices = []
-    data = gas_contract.functions.latestRoundData().call()
-    update_id = data[0]
-    for i in range(0, num_rounds):
-        data = gas_contract.functions.getRoundData(update_id).call()
-        timestamps.append(data[3])
-        gas_prices.append(data[1])
-        update_id -= 1
-    return gas_prices, timestamps
-
-def get_corresponding_prices(timestamps, gas_times, gas_prices):
-    '''
-    Gets the corresponding indices of gas prices to time differences
-    '''
-    indices = []
-    corresponding_prices = []
-    for timestamp in timestamps:
-        difference = int(10000000)
-        index = int(0)
-        for other_timestamp in gas_times:
-            other_diff = int(abs(other_timestamp - int(datetime.timestamp(timestamp))))
-            if (other_diff < difference):
-                difference = other_diff
-                index = int(gas_times.index(other_timestamp))
-            indices.append(index)
-    for i in range(0, len(gas_prices)):
-        corresponding_prices.append(gas_prices[i])
-    return corresponding_prices
\ No newline at end of file
+    Get the values and the timestamps for each value, newest first
+    '''
+    series = get_gas_series(num_rounds)
+    return series.answers[::-1].tolist(), series.timestamps[::-1].tolist()
+
+class BlockGas:
+    '''
+    Per-block gas data as NumPy columns, oldest block first. Fees are in gwei
+    '''
+
+    def __init__(self, numbers, timestamps, base_fees, used, rewards):
+        self.numbers = np.asarray(numbers, dtype=np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.base_fees = np.asarray(base_fees, dtype=np.float64)
+        self.used = np.asarray(used, dtype=np.float64)
+        self.rewards = np.asarray(rewards, dtype=np.float64).reshape(len(self.numbers), len(PERCENTILES))
+
+    @classmethod
+    def from_rows(cls, rows):
+        '''
+        Builds the columns from store rows [number, timestamp, base fee, gas used ratio, rewards] (wei)
+        '''
+        rewards = [row[4] if len(row[4]) == len(PERCENTILES) else [0] * len(PERCENTILES) for row in rows]
+        return cls([row[0] for row in rows], [row[1] for row in rows], [row[2] / 1e9 for row in rows],
+                   [row[3] for row in rows], np.asarray(rewards, dtype=np.float64) / 1e9)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def prices(self, percentile=50):
+        '''
+        Gas price paid in each block at a priority fee percentile: base fee plus tip, in gwei
+        '''
+        return self.base_fees + self.rewards[:, PERCENTILES.index(percentile)]
+
+def fee_history(first, last):
+    '''
+    Returns {block: [base fee, gas used ratio, [priority fee per percentile]]} (wei) for blocks first to last
+    '''
+    payload = []
+    for start in range(first, last + 1, FEE_HISTORY_BLOCKS):
+        end = min(start + FEE_HISTORY_BLOCKS - 1, last)
+        payload.append({'jsonrpc': '2.0', 'id': len(payload), 'method': 'eth_feeHistory', 'params': [hex(end - start + 1), hex(end), PERCENTILES]})
+    fees = {}
+    for start in range(0, len(payload), BATCH_SIZE):
+        replies = scripts.helpers.contract.send_batch(payload[start:start + BATCH_SIZE])
+        for request in payload[start:start + BATCH_SIZE]:
+            reply = replies[request['id']]
+            if 'error' in reply:
+                raise ValueError(reply['error'])
+            result = reply['result']
+            oldest = int(result['oldestBlock'], 16)
+            rewards = result.get('reward') or [[] for _ in result['gasUsedRatio']]
+            for i, ratio in enumerate(result['gasUsedRatio']):
+                fees[oldest + i] = [int(result['baseFeePerGas'][i], 16), ratio, [int(elem, 16) for elem in rewards[i]]]
+    return fees
+
+def block_times(blocks):
+    '''
+    Returns {block: timestamp} for blocks, reading their headers in batches
+    '''
+    payload = [{'jsonrpc': '2.0', 'id': block, 'method': 'eth_getBlockByNumber', 'params': [hex(block), False]} for block in blocks]
+    times = {}
+    for start in range(0, len(payload), BATCH_SIZE):
+        for block, reply in scripts.helpers.contract.send_batch(payload[start:start + BATCH_SIZE]).items():
+            if 'error' in reply:
+                raise ValueError(reply['error'])
+            times[block] = int(reply['result']['timestamp'], 16)
+    return times
+
+def fetch_block_gas(first, last):
+    '''
+    Returns store rows [number, timestamp, base fee, gas used ratio, rewards] for blocks first to last
+    '''
+    fees = fee_history(first, last)
+    anchors = sorted(set(range(first, last + 1, HEADER_SPACING)) | {last})
+    times = block_times(anchors)
+    numbers = np.arange(first, last + 1)
+    stamps = np.rint(np.interp(numbers, anchors, [times[block] for block in anchors])).astype(np.int64)
+    return [[int(number), int(stamp)] + fees[number] for number, stamp in zip(numbers, stamps) if number in fees]
+
+def sync_block_gas(num_of_days):
+    '''
+    Brings the store's block gas up to the head block, covering at least the last num_of_days.
+    Only blocks newer than the newest stored one are fetched. Returns the number of blocks saved
+    '''
+    latest = scripts.helpers.contract.block_number()
+    first = max(latest - int(num_of_days * 24 * 60 * 60 / BLOCK_TIME), 0)
+    newest = scripts.helpers.store.newest_block()
+    if newest is not None and newest >= first:
+        first = newest + 1
+    if first > latest:
+        return 0
+    rows = fetch_block_gas(first, latest)
+    scripts.helpers.store.save_blocks(rows)
+    return len(rows)
+
+def read_block_gas(first_time, last_time=None):
+    '''
+    Block gas between two Unix times (up to now by default) as BlockGas, read only from the local store
+    '''
+    last_time = last_time if last_time is not None else np.iinfo(np.int64).max
+    return BlockGas.from_rows(scripts.helpers.store.load_blocks(int(first_time), int(last_time)))
+
+def get_corresponding_prices(timestamps, gas_times, gas_prices, direction='nearest', tolerance=None):
+    '''
+    Gets the gas price in effect at each of timestamps (datetimes or Unix times), matching each
+    one to the closest gas update. Unmatched entries (outside tolerance seconds) are NaN
+    '''
+    return scripts.helpers.align.align(timestamps, gas_times, gas_prices, direction, tolerance).tolist()
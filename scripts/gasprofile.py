@@ -0,0 +1,65 @@
+'''
+File: gasprofile.py
+Profiles the gas cost of every oracle read path, single-feed and bulk, in one batched pass
+
+Notes:
+- Run with: python -m scripts.gasprofile [--pairs BTC/USD ETH/USD] [--oracles tellor band] [--save]
+- Each oracle module lists its read paths in gas_paths(feeds): one call per feed, plus bulk variants
+  such as Band's getReferenceDataBulk or Tellor's getLastValues, with the number of values each returns
+- Every path of every oracle is estimated through contract.batch_estimate(), so a profile is a handful
+  of batched requests, and paths whose code and calldata were estimated recently cost nothing
+- Rows are {'oracle', 'function', 'pairs', 'values', 'gas', 'gas_per_value'}; a path that reverts
+  (e.g. a bulk read including a pair the oracle does not serve) has a gas of None
+- The collector saves a profile to the store every PROFILE_INTERVAL, and the dashboard reads it from there
+'''
+
+''' Libraries '''
+import argparse
+import scripts.helpers.cassette
+import scripts.helpers.catalog
+import scripts.helpers.contract
+import scripts.helpers.store
+import scripts.sweep
+
+''' Constants '''
+ORACLES = scripts.helpers.catalog.ORACLES # Oracles profiled by default
+
+def profile(pairs=None, oracles=ORACLES):
+    '''
+    Estimates every read path of pairs (every catalog pair by default) on each oracle that serves them
+    '''
+    paths = []
+    for oracle in oracles:
+        served = [pair for pair in (pairs if pairs is not None else scripts.helpers.catalog.pairs(oracle))
+                  if scripts.helpers.catalog.supports(pair, oracle)]
+        for path in scripts.sweep.oracle_module(oracle).gas_paths(served):
+            paths.append(dict(path, oracle=scripts.helpers.catalog.NAMES[oracle]))
+    estimates = scripts.helpers.contract.batch_estimate([path.pop('call') for path in paths], allow_failure=True)
+    for path, gas in zip(paths, estimates):
+        path['gas'] = gas
+        path['gas_per_value'] = gas / path['values'] if gas is not None and path['values'] else None
+    return paths
+
+def single_reads(rows):
+    '''
+    Returns {(oracle name, pair): gas} for the single-feed, single-value paths of a profile
+    '''
+    return {(row['oracle'], row['pairs'][0]): row['gas'] for row in rows if len(row['pairs']) == 1 and row['values'] == 1}
+
+def save(rows):
+    scripts.helpers.store.save_profile(rows, int(scripts.helpers.cassette.now()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Estimate the gas of every oracle read path')
+    parser.add_argument('--pairs', nargs='+', default=None, help='Pairs to profile (default: every catalog pair the oracle serves)')
+    parser.add_argument('--oracles', nargs='+', default=ORACLES, choices=ORACLES, help='Oracles to profile')
+    parser.add_argument('--save', action='store_true', help='Save the profile to the store for the dashboard')
+    args = parser.parse_args()
+    rows = profile(args.pairs, args.oracles)
+    for row in sorted(rows, key=lambda row: (row['oracle'], row['gas_per_value'] is None, row['gas_per_value'] or 0)):
+        pairs = ', '.join(row['pairs']) if len(row['pairs']) <= 3 else str(len(row['pairs'])) + ' pairs'
+        print(row['oracle'].ljust(10) + ' ' + row['function'].ljust(22) + ' ' + (pairs or 'all tracked').ljust(30)
+              + str(row['values']).rjust(5) + ' values ' + str(row['gas']).rjust(9) + ' gas '
+              + (str(round(row['gas_per_value'])) if row['gas_per_value'] is not None else '-').rjust(9) + ' gas/value')
+    if args.save:
+        save(rows)
@@ -0,0 +1,66 @@
+'''
+File: align.py
+Lines up two time series (e.g. request times against gas prices, or Tellor against Chainlink)
+
+Notes:
+- Times can be Unix timestamps or datetime objects; they are compared as integer seconds
+- Matching is an as-of join on sorted arrays with searchsorted, so it costs O((n + m) log m)
+- direction is 'backward' (latest at or before), 'forward' (earliest at or after) or 'nearest'
+'''
+
+''' Libraries '''
+from datetime import datetime
+import numpy as np
+
+def to_seconds(times):
+    '''
+    Converts a sequence of Unix timestamps or datetimes into an int64 array of seconds
+    '''
+    times = list(times) if not isinstance(times, np.ndarray) else times
+    if len(times) > 0 and isinstance(times[0], datetime):
+        return np.array([int(datetime.timestamp(elem)) for elem in times], dtype=np.int64)
+    return np.asarray(times, dtype=np.int64)
+
+def match_indices(times, other_times, direction='nearest', tolerance=None):
+    '''
+    For every entry of times, returns the index into other_times it matches, or -1 when
+    nothing matches in that direction within tolerance seconds. other_times need not be sorted
+    '''
+    times = to_seconds(times)
+    other_times = to_seconds(other_times)
+    if len(other_times) == 0:
+        return np.full(len(times), -1, dtype=np.int64)
+    order = np.argsort(other_times, kind='stable')
+    ordered = other_times[order]
+
+    # Candidates on each side of every time, clipped into range and flagged when missing
+    before = np.searchsorted(ordered, times, side='right') - 1
+    after = np.searchsorted(ordered, times, side='left')
+    has_before = before >= 0
+    has_after = after < len(ordered)
+    before = np.clip(before, 0, len(ordered) - 1)
+    after = np.clip(after, 0, len(ordered) - 1)
+    if direction == 'backward':
+        chosen, found = before, has_before
+    elif direction == 'forward':
+        chosen, found = after, has_after
+    elif direction == 'nearest':
+        gap_before = np.where(has_before, times - ordered[before], np.iinfo(np.int64).max)
+        gap_after = np.where(has_after, ordered[after] - times, np.iinfo(np.int64).max)
+        chosen = np.where(gap_after < gap_before, after, before)
+        found = has_before | has_after
+    else:
+        raise ValueError("direction must be 'backward', 'forward' or 'nearest'")
+    if tolerance is not None:
+        found = found & (np.abs(ordered[chosen] - times) <= tolerance)
+    return np.where(found, order[chosen], -1)
+
+def align(times, other_times, other_values, direction='nearest', tolerance=None):
+    '''
+    Returns other_values matched onto times as a float array, with NaN where nothing matched
+    '''
+    indices = match_indices(times, other_times, direction, tolerance)
+    values = np.asarray(other_values, dtype=np.float64)
+    if len(values) == 0:
+        return np.full(len(indices), np.nan)
+    return np.where(indices >= 0, values[np.clip(indices, 0, None)], np.nan)
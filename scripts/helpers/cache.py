@@ -0,0 +1,160 @@
+'''
+File: cache.py
+Content-addressed cache for eth_call results, keyed by (namespace, address, calldata, block)
+
+Notes:
+- Entries live in one of three namespaces, so answers of one kind are never served for another:
+  'latest' calls are keyed by the head block they were resolved to, and expire as soon as a new block
+  arrives (the head is polled at most once every BLOCK_TTL seconds). 'pinned' calls were sent for an
+  explicit block number and never change. 'final' results (e.g. a finished Chainlink round, see
+  batch_call in contract.py) can no longer change at any block, so they are keyed without one
+- Pinned and final entries are kept until the LRU pushes them out, and on disk when a disk tier is configured
+- Used by the Web3 middleware and by batch_call in contract.py, so both paths share entries
+- The disk tier may be shared by several processes, so like the store it uses WAL mode and a busy timeout
+'''
+
+''' Libraries '''
+import collections
+import os
+import sqlite3
+import threading
+import time
+import scripts.helpers.metrics
+import scripts.helpers.store
+
+''' Constants '''
+MAX_ENTRIES = 50000 # Results kept in memory before the least recently used are dropped
+BLOCK_TTL = 4 # Seconds before asking the node for the head block again
+DISK_PATH = os.environ.get('ORACLE_DIFF_CALL_CACHE') # Optional SQLite file for pinned results
+
+''' Shared state '''
+_lock = threading.Lock()
+_entries = collections.OrderedDict() # (namespace, address, calldata, block number) -> result
+_head = {'block': None, 'checked': 0}
+_disk = None
+stats = {'hits': 0, 'misses': 0}
+
+def head_block(fetch_block_number):
+    '''
+    Returns the current head block number, calling fetch_block_number() when the last answer is stale
+    '''
+    with _lock:
+        if _head['block'] is not None and time.time() - _head['checked'] < BLOCK_TTL:
+            return _head['block']
+    block = fetch_block_number()
+    with _lock:
+        _head['block'] = block
+        _head['checked'] = time.time()
+    return block
+
+def get_disk():
+    '''
+    Opens the disk tier on first use, if one is configured
+    '''
+    global _disk
+    if DISK_PATH is None:
+        return None
+    with _lock:
+        if _disk is None:
+            _disk = sqlite3.connect(DISK_PATH, timeout=scripts.helpers.store.BUSY_TIMEOUT, check_same_thread=False)
+            _disk.execute('PRAGMA journal_mode=WAL')
+            _disk.execute('CREATE TABLE IF NOT EXISTS call_results (namespace TEXT, address TEXT, data TEXT, block INTEGER, '
+                          'result TEXT, PRIMARY KEY (namespace, address, data, block))')
+            _disk.commit()
+    return _disk
+
+def make_key(call, block, namespace):
+    '''
+    Builds the cache key for an eth_call transaction at a resolved block number ('final' entries have no block)
+    '''
+    return (namespace, str(call['to']).lower(), str(call['data']).lower(), block if namespace != 'final' else -1)
+
+def lookup(call, block, namespace):
+    '''
+    Returns the cached result for a call, or None. Pinned and final calls also check the disk tier
+    '''
+    key = make_key(call, block, namespace)
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            stats['hits'] += 1
+            scripts.helpers.metrics.note_cache('hit')
+            return _entries[key]
+    disk = get_disk() if namespace != 'latest' else None
+    if disk is not None:
+        with _lock:
+            record = disk.execute('SELECT result FROM call_results WHERE namespace = ? AND address = ? AND data = ? AND block = ?', key).fetchone()
+        if record is not None:
+            remember(key, record[0])
+            with _lock:
+                stats['hits'] += 1
+            scripts.helpers.metrics.note_cache('hit')
+            return record[0]
+    with _lock:
+        stats['misses'] += 1
+    scripts.helpers.metrics.note_cache('miss')
+    return None
+
+def remember(key, result):
+    with _lock:
+        _entries[key] = result
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+def save(call, block, result, namespace):
+    '''
+    Stores a result in memory (dropping the oldest entries past MAX_ENTRIES), and on disk unless it is a 'latest' one
+    '''
+    key = make_key(call, block, namespace)
+    remember(key, result)
+    disk = get_disk() if namespace != 'latest' else None
+    if disk is not None:
+        with _lock:
+            disk.execute('INSERT OR REPLACE INTO call_results VALUES (?, ?, ?, ?, ?)', key + (result,))
+            disk.commit()
+
+def resolve_block(block_identifier, fetch_block_number):
+    '''
+    Returns (block number, namespace) for an eth_call block identifier, or (None, None) for
+    tags like "pending" that cannot be cached
+    '''
+    if block_identifier is None or block_identifier == 'latest':
+        return head_block(fetch_block_number), 'latest'
+    if isinstance(block_identifier, int):
+        return block_identifier, 'pinned'
+    if isinstance(block_identifier, str) and block_identifier.startswith('0x'):
+        return int(block_identifier, 16), 'pinned'
+    return None, None
+
+def middleware(make_request, web3):
+    '''
+    Web3 middleware that answers repeated eth_call requests from the cache
+    '''
+    def fetch_block_number():
+        return int(make_request('eth_blockNumber', [])['result'], 16)
+
+    def cache_middleware(method, params):
+        if method != 'eth_call':
+            return make_request(method, params)
+        block, namespace = resolve_block(params[1] if len(params) > 1 else 'latest', fetch_block_number)
+        if block is None or 'to' not in params[0] or 'data' not in params[0]:
+            return make_request(method, params)
+        result = lookup(params[0], block, namespace)
+        if result is not None:
+            return {'jsonrpc': '2.0', 'id': None, 'result': result}
+        response = make_request(method, params)
+        if 'result' in response:
+            save(params[0], block, response['result'], namespace)
+        return response
+    return cache_middleware
+
+def clear():
+    '''
+    Drops every in-memory entry (the disk tier is left alone)
+    '''
+    with _lock:
+        _entries.clear()
+        _head['block'] = None
+        stats['hits'] = 0
+        stats['misses'] = 0
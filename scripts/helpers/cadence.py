@@ -0,0 +1,85 @@
+'''
+File: cadence.py
+Learns how often a feed updates, and decides when it is worth polling it again
+
+Notes:
+- The gaps between update times feed an IntervalStats; its median is the feed's usual heartbeat
+  and its 95th percentile how late an update can reasonably be
+- Until the next update is due, the poller sleeps until a LEAD share of the heartbeat before it.
+  Between then and the late mark it polls every FAST share of the heartbeat (at least MIN_INTERVAL)
+- Past the late mark the feed counts as idle: every poll that finds nothing new doubles the delay,
+  up to MAX_INTERVAL, and the next update resets it
+- Feeds with fewer than MIN_HISTORY intervals (or no update times at all) are polled every DEFAULT_INTERVAL
+'''
+
+''' Libraries '''
+import scripts.helpers.stats
+
+''' Constants '''
+MIN_INTERVAL = 5 # Shortest delay between two polls of one feed, in seconds
+MAX_INTERVAL = 900 # Longest delay between two polls of an idle feed
+DEFAULT_INTERVAL = 60 # Delay while a feed's heartbeat is still unknown
+MIN_HISTORY = 3 # Intervals seen before the learned heartbeat is trusted
+LEAD = 0.1 # Share of the heartbeat to start polling before an update is due
+FAST = 0.05 # Share of the heartbeat between polls while an update is due
+BACKOFF = 2 # Growth of the delay for each empty poll of an idle feed
+
+class Cadence:
+    '''
+    Polling schedule of one (oracle, feed)
+    '''
+
+    def __init__(self, oracle, feed):
+        self.stats = scripts.helpers.stats.IntervalStats(oracle, feed)
+        self.idle_polls = 0
+
+    @property
+    def last_update(self):
+        return self.stats.last_timestamp
+
+    def observe(self, timestamps, now):
+        '''
+        Folds in the update times a poll found (older ones than the last seen are ignored), and
+        returns whether any of them was new
+        '''
+        found = False
+        for timestamp in sorted(timestamps):
+            if self.last_update is None or timestamp > self.last_update:
+                self.stats.update(timestamp)
+                found = True
+        if found:
+            self.idle_polls = 0
+        elif self.overdue(now):
+            self.idle_polls += 1
+        return found
+
+    def heartbeat(self):
+        '''
+        Returns (usual, late) seconds between updates, or None while too few were seen
+        '''
+        if self.stats.moments.count < MIN_HISTORY:
+            return None
+        summary = self.stats.summary()
+        return summary['p50'], max(summary['p95'], summary['p50'])
+
+    def overdue(self, now):
+        beat = self.heartbeat()
+        return beat is not None and now > self.last_update + beat[1] + LEAD * beat[0]
+
+    def next_delay(self, now):
+        '''
+        Seconds to wait before the next poll
+        '''
+        beat = self.heartbeat()
+        if beat is None or self.last_update is None:
+            return DEFAULT_INTERVAL
+        usual, late = beat
+        fast = max(MIN_INTERVAL, FAST * usual)
+        due = self.last_update + usual - LEAD * usual
+        if now < due:
+            delay = due - now
+        elif not self.overdue(now):
+            delay = fast
+        else:
+            delay = fast * BACKOFF ** self.idle_polls
+        return min(max(delay, MIN_INTERVAL), MAX_INTERVAL)
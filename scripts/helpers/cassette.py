@@ -0,0 +1,206 @@
+'''
+File: cassette.py
+Records JSON-RPC and DIA HTTP traffic to a cassette file, and replays it without a network
+
+Notes:
+- Set ORACLE_DIFF_CASSETTE to a file path to turn it on, and ORACLE_DIFF_CASSETTE_MODE to 'record'
+  (talk to the real endpoints and save every answer) or 'replay' (the default: only answer from the file)
+- JSON-RPC answers are keyed by (method, params), one entry per call even inside a batch, so a replay
+  still works when batches are chunked differently. HTTP answers are keyed by URL
+- A key asked several times keeps every answer in order (e.g. eth_blockNumber); a replay hands them
+  out in the same order and repeats the last one, so runs come out identical
+- Each answer keeps the seconds it took. Replays sleep that long times ORACLE_DIFF_CASSETTE_LATENCY
+  (0 by default, 1 to replay a slow session as it happened)
+- The file is gzipped JSON. A recording started in a top-level process replaces the file; workers of a
+  process pool (forked or spawned) merge what they recorded into it when they exit
+- Modules read the time through now(), never the wall clock, whenever it decides what to request or
+  what counts as final (e.g. Tellor's getIndexForDataBefore, Chainlink's round search, is_settled).
+  While a cassette is on, now() is the session's clock: the time the recording started, saved in the
+  file and handed to the recorder's workers through CLOCK_VARIABLE, so a replay sends the same calls
+  and keeps the same rows however much later it runs
+'''
+
+''' Libraries '''
+import fcntl
+import gzip
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+''' Constants '''
+PATH = os.environ.get('ORACLE_DIFF_CASSETTE') # Cassette file; None turns record/replay off
+MODE = os.environ.get('ORACLE_DIFF_CASSETTE_MODE', 'replay') # 'record' or 'replay'
+LATENCY = float(os.environ.get('ORACLE_DIFF_CASSETTE_LATENCY', '0')) # Multiplier on recorded latency during replays
+VERSION = 2 # Format of the cassette file (2 added the session clock)
+CLOCK_VARIABLE = 'ORACLE_DIFF_CASSETTE_CLOCK' # Environment variable passing a recording's clock to its workers
+
+''' Shared state '''
+_lock = threading.Lock()
+_clocks = {} # Cassette path -> session clock
+
+class CassetteMiss(IOError):
+    '''
+    A replay was asked for something the cassette never recorded
+    '''
+
+def session_clock(path, mode):
+    '''
+    The clock of the session recorded to (or replayed from) path, read or started once per process
+    '''
+    with _lock:
+        if path not in _clocks:
+            if mode == 'replay':
+                data = {}
+                if os.path.exists(path):
+                    with gzip.open(path, 'rt') as f:
+                        data = json.load(f)
+                if 'clock' not in data:
+                    raise CassetteMiss(path + ' has no recorded clock; record the session again')
+                _clocks[path] = data['clock']
+            else:
+                _clocks[path] = float(os.environ.get(CLOCK_VARIABLE) or time.time())
+                os.environ[CLOCK_VARIABLE] = repr(_clocks[path])
+        return _clocks[path]
+
+def now():
+    '''
+    Seconds since the epoch: the session's clock while a cassette is on, the wall clock otherwise
+    '''
+    if PATH is None:
+        return time.time()
+    return session_clock(PATH, MODE)
+
+def rpc_key(request):
+    return json.dumps([request['method'], request.get('params') or []], sort_keys=True, separators=(',', ':'))
+
+class Cassette:
+    '''
+    Answers, in the order they were seen, for every JSON-RPC call and HTTP GET of a session
+    '''
+
+    def __init__(self, path, mode='replay', latency=LATENCY, pool=None, session=None):
+        if mode not in ('record', 'replay'):
+            raise ValueError('Cassette mode must be record or replay, not ' + str(mode))
+        if mode == 'record' and (pool is None or session is None):
+            raise ValueError('Recording needs a pool and a session to send requests through')
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.pool = pool
+        self.session = session
+        self.tapes = {'rpc': {}, 'http': {}} # kind -> key -> [[seconds, answer], ...]
+        self.played = {} # (kind, key) -> answers handed out so far
+        self.lock = threading.Lock()
+        if mode == 'replay':
+            self.tapes = self.read()
+        else:
+
+            # Workers of a process pool skip atexit, but do run multiprocessing finalizers
+            # (which the main process also runs at exit). A forked worker inherits this object,
+            # so it starts with empty tapes to not save the parent's answers twice
+            import multiprocessing.util
+            multiprocessing.util.Finalize(self, self.save, exitpriority=10)
+            os.register_at_fork(after_in_child=self.forget)
+            if multiprocessing.parent_process() is None:
+                self.truncate()
+            self.clock = session_clock(path, mode)
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return {'rpc': {}, 'http': {}}
+        with gzip.open(self.path, 'rt') as f:
+            data = json.load(f)
+        return {'rpc': data.get('rpc', {}), 'http': data.get('http', {})}
+
+    def truncate(self):
+        '''
+        Starts a new session: answers from an earlier recording would otherwise be replayed first
+        '''
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def save(self):
+        '''
+        Merges what this process recorded into the file, under a lock so parallel recorders do not clash
+        '''
+        with self.lock:
+            if self.mode != 'record' or not any(self.tapes.values()):
+                return
+            tapes, self.tapes = self.tapes, {'rpc': {}, 'http': {}}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            saved = self.read()
+            for kind in tapes:
+                for key, answers in tapes[kind].items():
+                    saved[kind].setdefault(key, []).extend(answers)
+            with gzip.open(self.path + '.tmp', 'wt') as f:
+                json.dump(dict(saved, version=VERSION, clock=self.clock), f, separators=(',', ':'))
+            os.replace(self.path + '.tmp', self.path)
+
+    def forget(self):
+        self.lock = threading.Lock()
+        self.tapes = {'rpc': {}, 'http': {}}
+
+    def append(self, kind, key, seconds, answer):
+        with self.lock:
+            self.tapes[kind].setdefault(key, []).append([round(seconds, 4), answer])
+
+    def play(self, kind, key):
+        '''
+        Returns (seconds, answer) for the next replay of key
+        '''
+        with self.lock:
+            answers = self.tapes[kind].get(key)
+            if not answers:
+                raise CassetteMiss(kind + ' request not in ' + self.path + ': ' + key[:200])
+            count = self.played.get((kind, key), 0)
+            self.played[(kind, key)] = count + 1
+            return answers[min(count, len(answers) - 1)]
+
+    def post(self, payload):
+        '''
+        Same as Pool.post: takes a JSON-RPC request or batch and returns the reply (or replies)
+        '''
+        calls = payload if isinstance(payload, list) else [payload]
+        if self.mode == 'record':
+            start = time.monotonic()
+            data = self.pool.post(payload)
+            seconds = time.monotonic() - start
+            replies = {reply['id']: reply for reply in (data if isinstance(data, list) else [data])}
+            for request in calls:
+                reply = replies.get(request['id'])
+                if reply is not None:
+                    self.append('rpc', rpc_key(request), seconds, {k: v for k, v in reply.items() if k in ('result', 'error')})
+            return data
+
+        # A batch was one round-trip, so it waits as long as its slowest call did
+        played = [self.play('rpc', rpc_key(request)) for request in calls]
+        if self.latency:
+            time.sleep(self.latency * max(seconds for seconds, _ in played))
+        replies = [dict(answer, jsonrpc='2.0', id=request['id']) for request, (_, answer) in zip(calls, played)]
+        return replies if isinstance(payload, list) else replies[0]
+
+    def get_json(self, url):
+        '''
+        GETs url and returns its decoded JSON body
+        '''
+        if self.mode == 'record':
+            start = time.monotonic()
+            data = self.session.get(url).json()
+            self.append('http', url, time.monotonic() - start, data)
+            return data
+        seconds, data = self.play('http', url)
+        if self.latency:
+            time.sleep(self.latency * seconds)
+        return data
+
+    def status(self):
+        if self.mode == 'record':
+            return self.pool.status()
+        return [{'url': self.path, 'requests': sum(self.played.values())}]
@@ -0,0 +1,50 @@
+'''
+File: catalog.py
+One catalog of price feeds for every oracle, keyed by canonical pair (e.g. 'BTC/USD')
+
+Notes:
+- feeds/catalog.json maps each pair to what each oracle calls it: a Chainlink proxy 'address', a
+  Tellor request 'id', a Band 'symbol', and a DIA REST 'symbol' plus on-chain coin 'name'
+- An oracle missing from a pair's entry does not serve that pair
+- Optional 'priority' per pair (lower goes first) orders sweeps; pairs without one get DEFAULT_PRIORITY
+- Read once through contract.reference_data, so every module shares the same parsed file
+'''
+
+''' Libraries '''
+import scripts.helpers.contract
+
+''' Constants '''
+CATALOG_PATH = 'feeds/catalog.json' # Canonical pairs and each oracle's identifiers for them
+ORACLES = ['tellor', 'chainlink', 'band', 'dia'] # Oracle keys used in the catalog
+NAMES = {'tellor': 'Tellor', 'chainlink': 'Chainlink', 'band': 'Band', 'dia': 'DIA'} # Names used in snapshot rows
+DEFAULT_PRIORITY = 10 # Priority of pairs that do not set one
+
+def load():
+    '''
+    Returns the parsed catalog
+    '''
+    return scripts.helpers.contract.reference_data(CATALOG_PATH)
+
+def pairs(*oracles):
+    '''
+    Pairs served by every one of oracles (all pairs when none are given), in catalog order
+    '''
+    return [pair for pair, entry in load().items() if all(oracle in entry for oracle in oracles)]
+
+def supports(pair, oracle):
+    '''
+    Whether oracle serves pair
+    '''
+    return oracle in load().get(pair, {})
+
+def lookup(pair, oracle):
+    '''
+    Returns oracle's identifiers for pair, e.g. {'address': ...} for Chainlink
+    '''
+    entry = load().get(pair, {})
+    if oracle not in entry:
+        raise KeyError(str(pair) + ' has no ' + str(oracle) + ' feed in ' + CATALOG_PATH)
+    return entry[oracle]
+
+def priority(pair):
+    return load().get(pair, {}).get('priority', DEFAULT_PRIORITY)
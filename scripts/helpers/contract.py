@@ -1,25 +1,333 @@
 '''
 File: contract.py
-Helper function to create a contract.py 
+Helper function to create a contract.py
+
+Notes:
+- A single Web3 provider (with a pooled keep-alive HTTP session) is shared by the whole process
+- Every request goes through the endpoint pool in rpcpool.py: set ORACLE_DIFF_RPC_URLS to a comma-separated
+  list of endpoints to spread load and fail over between them (RPC_URL alone otherwise)
+- With ORACLE_DIFF_CASSETTE set, the pool and get_json() are wrapped by cassette.py, which records
+  the session or replays it offline
+- Importing this module is cheap: web3, requests and the pool are imported when first needed, and
+  LazyContract lets oracle modules keep a module-level contract that is only built on first use.
+  That first import goes through load_libraries(), one thread at a time
+- Parsed ABIs, reference data and contract objects are memoized, so repeated calls are free
+- batch_call() packs many view calls into JSON-RPC batch requests, one HTTP round-trip per chunk
+- Both single calls (through a middleware) and batch_call() go through the eth_call cache in cache.py
+- Every request, cached or not, is recorded by metrics.py (a middleware for single calls, send_batch()
+  and batch_call() for batches)
+- batch_estimate() does the same for eth_estimateGas. Estimates are kept in the store by (address,
+  code hash, calldata) and reused for ESTIMATE_MAX_AGE, so only new code or new arguments cost a request
 '''
 
 ''' Necessary helper functions '''
-from web3 import Web3
 import json
+import os
+import threading
+import time
+import scripts.helpers.cache
+import scripts.helpers.cassette
+import scripts.helpers.metrics
+import scripts.helpers.store
+
+''' Constants '''
+RPC_URL = os.environ.get('ORACLE_DIFF_RPC_URL', 'https://mainnet.infura.io/v3/f5470eb326af43adadbb81276c2e4675') # Endpoint used by every oracle (e.g. a local anvil node for testing)
+RPC_URLS = [url.strip() for url in os.environ.get('ORACLE_DIFF_RPC_URLS', '').split(',') if url.strip()] # Endpoints to pool; falls back to RPC_URL
+POOL_SIZE = 20 # Number of keep-alive connections kept open per host
+BATCH_SIZE = 100 # Default number of calls packed into one JSON-RPC batch
+TIMEOUT = 30 # Seconds to wait for a batch to come back
+ESTIMATE_MAX_AGE = 24 * 60 * 60 # Seconds a stored gas estimate is reused (proxies can change target without changing code)
+RPC_RATE = None # Requests per second this process sends to any one endpoint (rpcpool.RATE when None); set before the first request
+
+''' Shared state '''
+_lock = threading.Lock()
+_import_lock = threading.Lock()
+_imported = False
+_session = None
+_web3 = None
+_pool = None
+_abis = {} # ABI path -> parsed ABI
+_references = {} # Feed path -> parsed reference data
+_contracts = {} # (ABI path, checksum address) -> contract object
+
+def load_libraries():
+   '''
+   Imports web3, requests and the pool once. web3's modules import each other in cycles, so pipeline
+   threads importing it for the first time at once can deadlock or see half-built modules
+   '''
+   global _imported
+   if _imported:
+      return
+   with _import_lock:
+      if not _imported:
+         import requests
+         import web3
+         import scripts.helpers.rpcpool
+         _imported = True
+
+def get_session():
+   '''
+   Returns the process-wide HTTP session, so connections are reused between requests
+   '''
+   load_libraries()
+   global _session
+   import requests
+   with _lock:
+      if _session is None:
+         _session = requests.Session()
+         adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+         _session.mount('https://', adapter)
+         _session.mount('http://', adapter)
+   return _session
+
+def get_pool():
+   '''
+   Returns the process-wide endpoint pool, building it on first use. When a cassette is configured,
+   this is the cassette instead (replaying, or recording what goes through the real pool)
+   '''
+   load_libraries()
+   global _pool
+   import scripts.helpers.rpcpool
+   session = get_session()
+   with _lock:
+      if _pool is None:
+         cassette = scripts.helpers.cassette
+         if cassette.PATH and cassette.MODE == 'replay':
+            _pool = cassette.Cassette(cassette.PATH)
+         else:
+            rate = RPC_RATE if RPC_RATE is not None else scripts.helpers.rpcpool.RATE
+            _pool = scripts.helpers.rpcpool.Pool(RPC_URLS or [RPC_URL], session, rate, TIMEOUT)
+            if cassette.PATH:
+               _pool = cassette.Cassette(cassette.PATH, cassette.MODE, pool=_pool, session=session)
+   return _pool
+
+def get_json(url):
+   '''
+   GETs a REST endpoint over the shared session and returns the decoded JSON (through the cassette, if any)
+   '''
+   if scripts.helpers.cassette.PATH:
+      return get_pool().get_json(url)
+   return get_session().get(url).json()
+
+def get_web3():
+   '''
+   Returns the process-wide Web3 instance, building it on first use
+   '''
+   load_libraries()
+   global _web3
+   from web3 import Web3
+   import scripts.helpers.rpcpool
+   pool = get_pool()
+   with _lock:
+      if _web3 is None:
+         _web3 = Web3(scripts.helpers.rpcpool.PoolProvider(pool))
+         _web3.middleware_onion.inject(scripts.helpers.metrics.middleware, name='metrics', layer=0)
+         _web3.middleware_onion.inject(scripts.helpers.cache.middleware, name='call_cache', layer=0)
+   return _web3
+
+def get_abi(abi_path):
+   '''
+   Parses an ABI from disk once, and serves it from memory afterwards
+   '''
+   with _lock:
+      if abi_path not in _abis:
+         with open(abi_path, 'r') as f:
+            _abis[abi_path] = json.load(f)
+      return _abis[abi_path]
+
+def function_names():
+   '''
+   Maps the 4-byte selector ('0x...') of every function in the ABIs loaded so far to its name
+   '''
+   load_libraries()
+   from eth_utils import function_abi_to_4byte_selector
+   with _lock:
+      abis = list(_abis.values())
+   names = {}
+   for abi in abis:
+      for item in abi:
+         if item.get('type') == 'function':
+            names['0x' + function_abi_to_4byte_selector(item).hex()] = item['name']
+   return names
 
 def get_contract(abi_path, address):
    '''
    Connect to smart contracts!
    '''
-   f = open(abi_path, 'r')
-   abi = json.load(f)
-   web3 = Web3(Web3.HTTPProvider('https://mainnet.infura.io/v3/f5470eb326af43adadbb81276c2e4675'))
-   f.close()
-   return web3.eth.contract(address=Web3.toChecksumAddress(address), abi=abi)
+   load_libraries()
+   from web3 import Web3
+   key = (abi_path, Web3.toChecksumAddress(address))
+   if key not in _contracts:
+      contract = get_web3().eth.contract(address=key[1], abi=get_abi(abi_path))
+      with _lock:
+         _contracts.setdefault(key, contract)
+   return _contracts[key]
+
+class LazyContract:
+   '''
+   Stands in for get_contract(abi_path, address), which it only calls on first attribute access
+   '''
+
+   def __init__(self, abi_path, address):
+      self.abi_path = abi_path
+      self.address = address
+
+   def __getattr__(self, name):
+      return getattr(get_contract(self.abi_path, self.address), name)
 
 def reference_data(file_path):
    '''
    Get reference data (addresses, price IDs) for each oracle
    '''
-   with open(file_path) as f:
-        return json.load(f)
\ No newline at end of file
+   with _lock:
+      if file_path not in _references:
+         with open(file_path) as f:
+            _references[file_path] = json.load(f)
+      return _references[file_path]
+
+def decode_result(function, return_data):
+   '''
+   Decodes raw eth_call output the same way ContractFunction.call() does
+   '''
+   load_libraries()
+   from hexbytes import HexBytes
+   from web3._utils.abi import get_abi_output_types, map_abi_data
+   from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+   output_types = get_abi_output_types(function.abi)
+   output_data = get_web3().codec.decode_abi(output_types, HexBytes(return_data))
+   normalized_data = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, output_data)
+   if len(normalized_data) == 1:
+      return normalized_data[0]
+   return normalized_data
+
+def send_batch(payload):
+   '''
+   Posts a list of JSON-RPC requests in one HTTP round-trip, and returns the replies by id
+   '''
+   start = time.monotonic()
+   replies = {reply['id']: reply for reply in get_pool().post(payload)}
+   share = (time.monotonic() - start) / max(len(payload), 1)
+   callers = scripts.helpers.metrics.find_callers()
+   for request in payload:
+      reply = replies.get(request['id'], {})
+      contract, selector = scripts.helpers.metrics.describe(request)
+      cache = 'miss' if request['method'] == 'eth_call' else None
+      scripts.helpers.metrics.record(request['method'], contract, selector, share, scripts.helpers.metrics.size(request),
+                                     scripts.helpers.metrics.size(reply), cache, 'error' in reply, callers)
+   return replies
+
+def block_number():
+   '''
+   Asks the node for the current head block
+   '''
+   reply = send_batch([{'jsonrpc': '2.0', 'id': 0, 'method': 'eth_blockNumber', 'params': []}])[0]
+   return int(reply['result'], 16)
+
+def batch_call(functions, chunk_size=BATCH_SIZE, allow_failure=False, block_identifier='latest', final=None):
+   '''
+   Calls many contract functions (e.g. contract.functions.getRoundData(id)) by sending
+   them as JSON-RPC batches of chunk_size calls, and returns the results in order.
+   With allow_failure, calls that revert come back as None instead of raising.
+   Calls already in the eth_call cache are answered without touching the network.
+   For historical reads, final(function, result) tells which results can no longer change:
+   those are cached for good. The rest are only cached when block_identifier pins a block,
+   so reading finished rounds at 'latest' never has to ask for the head block
+   '''
+   functions = list(functions)
+   if final is not None and block_identifier == 'latest':
+      block, namespace = None, None
+   else:
+      block, namespace = scripts.helpers.cache.resolve_block(block_identifier, block_number)
+   if isinstance(block_identifier, int):
+      block_identifier = hex(block_identifier)
+
+   # Answer what we can from the cache, and only send the rest
+   calls = [{'to': function.address, 'data': function._encode_transaction_data()} for function in functions]
+   raw = [None] * len(functions)
+   missing = []
+   callers = scripts.helpers.metrics.find_callers()
+   for i, call in enumerate(calls):
+      if final is not None:
+         raw[i] = scripts.helpers.cache.lookup(call, block, 'final')
+      if raw[i] is None and block is not None:
+         raw[i] = scripts.helpers.cache.lookup(call, block, namespace)
+      if raw[i] is None:
+         missing.append(i)
+      else:
+         scripts.helpers.metrics.record('eth_call', call['to'], call['data'][:10], 0.0, scripts.helpers.metrics.size(call),
+                                        len(raw[i]), 'hit', callers=callers)
+   fetched = set(missing)
+   for start in range(0, len(missing), chunk_size):
+      chunk = missing[start:start + chunk_size]
+      payload = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_call', 'params': [calls[i], block_identifier]} for i in chunk]
+      replies = send_batch(payload)
+      for i in chunk:
+         raw[i] = replies[i] if 'error' in replies[i] else replies[i]['result']
+
+   results = []
+   for i, (function, result) in enumerate(zip(functions, raw)):
+      if isinstance(result, dict):
+         if allow_failure:
+            results.append(None)
+            continue
+         raise ValueError(result['error'])
+      results.append(decode_result(function, result))
+      if i not in fetched:
+         continue
+      if final is not None and final(function, results[-1]):
+         scripts.helpers.cache.save(calls[i], block, result, 'final')
+      elif block is not None:
+         scripts.helpers.cache.save(calls[i], block, result, namespace)
+   return results
+
+def code_hashes(addresses):
+   '''
+   Returns {address: keccak hash of its code} for addresses, reading the code in batches
+   '''
+   from eth_utils import keccak
+   addresses = sorted(set(addresses))
+   payload = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_getCode', 'params': [address, 'latest']} for i, address in enumerate(addresses)]
+   hashes = {}
+   for start in range(0, len(payload), BATCH_SIZE):
+      for i, reply in send_batch(payload[start:start + BATCH_SIZE]).items():
+         if 'error' in reply:
+            raise ValueError(reply['error'])
+         hashes[addresses[i]] = '0x' + keccak(hexstr=reply['result']).hex()
+   return hashes
+
+def batch_estimate(functions, chunk_size=BATCH_SIZE, allow_failure=False):
+   '''
+   Estimates the gas of many contract function calls, and returns the estimates in order.
+   Estimates stored for the same code and calldata are reused, and the rest are sent as
+   JSON-RPC batches of chunk_size. With allow_failure, calls that revert come back as None
+   '''
+   functions = list(functions)
+   calls = [{'to': function.address, 'data': function._encode_transaction_data()} for function in functions]
+   hashes = code_hashes(call['to'] for call in calls)
+   keys = [(call['to'], hashes[call['to']], call['data']) for call in calls]
+   now = int(scripts.helpers.cassette.now())
+   estimates = scripts.helpers.store.load_estimates(keys, now - ESTIMATE_MAX_AGE)
+   missing = sorted({key for key in keys if key not in estimates})
+   errors = {}
+   for start in range(0, len(missing), chunk_size):
+      chunk = missing[start:start + chunk_size]
+      payload = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_estimateGas', 'params': [{'to': key[0], 'data': key[2]}]} for i, key in enumerate(chunk)]
+      replies = send_batch(payload)
+      records = []
+      for i, key in enumerate(chunk):
+         if 'error' in replies[i]:
+            errors[key] = replies[i]['error']
+            continue
+         estimates[key] = int(replies[i]['result'], 16)
+         records.append(key + (estimates[key], now))
+      scripts.helpers.store.save_estimates(records)
+
+   results = []
+   for key in keys:
+      if key in errors:
+         if allow_failure:
+            results.append(None)
+            continue
+         raise ValueError(errors[key])
+      results.append(estimates[key])
+   return results
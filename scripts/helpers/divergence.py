@@ -0,0 +1,167 @@
+'''
+File: divergence.py
+Cross-oracle divergence: puts every oracle's price for a pair on one time grid and measures how far apart they are
+
+Notes:
+- Each oracle's price is a step function (an answer stands until the next update), so the value at a
+  grid point is the latest update at or before it. Averages over grid points are therefore time-weighted
+- Before an oracle's first update its column is NaN, and it is left out of the spread there
+- update() only re-aligns the grid points at or after the first new round, so feeding rounds in as they
+  arrive costs O(new grid points), not O(history)
+- Spread is max - min across oracles; relative spread divides by the median of the oracles at that point
+'''
+
+''' Libraries '''
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+import scripts.helpers.align
+
+''' Constants '''
+GRID_STEP = 60 # Seconds between grid points
+WINDOW = 3600 # Default window for the rolling and per-window measures, in seconds
+
+def window_view(values, width):
+    '''
+    Read-only (len - width + 1, width) view of every run of width consecutive values
+    (sliding_window_view needs NumPy 1.20, and requirements.txt pins 1.19)
+    '''
+    return as_strided(values, shape=(len(values) - width + 1, width), strides=values.strides * 2, writeable=False)
+
+class Divergence:
+    '''
+    Time-aligned prices of several oracles for one pair
+    '''
+
+    def __init__(self, pair, step=GRID_STEP):
+        self.pair = pair
+        self.step = step
+        self.grid = np.empty(0, dtype=np.int64)
+        self.columns = {} # Oracle name -> prices on the grid
+        self.rounds = {} # Oracle name -> (timestamp, price) of its newest round, carried into new rounds
+
+    def extend_grid(self, until):
+        '''
+        Grows the grid up to until, carrying each oracle's newest price onto the new points
+        '''
+        points = np.arange(self.grid[-1] + self.step, until + 1, self.step, dtype=np.int64)
+        self.grid = np.concatenate([self.grid, points])
+        for name, column in self.columns.items():
+            self.columns[name] = np.concatenate([column, np.full(len(points), self.rounds[name][1][-1])])
+
+    def update(self, name, timestamps, prices):
+        '''
+        Adds rounds of one oracle (Unix seconds, prices, oldest first). Rounds at or before the
+        newest one already seen for that oracle are ignored
+        '''
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        seen_times, seen_prices = self.rounds.get(name, (np.empty(0, dtype=np.int64), np.empty(0)))
+        if len(seen_times):
+            fresh = timestamps > seen_times[-1]
+            timestamps, prices = timestamps[fresh], prices[fresh]
+        if len(timestamps) == 0:
+            return self
+
+        # The earliest update of any oracle starts the grid
+        if len(self.grid) == 0:
+            self.grid = np.array([timestamps[0] - timestamps[0] % self.step], dtype=np.int64)
+        elif timestamps[0] < self.grid[0]:
+            self.prepend_grid(timestamps[0])
+        self.extend_grid(timestamps[-1])
+        if name not in self.columns:
+            self.columns[name] = np.full(len(self.grid), np.nan)
+
+        # Only the last known round and the new ones are needed to re-align from here on
+        times = np.concatenate([seen_times[-1:], timestamps])
+        values = np.concatenate([seen_prices[-1:], prices])
+        first = int(np.searchsorted(self.grid, timestamps[0], side='left'))
+        self.columns[name][first:] = scripts.helpers.align.align(self.grid[first:], times, values, 'backward')
+        self.rounds[name] = (timestamps[-1:], prices[-1:])
+        return self
+
+    def prepend_grid(self, start):
+        '''
+        Grows the grid back to start. Oracles already on the grid had no rounds that early, so
+        their columns are NaN there
+        '''
+        start = start - start % self.step
+        points = np.arange(start, self.grid[0], self.step, dtype=np.int64)
+        self.grid = np.concatenate([points, self.grid])
+        for name, column in self.columns.items():
+            self.columns[name] = np.concatenate([np.full(len(points), np.nan), column])
+
+    def matrix(self):
+        '''
+        Prices as a (grid points, oracles) array, columns in the order of self.columns
+        '''
+        if not self.columns:
+            return np.empty((len(self.grid), 0))
+        return np.column_stack(list(self.columns.values()))
+
+    def spread(self):
+        '''
+        Returns (absolute spread, relative spread) at every grid point, NaN where fewer than two oracles report
+        '''
+        prices = self.matrix()
+        reporting = np.sum(~np.isnan(prices), axis=1) if prices.size else np.zeros(len(self.grid))
+        absolute = np.full(len(self.grid), np.nan)
+        relative = np.full(len(self.grid), np.nan)
+        enough = reporting >= 2
+        if np.any(enough):
+            absolute[enough] = np.nanmax(prices[enough], axis=1) - np.nanmin(prices[enough], axis=1)
+            relative[enough] = absolute[enough] / np.nanmedian(prices[enough], axis=1)
+        return absolute, relative
+
+    def rolling(self, window=WINDOW, relative=True):
+        '''
+        Returns (max spread, time-weighted mean spread) over the window ending at every grid point
+        (NaN until a full window has passed)
+        '''
+        spread = self.spread()[1 if relative else 0]
+        width = max(int(window // self.step), 1)
+        peak = np.full(len(spread), np.nan)
+        mean = np.full(len(spread), np.nan)
+        if len(spread) >= width:
+            views = window_view(spread, width)
+            valid = ~np.all(np.isnan(views), axis=1)
+            peak[width - 1:][valid] = np.nanmax(views[valid], axis=1)
+            mean[width - 1:][valid] = np.nanmean(views[valid], axis=1)
+        return peak, mean
+
+    def windows(self, window=WINDOW, relative=True):
+        '''
+        Splits the grid into consecutive windows and returns one row per window:
+        [window start, max spread, time-weighted mean spread, share of the window with a spread]
+        '''
+        spread = self.spread()[1 if relative else 0]
+        width = max(int(window // self.step), 1)
+        rows = []
+        for first in range(0, len(spread), width):
+            chunk = spread[first:first + width]
+            covered = ~np.isnan(chunk)
+            if np.any(covered):
+                rows.append([int(self.grid[first]), float(np.max(chunk[covered])), float(np.mean(chunk[covered])), float(np.mean(covered))])
+            else:
+                rows.append([int(self.grid[first]), np.nan, np.nan, 0.0])
+        return rows
+
+    def summary(self, relative=True):
+        '''
+        Maximum and time-weighted mean spread over the whole grid
+        '''
+        spread = self.spread()[1 if relative else 0]
+        covered = ~np.isnan(spread)
+        if not np.any(covered):
+            return {'pair': self.pair, 'max': np.nan, 'mean': np.nan, 'at': None}
+        worst = int(np.nanargmax(spread))
+        return {'pair': self.pair, 'max': float(spread[worst]), 'mean': float(np.mean(spread[covered])), 'at': int(self.grid[worst])}
+
+def from_series(pair, named_series, step=GRID_STEP):
+    '''
+    Builds a Divergence from {oracle name: RoundSeries}; empty series are skipped
+    '''
+    divergence = Divergence(pair, step)
+    for name, series in named_series.items():
+        if len(series):
+            divergence.update(name, series.timestamps, series.prices)
+    return divergence
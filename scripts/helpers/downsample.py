@@ -0,0 +1,88 @@
+'''
+File: downsample.py
+Visual downsampling for charts: keeps the shape (and the spikes) of a series in a fixed number of points
+
+Notes:
+- Buckets are slices of time, not of point count, so every series drawn on one chart can share
+  the same grid (pass the same span) and their x-axes line up
+- 'lttb' (Largest-Triangle-Three-Buckets) keeps one point per bucket plus both ends
+- 'minmax' keeps the lowest and highest point of every bucket, so no outlier is ever dropped
+'''
+
+''' Libraries '''
+import numpy as np
+
+def common_span(times_list):
+    '''
+    Returns (start, stop) covering every non-empty series in times_list
+    '''
+    times_list = [np.asarray(times) for times in times_list if len(times) > 0]
+    if not times_list:
+        return (0, 0)
+    return (min(times[0] for times in times_list), max(times[-1] for times in times_list))
+
+def group_by_bucket(times, edges):
+    '''
+    Returns the positions of times falling in each non-empty bucket, in time order
+    '''
+    buckets = np.clip(np.searchsorted(edges, times, side='right') - 1, 0, len(edges) - 2)
+    cuts = np.flatnonzero(np.diff(buckets)) + 1
+    return np.split(np.arange(len(times)), cuts)
+
+def lttb(times, values, edges):
+    '''
+    Indices chosen by Largest-Triangle-Three-Buckets: the first and last points, plus the point of
+    each bucket forming the largest triangle with the previously kept point and the next bucket's average
+    '''
+    count = len(times)
+    if count <= len(edges) + 1:
+        return np.arange(count)
+    x = np.asarray(times, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    groups = [group + 1 for group in group_by_bucket(x[1:-1], edges)]
+    chosen = [0]
+    for k, group in enumerate(groups):
+        if k + 1 < len(groups):
+            next_x, next_y = x[groups[k + 1]].mean(), y[groups[k + 1]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        a = chosen[-1]
+        areas = np.abs((x[a] - next_x) * (y[group] - y[a]) - (x[a] - x[group]) * (next_y - y[a]))
+        chosen.append(int(group[np.argmax(areas)]))
+    chosen.append(count - 1)
+    return np.array(chosen)
+
+def minmax(times, values, edges):
+    '''
+    Indices of the lowest and highest point in every bucket, in time order
+    '''
+    values = np.asarray(values)
+    chosen = []
+    for group in group_by_bucket(np.asarray(times), edges):
+        chosen += [group[np.argmin(values[group])], group[np.argmax(values[group])]]
+    return np.unique(np.array(chosen, dtype=np.int64))
+
+def downsample_indices(times, values, max_points, method='lttb', span=None):
+    '''
+    Returns the positions of at most max_points entries to draw, bucketed over span (defaults to
+    the series' own range). times must be sorted
+    '''
+    times = np.asarray(times)
+    if len(times) <= max_points:
+        return np.arange(len(times))
+    if span is None:
+        span = common_span([times])
+    if method == 'lttb':
+        edges = np.linspace(span[0], span[1], max(max_points - 2, 1) + 1)
+        return lttb(times, values, edges)
+    if method == 'minmax':
+        edges = np.linspace(span[0], span[1], max(max_points // 2, 1) + 1)
+        return minmax(times, values, edges)
+    raise ValueError("method must be 'lttb' or 'minmax'")
+
+def downsample(times, values, max_points, method='lttb', span=None):
+    '''
+    Returns (times, values) thinned to at most max_points with downsample_indices
+    '''
+    chosen = downsample_indices(times, values, max_points, method, span)
+    return np.asarray(times)[chosen], np.asarray(values)[chosen]
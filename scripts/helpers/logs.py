@@ -0,0 +1,78 @@
+'''
+File: logs.py
+Scans block ranges for contract events with eth_getLogs
+
+Notes:
+- Providers cap how many blocks or results one eth_getLogs call may cover, so the range
+  shrinks when a call is rejected and grows back while calls succeed
+- pending_range() makes ingestion incremental: the store keeps the last ingested block per contract,
+  and only blocks at least CONFIRMATIONS deep are ingested, so a reorg cannot leave stale rows behind
+'''
+
+''' Libraries '''
+import scripts.helpers.contract
+import scripts.helpers.store
+
+''' Constants '''
+INITIAL_STEP = 2000 # Blocks covered by the first eth_getLogs call
+MAX_STEP = 100000 # Largest range we will ever ask for in one call
+CONFIRMATIONS = 12 # Blocks behind the head before logs are ingested
+BLOCK_TIME = 12 # Seconds per block, to turn a number of days into a block range
+
+def pending_range(oracle, source, num_of_days):
+    '''
+    Returns the (first, last) blocks of a contract's logs not ingested yet, reaching back at
+    least num_of_days, or None when it is up to date. Save last with store.save_log_mark once done
+    '''
+    last = scripts.helpers.contract.block_number() - CONFIRMATIONS
+    first = max(last - int(num_of_days * 24 * 60 * 60 / BLOCK_TIME), 0)
+    mark = scripts.helpers.store.load_log_mark(oracle, source)
+    if mark is not None and mark >= first:
+        first = mark + 1
+    return (first, last) if first <= last else None
+
+def get_logs(address, topics, from_block, to_block='latest', step=INITIAL_STEP):
+    '''
+    Yields raw logs emitted by address between from_block and to_block, oldest first. The
+    block range halves whenever the provider rejects a call, and doubles after a success
+    '''
+    scripts.helpers.contract.load_libraries()
+    import requests
+    from web3 import Web3
+    web3 = scripts.helpers.contract.get_web3()
+    if to_block == 'latest':
+        to_block = web3.eth.block_number
+    start = from_block
+    while start <= to_block:
+        end = min(start + step - 1, to_block)
+        try:
+            logs = web3.eth.get_logs({
+                'address': Web3.toChecksumAddress(address),
+                'topics': topics,
+                'fromBlock': start,
+                'toBlock': end,
+            })
+        except (ValueError, requests.exceptions.RequestException):
+            if step == 1:
+                raise
+            step = max(step // 2, 1)
+            continue
+        for log in logs:
+            yield log
+        start = end + 1
+        step = min(step * 2, MAX_STEP)
+
+def get_events(events, address, from_block, to_block='latest', step=INITIAL_STEP):
+    '''
+    Yields decoded events (any of the given contract events) emitted by address, oldest first
+    '''
+    scripts.helpers.contract.load_libraries()
+    from eth_utils import event_abi_to_log_topic
+    from web3 import Web3
+    by_topic = {}
+    for event in events:
+        decoder = event()
+        by_topic[bytes(event_abi_to_log_topic(decoder.abi))] = decoder
+    topics = [[Web3.toHex(topic) for topic in by_topic]]
+    for log in get_logs(address, topics, from_block, to_block, step):
+        yield by_topic[bytes(log['topics'][0])].processLog(log)
@@ -0,0 +1,170 @@
+'''
+File: metrics.py
+Counts what every JSON-RPC request costs, and which code asked for it
+
+Notes:
+- One record per request (or per call inside a batch): method, contract, function selector, latency,
+  bytes sent and received, and whether the eth_call cache answered it
+- Records are aggregated in memory per (entry, caller, method, contract, selector):
+  caller is the innermost project function outside scripts/helpers that led to the request, and
+  entry is the outermost one (the function handed to the pipeline, or the dashboard script itself)
+- Requests sent as part of a batch share the batch's latency evenly
+- Set ORACLE_DIFF_METRICS=0 to switch recording off, or ORACLE_DIFF_METRICS_PATH to dump a JSON
+  summary there when the process exits
+- The collector, which makes the requests the dashboard shows, saves its summary to SUMMARY_PATH every
+  METRICS_INTERVAL (collector.py); the dashboard's "RPC usage" panel reads it back with load()
+'''
+
+''' Libraries '''
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+''' Constants '''
+ENABLED = os.environ.get('ORACLE_DIFF_METRICS', '1') != '0' # Whether requests are recorded at all
+DUMP_PATH = os.environ.get('ORACLE_DIFF_METRICS_PATH') # Optional file the summary is written to at exit
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10] # Upper edges (seconds) of the latency histogram
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # Frames outside this are library code
+HELPERS_ROOT = os.path.dirname(os.path.abspath(__file__)) # Frames in here are plumbing, not callers
+SUMMARY_PATH = 'data/rpc-metrics.json' # Where the collector saves its summary for the dashboard
+
+''' Shared state '''
+_lock = threading.Lock()
+_local = threading.local()
+_records = {} # (entry, caller, method, contract, selector) -> totals
+
+def find_callers():
+    '''
+    Returns (entry, caller) as 'module.function' names from the current stack
+    '''
+    entry = caller = '<unknown>'
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path.startswith(PROJECT_ROOT) and not path.startswith(HELPERS_ROOT):
+            name = frame.f_globals.get('__name__', '?') + '.' + frame.f_code.co_name
+            if caller == '<unknown>':
+                caller = name
+            entry = name
+        frame = frame.f_back
+    return entry, caller
+
+def note_cache(outcome):
+    '''
+    Called by the eth_call cache with 'hit' or 'miss', so the request being recorded on this thread knows
+    '''
+    _local.cache = outcome
+
+def record(method, contract=None, selector=None, seconds=0.0, sent=0, received=0, cache=None, error=False, callers=None):
+    '''
+    Adds one request to the totals of whoever is on the stack. A batch passes callers (from
+    find_callers()) so the stack is walked once per batch rather than once per request
+    '''
+    if not ENABLED:
+        return
+    key = (callers or find_callers()) + (method, contract, selector)
+    bucket = next((i for i, edge in enumerate(LATENCY_BUCKETS) if seconds <= edge), len(LATENCY_BUCKETS))
+    with _lock:
+        totals = _records.get(key)
+        if totals is None:
+            totals = _records[key] = {'count': 0, 'errors': 0, 'seconds': 0.0, 'sent': 0, 'received': 0,
+                                      'hits': 0, 'misses': 0, 'latency': [0] * (len(LATENCY_BUCKETS) + 1)}
+        totals['count'] += 1
+        totals['errors'] += bool(error)
+        totals['seconds'] += seconds
+        totals['sent'] += sent
+        totals['received'] += received
+        totals['hits'] += cache == 'hit'
+        totals['misses'] += cache == 'miss'
+        totals['latency'][bucket] += 1
+
+def describe(request):
+    '''
+    Returns (contract, selector) of a JSON-RPC request, for eth_call and eth_estimateGas
+    '''
+    params = request.get('params') or []
+    if request.get('method') in ('eth_call', 'eth_estimateGas') and params and isinstance(params[0], dict):
+        data = params[0].get('data') or ''
+        return params[0].get('to'), data[:10] or None
+    return None, None
+
+def size(value):
+    return len(json.dumps(value, default=str))
+
+def middleware(make_request, web3):
+    '''
+    Web3 middleware that records every request, including the ones the cache answers, so it
+    has to sit outside the cache middleware
+    '''
+    def metrics_middleware(method, params):
+        if not ENABLED:
+            return make_request(method, params)
+        _local.cache = None
+        start = time.monotonic()
+        try:
+            response = make_request(method, params)
+        except Exception:
+            contract, selector = describe({'method': method, 'params': params})
+            record(method, contract, selector, time.monotonic() - start, size(params), 0, _local.cache, error=True)
+            raise
+        contract, selector = describe({'method': method, 'params': params})
+        record(method, contract, selector, time.monotonic() - start, size(params), size(response), _local.cache, 'error' in response)
+        return response
+    return metrics_middleware
+
+def report(group_by=('caller', 'method', 'contract', 'selector')):
+    '''
+    Returns the totals summed over everything but group_by, most requested first. Each row also has
+    'function' (the name behind the selector, when an ABI with it is loaded) if selectors are kept
+    '''
+    fields = ('entry', 'caller', 'method', 'contract', 'selector')
+    names = {}
+    if 'selector' in group_by:
+        import scripts.helpers.contract
+        names = scripts.helpers.contract.function_names()
+    rows = {}
+    with _lock:
+        for key, totals in _records.items():
+            labels = dict(zip(fields, key))
+            group = tuple(labels[field] for field in group_by)
+            row = rows.get(group)
+            if row is None:
+                row = rows[group] = {field: labels[field] for field in group_by}
+                row.update({'count': 0, 'errors': 0, 'seconds': 0.0, 'sent': 0, 'received': 0, 'hits': 0, 'misses': 0,
+                            'latency': [0] * (len(LATENCY_BUCKETS) + 1)})
+            for name in ('count', 'errors', 'seconds', 'sent', 'received', 'hits', 'misses'):
+                row[name] += totals[name]
+            row['latency'] = [a + b for a, b in zip(row['latency'], totals['latency'])]
+    for row in rows.values():
+        if 'selector' in row:
+            row['function'] = names.get(row['selector'])
+    return sorted(rows.values(), key=lambda row: row['count'], reverse=True)
+
+def dump(path, group_by=('entry', 'caller', 'method', 'contract', 'selector')):
+    '''
+    Writes report(group_by), the latency bucket edges and the time to path as JSON. The file is
+    replaced in one step, so a reader never sees half of it
+    '''
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'latency_buckets': LATENCY_BUCKETS, 'rows': report(group_by), 'time': int(time.time())}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def load(path):
+    '''
+    Reads a summary written by dump(), or returns None when there is none yet
+    '''
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def reset():
+    with _lock:
+        _records.clear()
+
+if DUMP_PATH:
+    atexit.register(dump, DUMP_PATH)
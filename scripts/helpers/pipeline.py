@@ -0,0 +1,76 @@
+'''
+File: pipeline.py
+Runs independent oracle/feed requests concurrently, so a page waits for its slowest feed
+instead of the sum of all of them
+
+Notes:
+- An asyncio loop lives on a background thread; submit() hands back a concurrent.futures.Future
+  right away, so callers can start everything up front and wait on each result where it is used
+- web3 5.x has no async contract calls, so the blocking oracle functions run on a bounded
+  thread pool underneath the loop
+- A timeout stops the wait, not the worker thread; every HTTP call also has its own timeout
+'''
+
+''' Libraries '''
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+''' Constants '''
+MAX_CONCURRENCY = 8 # Requests allowed in flight at once
+TIMEOUT = 120 # Seconds a single request may take before its future fails
+
+''' Shared state '''
+_lock = threading.Lock()
+_loop = None
+_semaphore = None
+_executor = None
+
+def get_loop():
+    '''
+    Starts the background event loop (and its worker pool) on first use
+    '''
+    global _loop, _semaphore, _executor
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+            _semaphore = asyncio.run_coroutine_threadsafe(make_semaphore(), _loop).result()
+    return _loop
+
+async def make_semaphore():
+    '''
+    Semaphores have to be created on the loop that uses them
+    '''
+    return asyncio.Semaphore(MAX_CONCURRENCY)
+
+async def run_task(function, args, timeout):
+    '''
+    Runs one blocking call on the worker pool, once a concurrency slot is free
+    '''
+    async with _semaphore:
+        call = functools.partial(function, *args)
+        return await asyncio.wait_for(_loop.run_in_executor(_executor, call), timeout)
+
+def submit(function, *args, timeout=TIMEOUT):
+    '''
+    Schedules function(*args) and returns a future for its result
+    '''
+    loop = get_loop()
+    return asyncio.run_coroutine_threadsafe(run_task(function, args, timeout), loop)
+
+def submit_all(calls, timeout=TIMEOUT):
+    '''
+    Schedules a dict of name -> (function, args...) and returns a dict of name -> future
+    '''
+    return {name: submit(call[0], *call[1:], timeout=timeout) for name, call in calls.items()}
+
+def as_completed(futures):
+    '''
+    Yields (name, result) from a dict of futures in the order they finish
+    '''
+    names = {future: name for name, future in futures.items()}
+    for future in concurrent.futures.as_completed(names):
+        yield names[future], future.result()
@@ -0,0 +1,55 @@
+'''
+File: ratelimit.py
+Token buckets for keeping request rates under a provider's limits
+
+Notes:
+- A bucket refills at rate tokens per second up to burst tokens; each request spends one
+- try_acquire() never blocks, so a scheduler can move on to work for another bucket instead of waiting
+'''
+
+''' Libraries '''
+import threading
+import time
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket
+    '''
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        '''
+        Spends tokens if they are available right now, and reports whether it did
+        '''
+        with self.lock:
+            self.refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def wait_time(self, tokens=1):
+        '''
+        Seconds until tokens will be available
+        '''
+        with self.lock:
+            self.refill()
+            return max(tokens - self.tokens, 0) / self.rate
+
+    def acquire(self, tokens=1):
+        '''
+        Blocks until tokens are available, then spends them
+        '''
+        while not self.try_acquire(tokens):
+            time.sleep(self.wait_time(tokens))
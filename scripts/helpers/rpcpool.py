@@ -0,0 +1,224 @@
+'''
+File: rpcpool.py
+Spreads JSON-RPC traffic over several endpoints, favouring whichever is fastest and healthy
+
+Notes:
+- Each endpoint keeps an EWMA of its latency and of its error rate; requests go to the lowest
+  latency * (1 + ERROR_PENALTY * error rate) among endpoints that are not backing off
+- If the chosen endpoint has not answered after max(HEDGE_AFTER, HEDGE_FACTOR * its usual latency),
+  the same request is sent to the next best endpoint and the first answer wins. Only read-only calls
+  go through here, so a duplicate is harmless
+- An HTTP 429 (or a JSON-RPC "limit exceeded" reply) backs the endpoint off, honouring Retry-After and
+  doubling up to MAX_BACKOFF; every endpoint also has a token bucket so we stay under its limit
+- Connection errors, timeouts and other HTTP errors fail over to the next endpoint until all were tried.
+  Then, up to RETRIES more times, the pool waits (RETRY_DELAY, doubling, and until the first endpoint is
+  done resting) and goes round again, so a single endpoint that answers 429 or 5xx is retried too
+'''
+
+''' Libraries '''
+import concurrent.futures
+import threading
+import time
+import requests
+from web3.providers.base import JSONBaseProvider
+import scripts.helpers.ratelimit
+
+''' Constants '''
+RATE = 25 # Requests per second sent to any one endpoint
+HEDGE_AFTER = 0.5 # Seconds to wait at least before hedging a slow request
+HEDGE_FACTOR = 3 # Hedge once a request takes this many times the endpoint's usual latency
+SMOOTHING = 0.2 # Weight of the newest sample in the latency and error EWMAs
+ERROR_PENALTY = 10 # How much the error rate inflates an endpoint's score
+BACKOFF = 1 # Seconds an endpoint rests after its first 429, doubling on each one after
+MAX_BACKOFF = 60 # Longest rest after repeated 429s
+RATE_LIMIT_CODES = {429, -32005} # JSON-RPC error codes providers use for "too many requests"
+TIMEOUT = 30 # Seconds a single attempt may take
+RETRIES = 4 # Extra rounds over every endpoint once all of them failed
+RETRY_DELAY = 0.5 # Seconds before the first extra round, doubling for each one after
+WORKERS = 32 # Threads sending requests (a hedged request uses two)
+
+''' Shared state '''
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=WORKERS)
+
+class RateLimited(IOError):
+    '''
+    The endpoint asked us to slow down
+    '''
+
+class Endpoint:
+    '''
+    One JSON-RPC URL and what we have learned about it
+    '''
+
+    def __init__(self, url, rate=RATE):
+        self.url = url
+        self.latency = None
+        self.error_rate = 0.0
+        self.backoff = 0
+        self.resting_until = 0.0
+        self.bucket = scripts.helpers.ratelimit.TokenBucket(rate)
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'hedges': 0}
+        self.lock = threading.Lock()
+
+    def score(self):
+        '''
+        Lower is better. Endpoints that were never tried score 0, so each gets measured early;
+        ones that have only ever failed count as taking a full TIMEOUT
+        '''
+        if self.latency is None:
+            return 0.0 if self.stats['requests'] == 0 else TIMEOUT * (1 + ERROR_PENALTY * self.error_rate)
+        return self.latency * (1 + ERROR_PENALTY * self.error_rate)
+
+    def resting(self, now):
+        return now < self.resting_until
+
+    def record(self, seconds=None, error=False, rate_limited=False, retry_after=None):
+        '''
+        Folds the outcome of one attempt into the EWMAs, and starts a backoff on a rate limit
+        '''
+        with self.lock:
+            self.stats['requests'] += 1
+            failed = error or rate_limited
+            self.error_rate = (1 - SMOOTHING) * self.error_rate + SMOOTHING * failed
+            if error:
+                self.stats['errors'] += 1
+            if rate_limited:
+                self.stats['rate_limited'] += 1
+                self.backoff = min(max(self.backoff * 2, BACKOFF), MAX_BACKOFF)
+                self.resting_until = time.monotonic() + max(self.backoff, retry_after or 0)
+            if not failed:
+                self.backoff = 0
+                self.latency = seconds if self.latency is None else (1 - SMOOTHING) * self.latency + SMOOTHING * seconds
+
+    def status(self):
+        return dict(self.stats, url=self.url, latency=self.latency, error_rate=self.error_rate,
+                    resting=max(self.resting_until - time.monotonic(), 0))
+
+def retry_after(response):
+    '''
+    Seconds from a Retry-After header, if it has a number in it
+    '''
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error):
+    '''
+    Client errors other than 429 would fail the same way again
+    '''
+    response = getattr(error, 'response', None)
+    return response is None or response.status_code >= 500 or response.status_code == 429
+
+def is_rate_limited(data):
+    '''
+    Whether a JSON-RPC reply (or any reply of a batch) is a "too many requests" error
+    '''
+    replies = data if isinstance(data, list) else [data]
+    return any(isinstance(reply, dict) and isinstance(reply.get('error'), dict) and reply['error'].get('code') in RATE_LIMIT_CODES for reply in replies)
+
+class Pool:
+    '''
+    A set of interchangeable endpoints behind one post()
+    '''
+
+    def __init__(self, urls, session=None, rate=RATE, timeout=TIMEOUT):
+        if not urls:
+            raise ValueError('An RPC pool needs at least one endpoint')
+        self.endpoints = [Endpoint(url, rate) for url in urls]
+        self.session = session or requests.Session()
+        self.timeout = timeout
+
+    def pick(self, exclude, wait=True):
+        '''
+        Returns the best endpoint outside exclude that is not resting and has a token. When all of
+        them are throttled, waits for the first to free up (or returns None without wait)
+        '''
+        while True:
+            now = time.monotonic()
+            candidates = sorted((e for e in self.endpoints if e not in exclude and not e.resting(now)), key=Endpoint.score)
+            for endpoint in candidates:
+                if endpoint.bucket.try_acquire():
+                    return endpoint
+            remaining = [e for e in self.endpoints if e not in exclude]
+            if not remaining or not wait:
+                return None
+            time.sleep(max(min(max(e.resting_until - now, 0) + e.bucket.wait_time() for e in remaining), 0.01))
+
+    def send(self, endpoint, payload):
+        '''
+        One attempt against one endpoint. Returns the decoded JSON reply
+        '''
+        start = time.monotonic()
+        try:
+            response = self.session.post(endpoint.url, json=payload, timeout=self.timeout)
+            if response.status_code == 429:
+                endpoint.record(rate_limited=True, retry_after=retry_after(response))
+                raise RateLimited(endpoint.url + ' returned 429')
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            endpoint.record(error=True)
+            raise
+        if is_rate_limited(data):
+            endpoint.record(rate_limited=True, retry_after=retry_after(response))
+            raise RateLimited(endpoint.url + ' rate limited the request')
+        endpoint.record(time.monotonic() - start)
+        return data
+
+    def post(self, payload):
+        '''
+        Sends a JSON-RPC request (or batch) and returns the decoded reply, hedging slow attempts and
+        failing over until every endpoint has been tried, then retrying RETRIES more rounds
+        '''
+        tried = []
+        last_error = None
+        retries = 0
+        while True:
+            primary = self.pick(tried)
+            if primary is None:
+                if retries >= RETRIES or not is_retryable(last_error):
+                    raise last_error
+
+                # Every endpoint failed: back off, and pick() waits for any still resting after a 429
+                time.sleep(RETRY_DELAY * 2 ** retries)
+                retries += 1
+                tried = []
+                continue
+            tried.append(primary)
+            attempts = {_executor.submit(self.send, primary, payload): primary}
+
+            # Hedge to the next best endpoint if the first one is slow to answer
+            hedge_after = max(HEDGE_AFTER, HEDGE_FACTOR * (primary.latency or 0))
+            done, _ = concurrent.futures.wait(attempts, timeout=hedge_after)
+            if not done:
+                backup = self.pick(tried, wait=False)
+                if backup is not None:
+                    tried.append(backup)
+                    with backup.lock:
+                        backup.stats['hedges'] += 1
+                    attempts[_executor.submit(self.send, backup, payload)] = backup
+
+            for attempt in concurrent.futures.as_completed(attempts):
+                try:
+                    return attempt.result()
+                except (IOError, ValueError) as error:
+                    last_error = error
+
+    def status(self):
+        '''
+        What the pool knows about each endpoint, best first
+        '''
+        return [endpoint.status() for endpoint in sorted(self.endpoints, key=Endpoint.score)]
+
+class PoolProvider(JSONBaseProvider):
+    '''
+    Web3 provider that sends every request through a Pool
+    '''
+
+    def __init__(self, pool):
+        self.pool = pool
+        super().__init__()
+
+    def make_request(self, method, params):
+        return self.pool.post({'jsonrpc': '2.0', 'method': method, 'params': params or [], 'id': next(self.request_counter)})
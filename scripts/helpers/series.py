@@ -0,0 +1,112 @@
+'''
+File: series.py
+Columnar round history shared by every oracle module
+
+Notes:
+- Each column is a contiguous NumPy array, oldest round first
+- Round IDs do not fit in 64 bits (Chainlink puts the phase above bit 64), so they are kept as
+  a uint16 phase column plus a uint64 round column
+- Answers stay as raw integers and are only scaled by 10 ** decimals when prices are asked for. They are
+  int64 when every answer fits, and Python integers (an object column) otherwise, since answers are int256
+  and an 18-decimal feed passes 2 ** 63 at a price of about 9.2
+- Slicing with [a:b] or [::step] returns views of the same arrays, not copies
+'''
+
+''' Libraries '''
+import numpy as np
+
+''' Constants '''
+PHASE_OFFSET = 64 # Bits the phase ID is shifted by inside a round ID
+ROUND_MASK = (1 << PHASE_OFFSET) - 1
+
+def as_answers(answers):
+    '''
+    Raw answers as an int64 column, or an object column when some do not fit in 64 bits
+    '''
+    if isinstance(answers, np.ndarray):
+        return answers
+    try:
+        return np.asarray(answers, dtype=np.int64)
+    except OverflowError:
+        return np.asarray(answers, dtype=object)
+
+class RoundSeries:
+    '''
+    History of one feed: round IDs, raw answers and update timestamps (Unix seconds)
+    '''
+
+    def __init__(self, phases, rounds, answers, timestamps, decimals):
+        self.phases = np.asarray(phases, dtype=np.uint16)
+        self.rounds = np.asarray(rounds, dtype=np.uint64)
+        self.answers = as_answers(answers)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.decimals = decimals
+
+    @classmethod
+    def from_rows(cls, rows, decimals):
+        '''
+        Builds a series from rows in the round data format [roundId, answer, startedAt, updatedAt, ...],
+        in any order
+        '''
+        phases = np.fromiter((row[0] >> PHASE_OFFSET for row in rows), dtype=np.uint16, count=len(rows))
+        rounds = np.fromiter((row[0] & ROUND_MASK for row in rows), dtype=np.uint64, count=len(rows))
+        answers = as_answers([row[1] for row in rows])
+        timestamps = np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows))
+        order = np.lexsort((rounds, phases))
+        return cls(phases[order], rounds[order], answers[order], timestamps[order], decimals)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        '''
+        Slices every column together; basic slices are zero-copy views
+        '''
+        if isinstance(index, int):
+            index = slice(index, index + 1 if index != -1 else None)
+        return RoundSeries(self.phases[index], self.rounds[index], self.answers[index], self.timestamps[index], self.decimals)
+
+    @property
+    def round_ids(self):
+        '''
+        Full round IDs as Python integers
+        '''
+        return [(int(phase) << PHASE_OFFSET) | int(round_num) for phase, round_num in zip(self.phases, self.rounds)]
+
+    @property
+    def prices(self):
+        '''
+        Answers scaled into prices
+        '''
+        return np.asarray(self.answers / (10 ** self.decimals), dtype=np.float64)
+
+    @property
+    def datetimes(self):
+        '''
+        Update times as datetime64 values (UTC), which matplotlib and pandas plot directly
+        '''
+        return self.timestamps.astype('datetime64[s]')
+
+    def intervals(self):
+        '''
+        Seconds between each update and the one before it (one shorter than the series)
+        '''
+        return np.diff(self.timestamps)
+
+    def since(self, timestamp):
+        '''
+        The part of the series updated at or after timestamp
+        '''
+        return self[int(np.searchsorted(self.timestamps, timestamp, side='left')):]
+
+    def to_pandas(self):
+        '''
+        Converts to a DataFrame indexed by update time
+        '''
+        import pandas as pd
+        return pd.DataFrame({
+            'phase': self.phases,
+            'round': self.rounds,
+            'answer': self.answers,
+            'price': self.prices,
+        }, index=pd.to_datetime(self.timestamps, unit='s'))
@@ -0,0 +1,289 @@
+'''
+File: stats.py
+Streaming statistics for update intervals, fed one round at a time
+
+Notes:
+- Moments uses Welford's method, so the mean and variance never need the values again
+- QuantileSketch is a KLL sketch: a stack of compactors where level h holds items of weight 2 ** h,
+  and a full level sorts itself and promotes every other item. Memory stays around 3 * k items
+- Histogram uses fixed-width bins plus an overflow bin, so two histograms of the same shape add up
+- Every class merges with another of its kind and round-trips through to_dict() / from_dict() (JSON safe)
+'''
+
+''' Libraries '''
+import json
+import math
+import random
+
+''' Constants '''
+SKETCH_SIZE = 200 # k for the quantile sketch; rank error is roughly 1.7 / k
+BIN_WIDTH = 60 # Seconds per histogram bin
+NUM_BINS = 120 # Histogram bins before the overflow bin (two hours at one minute each)
+
+class Moments:
+    '''
+    Count, mean, variance, min and max of a stream of values
+    '''
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, low=None, high=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.low = low
+        self.high = high
+
+    def update(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.low = value if self.low is None else min(self.low, value)
+        self.high = value if self.high is None else max(self.high, value)
+
+    def merge(self, other):
+        '''
+        Folds another Moments into this one (Chan et al.'s pairwise update)
+        '''
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__init__(other.count, other.mean, other.m2, other.low, other.high)
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+        return self
+
+    @property
+    def variance(self):
+        '''
+        Population variance, like np.var and np.std
+        '''
+        return self.m2 / self.count if self.count else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'm2': self.m2, 'low': self.low, 'high': self.high}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['count'], data['mean'], data['m2'], data['low'], data['high'])
+
+class QuantileSketch:
+    '''
+    Mergeable approximate quantiles (KLL)
+    '''
+
+    def __init__(self, k=SKETCH_SIZE, compactors=None):
+        self.k = k
+        self.compactors = compactors if compactors is not None else [[]]
+
+    def capacity(self, level):
+        '''
+        Items a level may hold before compacting; lower levels get geometrically less room
+        '''
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def size(self):
+        return sum(len(compactor) for compactor in self.compactors)
+
+    def max_size(self):
+        return sum(self.capacity(level) for level in range(len(self.compactors)))
+
+    def compress(self):
+        '''
+        Halves the lowest full level, promoting every other item (from a random offset) one level up
+        '''
+        for level in range(len(self.compactors)):
+            if len(self.compactors[level]) >= self.capacity(level):
+                if level + 1 == len(self.compactors):
+                    self.compactors.append([])
+                items = sorted(self.compactors[level])
+                kept = [items.pop()] if len(items) % 2 else []
+                self.compactors[level + 1].extend(items[random.getrandbits(1)::2])
+                self.compactors[level] = kept
+                return
+
+    def update(self, value):
+        self.compactors[0].append(value)
+        if self.size() >= self.max_size():
+            self.compress()
+
+    def merge(self, other):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, compactor in enumerate(other.compactors):
+            self.compactors[level].extend(compactor)
+        while self.size() >= self.max_size():
+            self.compress()
+        return self
+
+    @property
+    def count(self):
+        '''
+        Number of values the sketch stands for
+        '''
+        return sum(len(compactor) << level for level, compactor in enumerate(self.compactors))
+
+    def quantile(self, q):
+        '''
+        Approximate q-th quantile (0 <= q <= 1), or NaN when empty
+        '''
+        weighted = sorted((value, 1 << level) for level, compactor in enumerate(self.compactors) for value in compactor)
+        if not weighted:
+            return math.nan
+        target = q * sum(weight for value, weight in weighted)
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target:
+                return value
+        return weighted[-1][0]
+
+    def to_dict(self):
+        return {'k': self.k, 'compactors': self.compactors}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['k'], [list(compactor) for compactor in data['compactors']])
+
+class Histogram:
+    '''
+    Counts of values in fixed-width bins from 0, with everything past the last bin in overflow
+    '''
+
+    def __init__(self, width=BIN_WIDTH, num_bins=NUM_BINS, counts=None, overflow=0):
+        self.width = width
+        self.counts = counts if counts is not None else [0] * num_bins
+        self.overflow = overflow
+
+    def update(self, value):
+        position = int(max(value, 0) // self.width)
+        if position < len(self.counts):
+            self.counts[position] += 1
+        else:
+            self.overflow += 1
+
+    def merge(self, other):
+        if other.width != self.width or len(other.counts) != len(self.counts):
+            raise ValueError('Histograms must share bin width and bin count to merge')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.overflow += other.overflow
+        return self
+
+    @property
+    def edges(self):
+        '''
+        Left edge of every bin, plus the right edge of the last one
+        '''
+        return [i * self.width for i in range(len(self.counts) + 1)]
+
+    def to_dict(self):
+        return {'width': self.width, 'counts': self.counts, 'overflow': self.overflow}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['width'], len(data['counts']), list(data['counts']), data['overflow'])
+
+class IntervalStats:
+    '''
+    Heartbeat statistics of one (oracle, feed): every update time after the first adds the gap to
+    the one before it. Times may arrive oldest first or newest first, as long as they stay in order
+    '''
+
+    def __init__(self, oracle, feed, moments=None, sketch=None, histogram=None, last_timestamp=None):
+        self.oracle = oracle
+        self.feed = feed
+        self.moments = moments or Moments()
+        self.sketch = sketch or QuantileSketch()
+        self.histogram = histogram or Histogram()
+        self.last_timestamp = last_timestamp
+
+    def add_interval(self, seconds):
+        self.moments.update(seconds)
+        self.sketch.update(seconds)
+        self.histogram.update(seconds)
+
+    def update(self, timestamp):
+        '''
+        Records one update time
+        '''
+        timestamp = int(timestamp)
+        if self.last_timestamp is not None:
+            self.add_interval(abs(timestamp - self.last_timestamp))
+        self.last_timestamp = timestamp
+
+    def update_rows(self, rows):
+        '''
+        Consumes rows in the round data format [roundId, answer, startedAt, updatedAt, ...] one at a
+        time, e.g. straight from chainlink.iter_history() or tellor.iter_history()
+        '''
+        for row in rows:
+            self.update(row[3])
+        return self
+
+    def merge(self, other):
+        '''
+        Folds in the statistics of another stretch of the same feed's history
+        '''
+        self.moments.merge(other.moments)
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+        return self
+
+    def summary(self):
+        return {
+            'count': self.moments.count,
+            'mean': self.moments.mean,
+            'std': self.moments.std,
+            'min': self.moments.low,
+            'max': self.moments.high,
+            'p50': self.sketch.quantile(0.5),
+            'p95': self.sketch.quantile(0.95),
+            'p99': self.sketch.quantile(0.99),
+        }
+
+    def to_dict(self):
+        return {
+            'oracle': self.oracle,
+            'feed': self.feed,
+            'moments': self.moments.to_dict(),
+            'sketch': self.sketch.to_dict(),
+            'histogram': self.histogram.to_dict(),
+            'last_timestamp': self.last_timestamp,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['oracle'], data['feed'], Moments.from_dict(data['moments']),
+                   QuantileSketch.from_dict(data['sketch']), Histogram.from_dict(data['histogram']),
+                   data['last_timestamp'])
+
+def dumps(all_stats):
+    '''
+    Serializes a list of IntervalStats to JSON
+    '''
+    return json.dumps([elem.to_dict() for elem in all_stats])
+
+def loads(text):
+    '''
+    Reads a list of IntervalStats back from dumps()
+    '''
+    return [IntervalStats.from_dict(elem) for elem in json.loads(text)]
+
+def from_timestamps(oracle, feed, timestamps):
+    '''
+    Builds IntervalStats from a sequence of update times
+    '''
+    interval_stats = IntervalStats(oracle, feed)
+    for timestamp in timestamps:
+        interval_stats.update(timestamp)
+    return interval_stats
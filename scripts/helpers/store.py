@@ -0,0 +1,322 @@
+'''
+File: store.py
+Local SQLite store for historical rounds, so finalized history is only downloaded once
+
+Notes:
+- Rows are keyed by (oracle, feed, round ID). For Tellor the "round ID" is the value index
+- Row format = [roundId, answer, startedAt, updatedAt, answeredInRound], same as Chainlink round data
+- Chainlink proxy round IDs do not fit in a SQLite integer, so they are kept as (phase, round) columns
+- Rounds that can still change (e.g. Tellor values inside the dispute period) go to the 'recent' table
+  instead, which each sync rewrites. The 'all_rounds' view reads both, preferring settled rows
+- The 'latest' table keeps one value per (oracle, pair, field), e.g. the newest price or a feed's decimals,
+  as written by the collector
+- The 'blocks' table keeps per-block gas data (base fee, gas used ratio and priority fee percentiles, in wei)
+- The 'gas_estimates' table caches eth_estimateGas results by (address, code hash, calldata), and the
+  'gas_profile' table holds the newest profile of every oracle read path (see gasprofile.py)
+- The 'log_marks' table keeps the last block whose event logs were ingested, per (oracle, contract)
+- Several processes may write at once (report.py's workers, the collector), so the store runs in WAL mode
+  and a write waits up to BUSY_TIMEOUT seconds for another process's lock instead of failing
+'''
+
+''' Libraries '''
+import json
+import os
+import sqlite3
+import threading
+
+''' Constants '''
+STORE_PATH = 'data/history.db' # Where the store lives on disk
+PHASE_OFFSET = 64 # Bits the phase ID is shifted by inside a round ID
+ROUND_MASK = (1 << PHASE_OFFSET) - 1
+QUERY_SIZE = 500 # Number of rounds looked up per query
+BUSY_TIMEOUT = 30 # Seconds a write waits for another process to release the database
+
+''' Shared state '''
+_lock = threading.Lock()
+_connection = None
+
+def get_connection():
+    '''
+    Opens the store (creating it if needed) once per process
+    '''
+    global _connection
+    with _lock:
+        if _connection is None:
+            folder = os.path.dirname(STORE_PATH)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            _connection = sqlite3.connect(STORE_PATH, timeout=BUSY_TIMEOUT, check_same_thread=False)
+            _connection.execute('PRAGMA journal_mode=WAL')
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS rounds ('
+                'oracle TEXT NOT NULL, feed TEXT NOT NULL, phase INTEGER NOT NULL, round INTEGER NOT NULL, '
+                'answer TEXT NOT NULL, started_at INTEGER NOT NULL, updated_at INTEGER NOT NULL, '
+                'PRIMARY KEY (oracle, feed, phase, round))'
+            )
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS recent ('
+                'oracle TEXT NOT NULL, feed TEXT NOT NULL, phase INTEGER NOT NULL, round INTEGER NOT NULL, '
+                'answer TEXT NOT NULL, started_at INTEGER NOT NULL, updated_at INTEGER NOT NULL, '
+                'PRIMARY KEY (oracle, feed, phase, round))'
+            )
+            _connection.execute(
+                'CREATE VIEW IF NOT EXISTS all_rounds AS SELECT * FROM rounds UNION ALL SELECT * FROM recent '
+                'WHERE NOT EXISTS (SELECT 1 FROM rounds WHERE rounds.oracle = recent.oracle AND rounds.feed = recent.feed '
+                'AND rounds.phase = recent.phase AND rounds.round = recent.round)'
+            )
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS latest ('
+                'oracle TEXT NOT NULL, pair TEXT NOT NULL, field TEXT NOT NULL, value REAL, timestamp INTEGER, '
+                'polled_at INTEGER NOT NULL, PRIMARY KEY (oracle, pair, field))'
+            )
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS blocks ('
+                'number INTEGER PRIMARY KEY, timestamp INTEGER NOT NULL, base_fee INTEGER NOT NULL, '
+                'gas_used_ratio REAL NOT NULL, rewards TEXT NOT NULL)'
+            )
+            _connection.execute('CREATE INDEX IF NOT EXISTS blocks_by_time ON blocks (timestamp)')
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS gas_estimates ('
+                'address TEXT NOT NULL, code_hash TEXT NOT NULL, calldata TEXT NOT NULL, gas INTEGER NOT NULL, '
+                'estimated_at INTEGER NOT NULL, PRIMARY KEY (address, code_hash, calldata))'
+            )
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS log_marks ('
+                'oracle TEXT NOT NULL, source TEXT NOT NULL, block INTEGER NOT NULL, PRIMARY KEY (oracle, source))'
+            )
+            _connection.execute(
+                'CREATE TABLE IF NOT EXISTS gas_profile ('
+                'oracle TEXT NOT NULL, function TEXT NOT NULL, pairs TEXT NOT NULL, num_values INTEGER NOT NULL, '
+                'gas INTEGER, profiled_at INTEGER NOT NULL)'
+            )
+            _connection.commit()
+    return _connection
+
+def to_row(phase, round_num, answer, started_at, updated_at):
+    '''
+    Turns a stored record back into the round data format
+    '''
+    round_id = (phase << PHASE_OFFSET) | round_num
+    return [round_id, int(answer), started_at, updated_at, round_id]
+
+def to_records(oracle, feed, rows):
+    return [(oracle, feed, row[0] >> PHASE_OFFSET, row[0] & ROUND_MASK, str(row[1]), row[2], row[3]) for row in rows]
+
+def save_rounds(oracle, feed, rows):
+    '''
+    Saves rounds for a feed, replacing any that were already stored
+    '''
+    connection = get_connection()
+    with _lock:
+        connection.executemany('INSERT OR REPLACE INTO rounds VALUES (?, ?, ?, ?, ?, ?, ?)', to_records(oracle, feed, rows))
+        connection.commit()
+
+def save_recent(oracle, feed, rows):
+    '''
+    Replaces the unsettled rounds of a feed with rows
+    '''
+    connection = get_connection()
+    with _lock:
+        connection.execute('DELETE FROM recent WHERE oracle = ? AND feed = ?', (oracle, feed))
+        connection.executemany('INSERT OR REPLACE INTO recent VALUES (?, ?, ?, ?, ?, ?, ?)', to_records(oracle, feed, rows))
+        connection.commit()
+
+def load_rounds(oracle, feed, round_ids):
+    '''
+    Returns {roundId: row} for the requested rounds that are already stored
+    '''
+    phases = {}
+    for round_id in round_ids:
+        phases.setdefault(round_id >> PHASE_OFFSET, []).append(round_id & ROUND_MASK)
+    connection = get_connection()
+    found = {}
+    for phase, rounds in phases.items():
+        for start in range(0, len(rounds), QUERY_SIZE):
+            chunk = rounds[start:start + QUERY_SIZE]
+            marks = ', '.join(['?'] * len(chunk))
+            with _lock:
+                records = connection.execute(
+                    'SELECT phase, round, answer, started_at, updated_at FROM rounds '
+                    'WHERE oracle = ? AND feed = ? AND phase = ? AND round IN (' + marks + ')',
+                    [oracle, feed, phase] + chunk).fetchall()
+            for record in records:
+                row = to_row(*record)
+                found[row[0]] = row
+    return found
+
+def load_range(oracle, feed, first, last):
+    '''
+    Returns every stored row with first <= roundId <= last, oldest first
+    '''
+    connection = get_connection()
+    low = [first >> PHASE_OFFSET, first >> PHASE_OFFSET, first & ROUND_MASK]
+    high = [last >> PHASE_OFFSET, last >> PHASE_OFFSET, last & ROUND_MASK]
+    with _lock:
+        records = connection.execute(
+            'SELECT phase, round, answer, started_at, updated_at FROM rounds WHERE oracle = ? AND feed = ? '
+            'AND (phase > ? OR (phase = ? AND round >= ?)) AND (phase < ? OR (phase = ? AND round <= ?)) '
+            'ORDER BY phase, round', [oracle, feed] + low + high).fetchall()
+    return [to_row(*record) for record in records]
+
+def load_since(oracle, feed, timestamp):
+    '''
+    Returns every row (settled or recent) updated at or after timestamp, plus the last one before
+    it, oldest first
+    '''
+    connection = get_connection()
+    with _lock:
+        records = connection.execute(
+            'SELECT phase, round, answer, started_at, updated_at FROM all_rounds WHERE oracle = ? AND feed = ? '
+            'AND updated_at >= ? ORDER BY phase, round', (oracle, feed, timestamp)).fetchall()
+        before = connection.execute(
+            'SELECT phase, round, answer, started_at, updated_at FROM all_rounds WHERE oracle = ? AND feed = ? '
+            'AND updated_at < ? ORDER BY phase DESC, round DESC LIMIT 1', (oracle, feed, timestamp)).fetchall()
+    return [to_row(*record) for record in before + records]
+
+def load_newest(oracle, feed, count):
+    '''
+    Returns the newest count rows (settled or recent), oldest first
+    '''
+    connection = get_connection()
+    with _lock:
+        records = connection.execute(
+            'SELECT phase, round, answer, started_at, updated_at FROM all_rounds WHERE oracle = ? AND feed = ? '
+            'ORDER BY phase DESC, round DESC LIMIT ?', (oracle, feed, count)).fetchall()
+    return [to_row(*record) for record in records[::-1]]
+
+def save_value(oracle, pair, field, value, timestamp, polled_at):
+    '''
+    Keeps the newest value of a field (e.g. 'price') for an (oracle, pair)
+    '''
+    connection = get_connection()
+    with _lock:
+        connection.execute('INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?, ?, ?)', (oracle, pair, field, value, timestamp, polled_at))
+        connection.commit()
+
+def load_values(field):
+    '''
+    Returns {(oracle, pair): (value, timestamp, polled_at)} for a field
+    '''
+    connection = get_connection()
+    with _lock:
+        records = connection.execute('SELECT oracle, pair, value, timestamp, polled_at FROM latest WHERE field = ?', (field,)).fetchall()
+    return {(record[0], record[1]): tuple(record[2:]) for record in records}
+
+def save_blocks(rows):
+    '''
+    Saves [number, timestamp, base fee, gas used ratio, [priority fee per percentile]] rows
+    '''
+    records = [(row[0], row[1], row[2], row[3], json.dumps(row[4])) for row in rows]
+    connection = get_connection()
+    with _lock:
+        connection.executemany('INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?)', records)
+        connection.commit()
+
+def load_blocks(first_time, last_time):
+    '''
+    Returns the stored block rows with first_time <= timestamp <= last_time, oldest first
+    '''
+    connection = get_connection()
+    with _lock:
+        records = connection.execute(
+            'SELECT number, timestamp, base_fee, gas_used_ratio, rewards FROM blocks '
+            'WHERE timestamp >= ? AND timestamp <= ? ORDER BY number', (first_time, last_time)).fetchall()
+    return [list(record[:4]) + [json.loads(record[4])] for record in records]
+
+def newest_block():
+    '''
+    Returns the number of the newest stored block, or None if none is stored
+    '''
+    connection = get_connection()
+    with _lock:
+        return connection.execute('SELECT MAX(number) FROM blocks').fetchone()[0]
+
+def save_log_mark(oracle, source, block):
+    '''
+    Records that the logs of a contract (source) were ingested up to block
+    '''
+    connection = get_connection()
+    with _lock:
+        connection.execute('INSERT OR REPLACE INTO log_marks VALUES (?, ?, ?)', (oracle, source, block))
+        connection.commit()
+
+def load_log_mark(oracle, source):
+    '''
+    Returns the last block whose logs were ingested for a contract, or None
+    '''
+    connection = get_connection()
+    with _lock:
+        record = connection.execute('SELECT block FROM log_marks WHERE oracle = ? AND source = ?', (oracle, source)).fetchone()
+    return record[0] if record is not None else None
+
+def save_estimates(records):
+    '''
+    Saves (address, code hash, calldata, gas, estimated_at) records
+    '''
+    connection = get_connection()
+    with _lock:
+        connection.executemany('INSERT OR REPLACE INTO gas_estimates VALUES (?, ?, ?, ?, ?)', records)
+        connection.commit()
+
+def load_estimates(keys, since):
+    '''
+    Returns {(address, code hash, calldata): gas} for the keys estimated at or after since
+    '''
+    connection = get_connection()
+    found = {}
+    for key in set(keys):
+        with _lock:
+            record = connection.execute(
+                'SELECT gas FROM gas_estimates WHERE address = ? AND code_hash = ? AND calldata = ? AND estimated_at >= ?',
+                tuple(key) + (since,)).fetchone()
+        if record is not None:
+            found[key] = record[0]
+    return found
+
+def save_profile(rows, profiled_at):
+    '''
+    Replaces the stored gas profile with rows of {'oracle', 'function', 'pairs', 'values', 'gas'}
+    '''
+    records = [(row['oracle'], row['function'], json.dumps(row['pairs']), row['values'], row['gas'], profiled_at) for row in rows]
+    connection = get_connection()
+    with _lock:
+        connection.execute('DELETE FROM gas_profile')
+        connection.executemany('INSERT INTO gas_profile VALUES (?, ?, ?, ?, ?, ?)', records)
+        connection.commit()
+
+def load_profile():
+    '''
+    Returns the stored gas profile as rows of {'oracle', 'function', 'pairs', 'values', 'gas', 'profiled_at'}
+    '''
+    connection = get_connection()
+    with _lock:
+        records = connection.execute('SELECT oracle, function, pairs, num_values, gas, profiled_at FROM gas_profile ORDER BY rowid').fetchall()
+    return [{'oracle': record[0], 'function': record[1], 'pairs': json.loads(record[2]), 'values': record[3],
+             'gas': record[4], 'profiled_at': record[5]} for record in records]
+
+def high_water_mark(oracle, feed):
+    '''
+    Returns the newest stored round ID for a feed, or None if nothing is stored
+    '''
+    connection = get_connection()
+    with _lock:
+        record = connection.execute(
+            'SELECT phase, round FROM rounds WHERE oracle = ? AND feed = ? '
+            'ORDER BY phase DESC, round DESC LIMIT 1', (oracle, feed)).fetchone()
+    if record is None:
+        return None
+    return (record[0] << PHASE_OFFSET) | record[1]
+
+def read_through(oracle, feed, round_ids, fetch, is_final=None):
+    '''
+    Returns rows for round_ids in order, serving stored rounds from disk and calling
+    fetch(missing round IDs) for the rest. Fetched rows accepted by is_final are saved
+    '''
+    round_ids = list(round_ids)
+    rows = load_rounds(oracle, feed, round_ids)
+    missing = [round_id for round_id in round_ids if round_id not in rows]
+    if missing:
+        fetched = fetch(missing)
+        save_rounds(oracle, feed, [row for row in fetched if is_final is None or is_final(row)])
+        rows.update(zip(missing, fetched))
+    return [rows[round_id] for round_id in round_ids]
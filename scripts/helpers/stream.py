@@ -0,0 +1,49 @@
+'''
+File: stream.py
+Streaming downsamplers for lazily walked round history
+
+Notes:
+- Inputs are iterables of rows in the round data format [roundId, answer, startedAt, updatedAt, ...],
+  e.g. chainlink.iter_history() or tellor.iter_history()
+- Everything here is a generator holding at most one bucket in memory, so a long walk can be
+  consumed (or abandoned) part way through
+'''
+
+''' Libraries '''
+import itertools
+
+def stride(rows, step):
+    '''
+    Yields every step-th row, starting with the first
+    '''
+    return itertools.islice(rows, 0, None, step)
+
+def time_buckets(rows, seconds):
+    '''
+    Groups consecutive rows into fixed windows of update time, and yields
+    [bucket start, min answer, max answer, last answer, count] as each window closes.
+    "Last" is the last row seen, so for newest-first walks it is the oldest answer in the window
+    '''
+    bucket = None
+    for row in rows:
+        start = row[3] - row[3] % seconds
+        if bucket is not None and bucket[0] != start:
+            yield bucket
+            bucket = None
+        if bucket is None:
+            bucket = [start, row[1], row[1], row[1], 0]
+        bucket[1] = min(bucket[1], row[1])
+        bucket[2] = max(bucket[2], row[1])
+        bucket[3] = row[1]
+        bucket[4] += 1
+    if bucket is not None:
+        yield bucket
+
+def until(rows, timestamp):
+    '''
+    Yields rows of a newest-first walk until (and including) the first one updated at or before timestamp
+    '''
+    for row in rows:
+        yield row
+        if row[3] <= timestamp:
+            return
@@ -0,0 +1,73 @@
+'''
+File: importtime.py
+Benchmarks how long a cold import of each scripts module takes, and checks it stays lazy
+
+Notes:
+- Run with: python -m scripts.importtime [--runs 5] [--modules scripts.tellor scripts.band]
+- Every run imports one module in a fresh interpreter, so nothing is shared between runs; the
+  median of the runs is reported
+- Importing a module must not pull in anything from HEAVY (web3 and requests are imported on first
+  request, scipy and pandas where they are used). Exits with 1 when one does, or when a module
+  takes longer than --budget seconds, so it can run as a check
+- A module that fails to import is reported with the end of its traceback, and fails the check
+  once every module has been measured
+'''
+
+''' Libraries '''
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+''' Constants '''
+MODULES = ['scripts.tellor', 'scripts.chainlink', 'scripts.band', 'scripts.dia', 'scripts.gas',
+           'scripts.sweep', 'scripts.report', 'scripts.backfill', 'scripts.collector', 'scripts.ingest',
+           'scripts.gasprofile'] # Modules benchmarked by default
+HEAVY = ['web3', 'requests', 'scipy', 'pandas', 'matplotlib'] # Packages no module may import up front
+RUNS = 5 # Fresh interpreters per module
+BUDGET = 0.5 # Seconds a cold import may take
+
+''' Code run in each fresh interpreter '''
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'heavy': [name for name in {heavy!r} if name in sys.modules]}}))
+'''
+
+def measure(module, runs=RUNS):
+    '''
+    Returns (median seconds, heavy packages imported, None) for a cold import of module, or
+    (None, [], error output) when the import fails
+    '''
+    samples = []
+    heavy = set()
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)], capture_output=True, text=True)
+        if process.returncode != 0:
+            return None, [], process.stderr.strip()
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        samples.append(result['seconds'])
+        heavy.update(result['heavy'])
+    return statistics.median(samples), sorted(heavy), None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark cold imports of the scripts package')
+    parser.add_argument('--modules', nargs='+', default=MODULES, help='Modules to import')
+    parser.add_argument('--runs', type=int, default=RUNS, help='Fresh interpreters per module')
+    parser.add_argument('--budget', type=float, default=BUDGET, help='Seconds a cold import may take')
+    args = parser.parse_args()
+    failed = False
+    for module in args.modules:
+        seconds, heavy, error = measure(module, args.runs)
+        if error is not None:
+            failed = True
+            print(module.ljust(20) + ' failed to import:\n    ' + '\n    '.join(error.splitlines()[-3:]))
+            continue
+        slow = seconds > args.budget
+        failed = failed or slow or bool(heavy)
+        print(module.ljust(20) + ' ' + str(round(seconds * 1000, 1)).rjust(8) + ' ms' + (' (over budget)' if slow else '')
+              + (' imports ' + ', '.join(heavy) if heavy else ''))
+    sys.exit(1 if failed else 0)
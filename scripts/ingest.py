@@ -0,0 +1,44 @@
+'''
+File: ingest.py
+Fills the local store from Chainlink and DIA event logs instead of per-round view calls
+
+Notes:
+- Run with: python -m scripts.ingest [--oracles chainlink dia] [--pairs BTC/USD] [--days 30]
+- Chainlink rounds come from the AnswerUpdated/NewRound events of each feed's current phase aggregator,
+  DIA updates from the newCoinInfo events of its contract (see logs.py)
+- Each contract resumes from the last block ingested, so running this again only scans new blocks.
+  The collector keeps DIA's logs up to date on its own
+'''
+
+''' Libraries '''
+import argparse
+import scripts.chainlink
+import scripts.dia
+import scripts.helpers.catalog
+
+''' Constants '''
+ORACLES = ['chainlink', 'dia'] # Oracles whose history can be read from event logs
+NUM_DAYS = 30 # Days of logs scanned on the first run
+
+def run(pairs=None, oracles=ORACLES, num_of_days=NUM_DAYS):
+    '''
+    Ingests the logs of every oracle for pairs (every catalog pair by default). Returns {oracle: rows stored}
+    '''
+    stored = {}
+    if 'chainlink' in oracles:
+        stored['chainlink'] = 0
+        for pair in (pairs if pairs is not None else scripts.helpers.catalog.pairs('chainlink')):
+            if scripts.helpers.catalog.supports(pair, 'chainlink'):
+                stored['chainlink'] += scripts.chainlink.sync_logs(scripts.chainlink.feed_address(pair), num_of_days)
+    if 'dia' in oracles:
+        stored['dia'] = scripts.dia.sync_logs(num_of_days)
+    return stored
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fill the local store from Chainlink and DIA event logs')
+    parser.add_argument('--pairs', nargs='+', default=None, help='Chainlink pairs to ingest (default: every catalog pair)')
+    parser.add_argument('--oracles', nargs='+', default=ORACLES, choices=ORACLES, help='Oracles to ingest')
+    parser.add_argument('--days', type=int, default=NUM_DAYS, help='Days of logs scanned on the first run')
+    args = parser.parse_args()
+    for oracle, count in run(args.pairs, args.oracles, args.days).items():
+        print(oracle + ': ' + str(count) + ' rows stored')
@@ -0,0 +1,195 @@
+'''
+File: report.py
+Headless report: the dashboard's metrics for a list of feeds, written to Parquet or JSON
+
+Notes:
+- Run with: python -m scripts.report --feeds BTC/USD ETH/USD --days 30 --rounds 300 --out reports
+- Feeds default to the whole feed catalog, and each feed is reported for every oracle that serves it
+- Every (feed, oracle) pair is one task in a process pool, plus one task for the per-block gas history
+  and one for the gas profile (gasprofile.py), which gives every row its single-read gas estimate.
+  A task that fails or runs past --timeout becomes a row with an 'error' instead of stopping the run, and
+  the pool's processes are then terminated, so a worker stuck on a request cannot keep the run alive
+- Writes <out>/report-<date>-oracles and <out>/report-<date>-divergence as Parquet when pandas can
+  (pyarrow or fastparquet installed), otherwise a single <out>/report-<date>.json
+'''
+
+''' Libraries '''
+import argparse
+from datetime import datetime
+import json
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+import scripts.gasprofile
+import scripts.helpers.cassette
+import scripts.helpers.catalog
+import scripts.helpers.divergence
+import scripts.helpers.stats
+import scripts.sweep
+
+''' Constants '''
+HISTORY_ORACLES = ['tellor', 'chainlink'] # Oracles with on-chain history to walk
+NUM_DAYS = 30 # Days of price history per feed
+NUM_ROUNDS = 300 # Rounds of update intervals per feed
+TIMEOUT = 600 # Seconds the whole run may take before unfinished tasks are reported as errors
+
+def feed_task(oracle, pair, num_of_days, num_rounds):
+    '''
+    Worker: snapshot, price history and update intervals of one feed on one oracle.
+    Returns (row, price series, interval timestamps); the last two are None without history
+    '''
+    module = scripts.sweep.oracle_module(oracle)
+    row = {'pair': pair, 'oracle': scripts.helpers.catalog.NAMES[oracle]}
+    row['price'] = module.snapshot([pair])[0]['price']
+    if oracle not in HISTORY_ORACLES:
+        return row, None, None
+
+    # Price history over the window, and the update intervals of the last num_rounds rounds
+    prices = module.get_price_series(pair, None, num_of_days)
+    times = module.get_time_series(pair, num_rounds)
+    row['history_points'] = len(prices)
+    if len(prices):
+        row['history_first'] = float(prices.prices[0])
+        row['history_last'] = float(prices.prices[-1])
+        row['history_min'] = float(prices.prices.min())
+        row['history_max'] = float(prices.prices.max())
+    for name, value in scripts.helpers.stats.from_timestamps(row['oracle'], pair, times.timestamps).summary().items():
+        row['interval_' + name] = value
+    return row, prices, times.timestamps
+
+def gas_task(num_of_days):
+    '''
+    Worker: the per-block gas prices used for the request time vs gas regression
+    '''
+    import scripts.gas
+    scripts.gas.sync_block_gas(num_of_days)
+    block_gas = scripts.gas.read_block_gas(scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60)
+    return block_gas.timestamps, block_gas.prices()
+
+def profile_task(feeds):
+    '''
+    Worker: gas estimates of every read path of feeds
+    '''
+    return scripts.gasprofile.profile(feeds)
+
+def regression(timestamps, gas_times, gas_prices):
+    '''
+    Fits gas price against the time each request took. Returns {'gas_slope', 'gas_intercept', 'gas_corr'}
+    '''
+    import scripts.gas
+    intervals = np.diff(timestamps).astype(np.float64)
+    prices = np.asarray(scripts.gas.get_corresponding_prices(timestamps[1:], gas_times, gas_prices, tolerance=scripts.gas.PRICE_TOLERANCE))
+    matched = ~np.isnan(prices)
+    if np.sum(matched) < 2 or np.ptp(intervals[matched]) == 0:
+        return {'gas_slope': None, 'gas_intercept': None, 'gas_corr': None}
+    slope, intercept = np.polyfit(intervals[matched], prices[matched], 1)
+    corr = np.corrcoef(intervals[matched], prices[matched])[0, 1]
+    return {'gas_slope': float(slope), 'gas_intercept': float(intercept), 'gas_corr': float(corr)}
+
+def run(feeds=None, num_of_days=NUM_DAYS, num_rounds=NUM_ROUNDS, workers=None, timeout=TIMEOUT):
+    '''
+    Computes the report. Returns (oracle rows, divergence rows)
+    '''
+    feeds = feeds if feeds is not None else scripts.helpers.catalog.pairs()
+    pool = multiprocessing.Pool(workers)
+    tasks = {}
+    for pair in feeds:
+        for oracle in scripts.helpers.catalog.ORACLES:
+            if scripts.helpers.catalog.supports(pair, oracle):
+                tasks[(pair, oracle)] = pool.apply_async(feed_task, (oracle, pair, num_of_days, num_rounds))
+    gas_result = pool.apply_async(gas_task, (num_of_days,))
+    profile_result = pool.apply_async(profile_task, (feeds,))
+    pool.close()
+    deadline = time.monotonic() + timeout
+    try:
+        for result in list(tasks.values()) + [gas_result, profile_result]:
+            result.wait(max(deadline - time.monotonic(), 0))
+    finally:
+        pool.terminate()
+        pool.join()
+
+    # Gas history failing only costs the regression columns
+    gas_history = None
+    if gas_result.ready() and gas_result.successful():
+        gas_history = gas_result.get()
+    gas_estimates = {}
+    if profile_result.ready() and profile_result.successful():
+        gas_estimates = scripts.gasprofile.single_reads(profile_result.get())
+
+    rows = []
+    series = {}
+    for (pair, oracle), result in tasks.items():
+        if not result.ready():
+            rows.append({'pair': pair, 'oracle': scripts.helpers.catalog.NAMES[oracle], 'error': 'timed out'})
+            continue
+        try:
+            row, prices, timestamps = result.get()
+        except Exception as error:
+            rows.append({'pair': pair, 'oracle': scripts.helpers.catalog.NAMES[oracle], 'error': repr(error)})
+            continue
+        row['gas_estimate'] = gas_estimates.get((row['oracle'], pair))
+        if prices is not None:
+            series.setdefault(pair, {})[row['oracle']] = prices
+        if timestamps is not None and gas_history is not None:
+            row.update(regression(timestamps, *gas_history))
+        rows.append(row)
+
+    # Cross-oracle divergence of every feed with at least two histories
+    divergence_rows = []
+    for pair, named_series in series.items():
+        divergence = scripts.helpers.divergence.from_series(pair, named_series)
+        summary = divergence.summary()
+        summary['oracles'] = ', '.join(divergence.columns)
+        divergence_rows.append(summary)
+    return rows, divergence_rows
+
+def clean(value):
+    '''
+    Turns NaN into None and NumPy scalars into Python numbers, so rows serialize as JSON
+    '''
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def write(rows, divergence_rows, out_dir, output_format='auto'):
+    '''
+    Writes the report and returns the paths written
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, 'report-' + datetime.now().strftime('%Y-%m-%d'))
+    rows = [{key: clean(value) for key, value in row.items()} for row in rows]
+    divergence_rows = [{key: clean(value) for key, value in row.items()} for row in divergence_rows]
+    if output_format in ('auto', 'parquet'):
+        try:
+            import pandas as pd
+            paths = [stem + '-oracles.parquet', stem + '-divergence.parquet']
+            pd.DataFrame(rows).to_parquet(paths[0])
+            pd.DataFrame(divergence_rows).to_parquet(paths[1])
+            return paths
+        except ImportError:
+            if output_format == 'parquet':
+                raise
+    with open(stem + '.json', 'w') as f:
+        json.dump({'generated': datetime.now().isoformat(), 'oracles': rows, 'divergence': divergence_rows}, f, indent=2)
+    return [stem + '.json']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compute oracle-diff metrics without the dashboard')
+    parser.add_argument('--feeds', nargs='+', default=None, help='Pairs to report, e.g. BTC/USD ETH/USD (default: the whole catalog)')
+    parser.add_argument('--days', type=int, default=NUM_DAYS, help='Days of price history')
+    parser.add_argument('--rounds', type=int, default=NUM_ROUNDS, help='Rounds of update intervals')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help='Seconds before unfinished tasks are given up on')
+    parser.add_argument('--out', default='reports', help='Directory to write the report to')
+    parser.add_argument('--format', choices=['auto', 'parquet', 'json'], default='auto', help='Output format')
+    args = parser.parse_args(argv)
+    rows, divergence_rows = run(args.feeds, args.days, args.rounds, args.workers, args.timeout)
+    for path in write(rows, divergence_rows, args.out, args.format):
+        print('Wrote ' + path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+'''
+File: sweep.py
+Refreshes the latest price of every catalog pair on every oracle, as fast as each oracle allows
+
+Notes:
+- Run with: python -m scripts.sweep [--pairs BTC/USD ETH/USD] [--oracles chainlink tellor]
+- Pairs are grouped per oracle into chunks that each oracle's snapshot() reads in one batched
+  request, so a job costs one token from that oracle's bucket
+- Jobs run on the shared pipeline, at most MAX_CONCURRENCY at a time. The dispatcher always starts
+  the highest priority job whose oracle has a token, so a throttled oracle never holds up the others
+- A failed job turns into rows with a price of None and an 'error', instead of failing the sweep
+'''
+
+''' Libraries '''
+import argparse
+import asyncio
+import scripts.helpers.catalog
+import scripts.helpers.pipeline
+import scripts.helpers.ratelimit
+
+''' Constants '''
+RATES = {'chainlink': 20, 'tellor': 20, 'band': 20, 'dia': 5} # Jobs per second allowed for each oracle
+CHUNK_SIZES = {'chainlink': 50, 'tellor': 200, 'band': 100, 'dia': 1} # Pairs per job (DIA's REST API has no bulk read)
+MAX_CONCURRENCY = scripts.helpers.pipeline.MAX_CONCURRENCY # Jobs in flight at once
+TIMEOUT = scripts.helpers.pipeline.TIMEOUT # Seconds a single job may take
+
+def oracle_module(oracle):
+    '''
+    Imports an oracle module on first use, so only the oracles asked for build their contracts
+    '''
+    if oracle == 'tellor':
+        import scripts.tellor as module
+    elif oracle == 'chainlink':
+        import scripts.chainlink as module
+    elif oracle == 'dia':
+        import scripts.dia as module
+    elif oracle == 'band':
+        import scripts.band as module
+    else:
+        raise ValueError('Unknown oracle ' + str(oracle))
+    return module
+
+def make_jobs(pairs, oracles):
+    '''
+    Splits the pairs each oracle serves into [priority, oracle, pairs] jobs, most urgent first
+    '''
+    jobs = []
+    for oracle in oracles:
+        served = sorted((pair for pair in pairs if scripts.helpers.catalog.supports(pair, oracle)), key=scripts.helpers.catalog.priority)
+        for start in range(0, len(served), CHUNK_SIZES[oracle]):
+            chunk = served[start:start + CHUNK_SIZES[oracle]]
+            jobs.append([scripts.helpers.catalog.priority(chunk[0]), oracle, chunk])
+    return sorted(jobs, key=lambda job: job[0])
+
+def error_rows(job, error):
+    return [{'oracle': scripts.helpers.catalog.NAMES[job[1]], 'pair': pair, 'price': None, 'timestamp': None, 'error': repr(error)} for pair in job[2]]
+
+async def dispatch(jobs, buckets, timeout):
+    '''
+    Runs jobs on the pipeline loop, respecting the buckets and MAX_CONCURRENCY. Returns every row
+    '''
+    pending = list(jobs)
+    running = {}
+    rows = []
+    while pending or running:
+
+        # Start the most urgent job that has both a free slot and a token
+        if len(running) < MAX_CONCURRENCY:
+            ready = next((job for job in pending if buckets[job[1]].try_acquire()), None)
+            if ready is not None:
+                pending.remove(ready)
+                call = scripts.helpers.pipeline.run_task(oracle_module(ready[1]).snapshot, (ready[2],), timeout)
+                running[asyncio.ensure_future(call)] = ready
+                continue
+
+        # Otherwise wait for a job to finish or the next token, whichever comes first
+        delay = None
+        if pending and len(running) < MAX_CONCURRENCY:
+            delay = min(buckets[job[1]].wait_time() for job in pending)
+        if not running:
+            await asyncio.sleep(delay)
+            continue
+        done, _ = await asyncio.wait(list(running), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            job = running.pop(task)
+            if task.exception() is not None:
+                rows += error_rows(job, task.exception())
+            else:
+                rows += task.result()
+    return rows
+
+def sweep(pairs=None, oracles=None, rates=RATES, timeout=TIMEOUT):
+    '''
+    Reads the latest value of pairs (every catalog pair by default) from oracles (all by default).
+    Returns snapshot rows of {'oracle', 'pair', 'price', 'timestamp'}, with an 'error' on failed ones
+    '''
+    pairs = pairs if pairs is not None else scripts.helpers.catalog.pairs()
+    oracles = oracles if oracles is not None else scripts.helpers.catalog.ORACLES
+    for oracle in oracles:
+        oracle_module(oracle)
+    buckets = {oracle: scripts.helpers.ratelimit.TokenBucket(rates[oracle]) for oracle in oracles}
+    loop = scripts.helpers.pipeline.get_loop()
+    return asyncio.run_coroutine_threadsafe(dispatch(make_jobs(pairs, oracles), buckets, timeout), loop).result()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Read the latest price of every catalog pair on every oracle')
+    parser.add_argument('--pairs', nargs='+', default=None, help='Pairs to read (default: the whole catalog)')
+    parser.add_argument('--oracles', nargs='+', default=None, choices=scripts.helpers.catalog.ORACLES, help='Oracles to read')
+    args = parser.parse_args()
+    for row in sweep(args.pairs, args.oracles):
+        print(row['oracle'] + ' ' + row['pair'] + ': ' + str(row['price']) + (' (' + row['error'] + ')' if 'error' in row else ''))
@@ -4,121 +4,247 @@ Grabs data from Tellor and get all results
 '''
 
 ''' Necessary Libraries '''
-import json
-from datetime import datetime, timedelta
-import math
+from datetime import datetime
+import scripts.helpers.cassette
+import scripts.helpers.catalog
 import scripts.helpers.contract
+import scripts.helpers.series
+import scripts.helpers.store
+import scripts.helpers.stream
 
 ''' Constants '''
 ABI_PATH = 'contracts/tellorLens.json' # Relative path to ABI
 ADDRESS = '0xb2b6c6232d38fae21656703cac5a74e5314741d4' # Address of smart contract on mainnet
-FEEDS_PATH = 'feeds/tellor.json' # Path to get feeds data from feeds
 GRANULAITY = 1000000 # Defined granularity for all of the data feeds
+DECIMALS = 6 # The same granularity, as a number of decimals
 NUM_DAYS = 8 # Number of days to look back for historical data
 NUM_VALS = 100 # Number of past values to grab for looking at history
 TIME_CHANGE = 20 # Number of time changes to look at
+BATCH_SIZE = scripts.helpers.contract.BATCH_SIZE # Number of indices fetched per batched request
+DISPUTE_PERIOD = 24 * 60 * 60 # Seconds before a value is treated as settled and stored locally
+STORE_NAME = 'tellor' # Oracle name for values kept in the local store
+BULK_VALUES = 10 # Values read per feed by the getLastValues path of the gas profile
 
 ''' Setting up Smart Contract '''
-tellor_contract = scripts.helpers.contract.get_contract(ABI_PATH, ADDRESS)
+tellor_contract = scripts.helpers.contract.LazyContract(ABI_PATH, ADDRESS)
+
+def feed_id(pair):
+    '''
+    Tellor request ID of a pair, from the feed catalog
+    '''
+    return int(scripts.helpers.catalog.lookup(pair, 'tellor')['id'])
+
+def snapshot(feeds=None):
+    '''
+    Get the latest value of every feed (all of them by default) as rows of
+    {'oracle', 'pair', 'price', 'timestamp'}. getLastValuesAll covers every ID the lens
+    tracks in one call, and anything it misses is batched through getCurrentValue
+    '''
+    if feeds is None:
+        feeds = scripts.helpers.catalog.pairs('tellor')
+    latest = {}
+    for id_num, name, timestamp, value in tellor_contract.functions.getLastValuesAll(1).call():
+        latest[id_num] = [value, timestamp]
+
+    # Fall back to one batch of getCurrentValue calls for IDs the lens does not track
+    missing = [feed_id(pair) for pair in feeds if feed_id(pair) not in latest]
+    calls = [tellor_contract.functions.getCurrentValue(id_num) for id_num in missing]
+    for id_num, [worked, value, timestamp] in zip(missing, scripts.helpers.contract.batch_call(calls)):
+        latest[id_num] = [value, timestamp]
+
+    rows = []
+    for pair in feeds:
+        value, timestamp = latest[feed_id(pair)]
+        rows.append({'oracle': 'Tellor', 'pair': pair, 'price': value / GRANULAITY, 'timestamp': timestamp})
+    return rows
 
 def grab_feeds():
     '''
     Get the correct data feed IDs from Tellor and get their value
     '''
-    prices = []
-    with open(FEEDS_PATH) as f:
-        data = json.load(f)
-    for elem in data:
-        id_num = int(data[elem]['id'])
-        tellor_data = (tellor_contract.functions.getCurrentValue(id_num).call())
-        prices.append(tellor_data[1]/GRANULAITY)
-    return prices
+    return [row['price'] for row in snapshot()]
+
+def get_index_range(id_num, start_time):
+    '''
+    Returns the index of the last value reported before start_time and the index of the
+    newest value for a request ID, resolved together in one batched request
+    '''
+    count, [found, index] = scripts.helpers.contract.batch_call([
+        tellor_contract.functions.getNewValueCountbyRequestId(id_num),
+        tellor_contract.functions.getIndexForDataBefore(id_num, int(start_time)),
+    ])
+    if not found:
+        index = 0
+    return index, count - 1
+
+def fetch_rows(id_num, indices, chunk_size=BATCH_SIZE):
+    '''
+    Get [index, value, timestamp, timestamp, index] rows for arbitrary value indices straight
+    from the chain. None of the indices depend on each other, so every lookup goes out in batches.
+    Lookups of settled values stay in the eth_call cache
+    '''
+    calls = [tellor_contract.functions.getTimestampbyRequestIDandIndex(id_num, index) for index in indices]
+    timestamps = scripts.helpers.contract.batch_call(calls, chunk_size, final=lambda function, timestamp: is_settled(timestamp))
+    calls = [tellor_contract.functions.retrieveData(id_num, timestamp) for timestamp in timestamps]
+    values = scripts.helpers.contract.batch_call(calls, chunk_size, final=lambda function, value: is_settled(function.args[1]))
+    return [[index, value, timestamp, timestamp, index] for index, value, timestamp in zip(indices, values, timestamps)]
+
+def is_settled(timestamp):
+    '''
+    Values can still be disputed for a while after they are submitted
+    '''
+    return timestamp != 0 and timestamp < scripts.helpers.cassette.now() - DISPUTE_PERIOD
+
+def is_final(row):
+    return is_settled(row[3])
+
+def grab_rows(id_num, indices, chunk_size=BATCH_SIZE):
+    '''
+    Get rows for value indices, reading settled values from the local store and fetching the rest
+    '''
+    fetch = lambda missing: fetch_rows(id_num, missing, chunk_size)
+    return scripts.helpers.store.read_through(STORE_NAME, str(id_num), indices, fetch, is_final)
+
+def grab_timestamps(id_num, indices, chunk_size=BATCH_SIZE):
+    '''
+    Get the timestamps of arbitrary value indices for a request ID
+    '''
+    return [row[3] for row in grab_rows(id_num, indices, chunk_size)]
+
+def grab_values(id_num, indices, chunk_size=BATCH_SIZE):
+    '''
+    Get [value, timestamp] for arbitrary value indices for a request ID
+    '''
+    return [[row[1], row[3]] for row in grab_rows(id_num, indices, chunk_size)]
+
+def sync_history(id_num, num_rounds):
+    '''
+    Brings the local store up to date for the last num_rounds values of a request ID, only
+    fetching values newer than the newest one already stored, and returns the newest index.
+    Values still inside the dispute period are kept as the feed's recent rows
+    '''
+    last = get_index_range(id_num, 0)[1]
+    oldest = max(last - num_rounds, -1)
+    high_water_mark = scripts.helpers.store.high_water_mark(STORE_NAME, str(id_num))
+    if high_water_mark is not None:
+        oldest = max(oldest, high_water_mark)
+    rows = grab_rows(id_num, range(last, oldest, -1))
+    scripts.helpers.store.save_recent(STORE_NAME, str(id_num), [row for row in rows if not is_final(row)])
+    return last
+
+def sample_indices(first, last, number_values):
+    '''
+    Picks number_values evenly spaced indices between first and last, newest first.
+    number_values=None keeps every index, and 1 the last
+    '''
+    total = last - first + 1
+    if number_values is None or total <= number_values:
+        return list(range(last, first - 1, -1))
+    if number_values <= 1:
+        return list(range(last, last - max(number_values, 0), -1)) # No spacing to spread over: the newest index, if any
+    return sorted(set(last - round(i * (total - 1) / (number_values - 1)) for i in range(number_values)), reverse=True)
 
 def grab_price_change(id_name):
     '''
     Older function -- used to get change in price over a certain amount of time
     '''
-    all_prices = []
-    with open(FEEDS_PATH) as f:
-        data = json.load(f)
-    id_num = int(data[id_name]['id'])
-    [worked, value, timestamp] = (tellor_contract.functions.getCurrentValue(id_num).call())
-    all_prices.append(value/GRANULAITY)
-    for i in range(0, NUM_VALS):
-        [worked, value, timestamp] = (tellor_contract.functions.getDataBefore(id_num, timestamp).call())
-        all_prices.append(value/GRANULAITY)
-    return all_prices[::-1]
+    id_num = feed_id(id_name)
+    last = get_index_range(id_num, 0)[1]
+    values = grab_values(id_num, range(max(last - NUM_VALS, 0), last + 1))
+    return [value / GRANULAITY for value, timestamp in values]
+
+def iter_rows(id_num, start_index=None, chunk_size=BATCH_SIZE):
+    '''
+    Yields value rows newest first, starting at start_index (the newest value by default).
+    Values are fetched chunk_size at a time, only as they are consumed
+    '''
+    if start_index is None:
+        start_index = get_index_range(id_num, 0)[1]
+    for top in range(start_index, -1, -chunk_size):
+        for row in grab_rows(id_num, range(top, max(top - chunk_size, -1), -1), chunk_size):
+            yield row
+
+def iter_history(id_name, num_of_days, chunk_size=BATCH_SIZE):
+    '''
+    Yields the values of the last num_of_days newest first (plus the first value before the
+    window), for the streaming helpers in stream.py
+    '''
+    old_date = scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60
+    return scripts.helpers.stream.until(iter_rows(feed_id(id_name), None, chunk_size), old_date)
+
+def get_price_series(id_name, number_values, num_of_days):
+    '''
+    Get number_values evenly spaced values over the last num_of_days as a RoundSeries (every
+    value in the window when number_values is None)
+    '''
+    id_num = feed_id(id_name)
+
+    # Resolve the index range of the window once, then read only the sampled values
+    old_date = scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60
+    first, last = get_index_range(id_num, old_date)
+    rows = grab_rows(id_num, sample_indices(first, last, number_values))
+    return scripts.helpers.series.RoundSeries.from_rows(rows, DECIMALS)
+
+def read_price_series(id_name, num_of_days):
+    '''
+    Every value of the last num_of_days as a RoundSeries, read only from the local store
+    (which the collector keeps up to date)
+    '''
+    old_date = scripts.helpers.cassette.now() - num_of_days * 24 * 60 * 60
+    rows = scripts.helpers.store.load_since(STORE_NAME, str(feed_id(id_name)), int(old_date))
+    return scripts.helpers.series.RoundSeries.from_rows(rows, DECIMALS)
 
 def get_better_price(id_name, number_values, num_of_days):
     '''
-    Updated function get price over time
-    '''
-    # Define initial variables
-    all_prices = []
-    all_timestamps = []
-    with open(FEEDS_PATH) as f:
-        data = json.load(f)
-    id_num = int(data[id_name]['id'])
-
-    # Get initial data and old date
-    old_date = datetime.timestamp(datetime.now() - timedelta(days=num_of_days))
-    initial_data = tellor_contract.functions.getCurrentValue(id_num).call()
-    all_prices.append(initial_data[1] / GRANULAITY)
-    all_timestamps.append(datetime.fromtimestamp(int(initial_data[2])))
-
-    # Loop through old data and append all prices and time stamps
-    while (old_date < initial_data[2]):
-        initial_data = tellor_contract.functions.getDataBefore(id_num, initial_data[2]).call()
-        all_prices.append(initial_data[1] / GRANULAITY)
-        all_timestamps.append(datetime.fromtimestamp(int(initial_data[2])))
-    round_factor = math.floor(len(all_prices) / number_values)
-
-    # Trim down number of elements to fit into needed values
-    if len(all_prices) < number_values:
-        round_factor = number_values
-    all_prices = all_prices[::round_factor]
-    all_timestamps = all_timestamps[::round_factor]
-    last_offset = abs(len(all_prices) - number_values)
-    all_prices = all_prices[last_offset:]
-    all_timestamps = all_timestamps[last_offset:]
-    return all_prices, all_timestamps
+    Updated function get price over time, newest first
+    '''
+    series = get_price_series(id_name, number_values, num_of_days)
+    all_timestamps = [datetime.fromtimestamp(int(elem)) for elem in series.timestamps[::-1]]
+    return series.prices[::-1].tolist(), all_timestamps
+
+def get_time_series(id_name, num_rounds):
+    '''
+    Get the newest value and the num_rounds before it as a RoundSeries
+    '''
+    id_num = feed_id(id_name)
+    last = sync_history(id_num, num_rounds)
+    rows = grab_rows(id_num, range(last, max(last - num_rounds, 0) - 1, -1))
+    return scripts.helpers.series.RoundSeries.from_rows(rows, DECIMALS)
+
+def read_time_series(id_name, num_rounds):
+    '''
+    The newest value and the num_rounds before it, read only from the local store
+    '''
+    rows = scripts.helpers.store.load_newest(STORE_NAME, str(feed_id(id_name)), num_rounds + 1)
+    return scripts.helpers.series.RoundSeries.from_rows(rows, DECIMALS)
 
 def grab_time_change(id_name, num_rounds):
     '''
     Get the change in update time over a certain amount of requests!
     '''
-    # Define initial variables
-    all_diffs = []
-    all_timestamps = []
-    old_timestamp = datetime.now()
-    new_timestamp = datetime.now()
-    with open(FEEDS_PATH) as f:
-        data = json.load(f)
-    id_num = int(data[str(id_name)]['id'])
-
-    # Grab initial timestamp
-    [worked, value, timestamp] = (tellor_contract.functions.getCurrentValue(id_num).call())
-    all_timestamps.append(datetime.utcfromtimestamp(timestamp))
-    new_timestamp = datetime.utcfromtimestamp(timestamp)
-
-    # Loop through time change to get to old values
-    for i in range(0, num_rounds):
-        [worked, value, timestamp] = (tellor_contract.functions.getDataBefore(id_num, timestamp).call())
-        old_timestamp = datetime.utcfromtimestamp(timestamp)
-        time_diff = new_timestamp - old_timestamp
-        all_diffs.append(time_diff.seconds)
-        all_timestamps.append(datetime.utcfromtimestamp(timestamp))
-        new_timestamp = old_timestamp
-    return all_diffs[::-1], all_timestamps[:num_rounds]
+    series = get_time_series(id_name, num_rounds)
+    all_timestamps = [datetime.fromtimestamp(int(elem)) for elem in series.timestamps[::-1]]
+    return series.intervals().tolist(), all_timestamps[:num_rounds]
+
+def gas_paths(feeds):
+    '''
+    Read paths of feeds for the gas profile: getCurrentValue of each feed, getLastValues for
+    BULK_VALUES values of each feed, and getLastValuesAll for the newest value of every ID the lens tracks
+    '''
+    paths = []
+    for pair in feeds:
+        paths.append({'function': 'getCurrentValue', 'pairs': [pair], 'values': 1, 'call': tellor_contract.functions.getCurrentValue(feed_id(pair))})
+        paths.append({'function': 'getLastValues', 'pairs': [pair], 'values': BULK_VALUES, 'call': tellor_contract.functions.getLastValues(feed_id(pair), BULK_VALUES)})
+    tracked = len(tellor_contract.functions.dataIDsAll().call())
+    paths.append({'function': 'getLastValuesAll', 'pairs': [], 'values': tracked, 'call': tellor_contract.functions.getLastValuesAll(1)})
+    return paths
 
 def grab_gas_estimate(id_name):
     '''
     Estimate gas for retrieving data from the chain.
     '''
-    with open('feeds/tellor.json') as f:
-        data = json.load(f)
-    id_num = int(data[str(id_name)]['id'])
-    return (tellor_contract.functions.getCurrentValue(id_num).estimateGas())
+    id_num = feed_id(id_name)
+    return scripts.helpers.contract.batch_estimate([tellor_contract.functions.getCurrentValue(id_num)])[0]
 
 def print_data(elem, value, timestamp):
     '''
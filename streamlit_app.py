@@ -1,20 +1,21 @@
 # Importing essential libraries for parsing data and presentation
 from datetime import datetime
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-import matplotlib.font_manager as fm
-import matplotlib.dates as mdates
 import numpy as np
 import pandas as pd
-from scipy import stats
 import streamlit as st
 
 # Importing scripts from individual oracles
 import scripts.chainlink
 import scripts.tellor
 import scripts.dia
-import scripts.band
 import scripts.gas
+import scripts.gasprofile
+import scripts.helpers.catalog
+import scripts.helpers.store
+import scripts.helpers.downsample
+import scripts.helpers.stats
+import scripts.helpers.divergence
+import scripts.helpers.metrics
 
 # Streamlit Configuration!
 st.set_page_config(
@@ -24,13 +25,21 @@ st.set_page_config(
      initial_sidebar_state="expanded",
 )
 
-# Matplotlib Configuration!
-fe = fm.FontEntry(
-    fname='style/Renogare.ttf',
-    name='Renogare')
-fm.fontManager.ttflist.insert(0, fe)
-mpl.rcParams['font.family'] = fe.name
-mpl.rcParams['xtick.labelsize'] = 6
+# The page makes no requests itself: the RPC usage shown at the bottom of the sidebar is the collector's
+show_rpc_usage = st.sidebar.checkbox('Show RPC usage')
+
+# Says which oracles have no history stored for a pair yet (e.g. before the collector's first sync)
+def note_missing(pair, named_series):
+    for name, series in named_series.items():
+        if not len(series):
+            st.info(name + ' history for ' + pair + ' has not been collected yet.')
+
+# Draws a fixed-bin histogram from scripts.helpers.stats, trimmed after its last non-empty bin
+# (the overflow bin is drawn as one last bar)
+def plot_histogram(ax, histogram):
+    counts = histogram.counts + [histogram.overflow]
+    used = max([i + 1 for i, count in enumerate(counts) if count] or [1])
+    ax.bar(histogram.edges[:used], counts[:used], width=histogram.width, align='edge')
 
 """
 # 🔮 Comparing Oracles
@@ -40,7 +49,7 @@ This project analyzes different oracles within the world of blockchain developme
 By observing and comparing various relevant metrics of oracles, I was able to gain some reasonable comprehension about
 the world of crypto more practically.
 
-*Note: Streamlit data app may take a few seconds to load in data from Ethereum Mainnet!*
+*Note: every number below is read from the local store, which `python -m scripts.collector` keeps up to date from Ethereum Mainnet.*
 """
 
 """
@@ -112,56 +121,58 @@ For each oracle, I utilizes the below functions from their ABIs:
 * Band Protocol: `getReferenceData(string _base, string _quote)`
 * DIA: `getCoinInfo(string name)`
 
-Below is a table of initial results. Note that for the Band Protocol, I had a bit of trouble communicating with their
-smart contract to get the values for AMPL, so I marked it as `-1`.
+Below is a table of initial results. Each oracle is read in bulk where its ABI allows it (`getReferenceDataBulk` for Band
+and `getLastValuesAll` for Tellor). Note that the Band Protocol does not serve AMPL, so that cell is left empty.
 """
-# Coins, oracles, and timespans to look at!
-coins = ["BTC", "ETH", "AMPL"]
+# Coins and oracles to look at: every catalog pair with history on both Tellor and Chainlink
+pairs = scripts.helpers.catalog.pairs("tellor", "chainlink")
+coins = [pair.split("/")[0] for pair in pairs]
 oracle_names = ["Tellor", "Chainlink", "Band Protocol", "DIA"]
-timespans = [25, 25, 8] # If changed, originally 80
-
-# Dataframe for the Oracle
-oracles = pd.DataFrame({
-    'Name': [],
-    'BTC/USD': [],
-    'ETH/USD': [],
-    'AMPL/USD': [],
-})
+chart_points = 200 # Most points drawn per series on any chart, however many rounds are loaded
 
-# Getting data for Chainlink
-oracles.loc[len(oracles.index)] = ['Chainlink'] +  scripts.chainlink.grab_feeds()
+# The page never talks to the chain: everything comes from the store the collector fills
+latest_prices = scripts.helpers.store.load_values('price')
+if not latest_prices:
+    st.warning('Nothing has been collected yet. Run `python -m scripts.collector` (or `--once`) to fill the local store.')
+    st.stop()
 
-# Getting data for Tellor
-oracles.loc[len(oracles.index)] = ['Tellor'] + scripts.tellor.grab_feeds()
-
-# Getting data for Dia
-dia_data = ['DIA']
-for i in range(0, len(coins)):
-    dia_data.append(scripts.dia.return_price(coins[i]))
-oracles.loc[len(oracles.index)] = dia_data
-
-# Getting data for Band Protocol
-band_data = ['Band']
-for i in range(0, len(coins) - 1):
-    band_data.append(scripts.band.return_prices(coins[i]))
-oracles.loc[len(oracles.index)] = band_data + [-1]
+# Dataframe for the Oracle, filled from each oracle's latest collected price
+oracles = pd.DataFrame(columns=['Name'] + pairs)
+for name, key in [('Chainlink', 'chainlink'), ('Tellor', 'tellor'), ('DIA', 'dia'), ('Band', 'band')]:
+    oracles.loc[len(oracles.index)] = [name] + [latest_prices.get((key, pair), (None,))[0] for pair in pairs]
 
 # Display data as a table
 st.table(oracles)
 
+# matplotlib takes a while to import, and is only needed from the first chart on
+import matplotlib.pyplot as plt
+import matplotlib as mpl
+import matplotlib.font_manager as fm
+import matplotlib.dates as mdates
+
+# Matplotlib Configuration!
+fe = fm.FontEntry(
+    fname='style/Renogare.ttf',
+    name='Renogare')
+fm.fontManager.ttflist.insert(0, fe)
+mpl.rcParams['font.family'] = fe.name
+mpl.rcParams['xtick.labelsize'] = 6
+
 """
 ***
 ### 🏷 **Change in Price Feed over Time**
 The next metric I decided to look at was the change in value over time of a certain cryptocurrency. Due to the limitations
 of specific oracles and their smart contracts, I was able to grab historical data from only Tellor and Chainlink.
 
-As a general methodology, I first grabbed the latest request for a value for each price feed. For both Tellor and Chainlink,
-the respective functions from the respective ABIs returned round IDs. Thus, by subtracting 1 for each previous round, I was able
-to iterate over the previous days by grabbing the value of a price feed at a specific ID or timestamp.
+The history is not fetched while this page loads. The collector (`python -m scripts.collector`) keeps a local
+store, `data/history.db`, up to date: on each pass it reads the newest round or value of every feed and fetches
+only the ones newer than what is already stored, in batched calls. Chainlink rounds can also be filled in bulk from
+the aggregators' `AnswerUpdated` events (`python -m scripts.ingest`). This page then reads the window you pick from
+the store, so a feed the collector has not synced yet shows up as not collected.
 
-Below are the functions I utilized from each ABI:
-* Tellor: `getDataBefore(uint256 _requestId, uint256 _timestamp)`
-* Chainlink: `getRoundData(uint80 _roundId)`
+Below are the functions the collector uses from each ABI:
+* Tellor: `getNewValueCountbyRequestId(uint256 _requestId)`, `getTimestampbyRequestIDandIndex(uint256 _requestId, uint256 _index)` and `retrieveData(uint256 _requestId, uint256 _timestamp)`
+* Chainlink: `latestRoundData()` and `getRoundData(uint80 _roundId)`
 
 ** To Run: ** Choose the number of days you want to look back in time.
 """
@@ -169,23 +180,81 @@ Below are the functions I utilized from each ABI:
 # Adding slider functionality to look farther back in time
 calculated_timespan = st.slider('Slide to choose a number below:', 8, 30, 30) # Change to 30 later on!
 
+# Read every stored round in the window for every coin
+price_series = []
+for i in range(0, len(coins)):
+    price_series.append([
+        scripts.tellor.read_price_series(coins[i] + "/USD", calculated_timespan),
+        scripts.chainlink.read_price_series(coins[i] + "/USD", calculated_timespan),
+    ])
+
 # Looking at all of the data, and then getting those values
 for i in range(0, len(coins)):
 
     # Grab values
-    tellor_prices, tellor_timestamps = scripts.tellor.get_better_price(coins[i] + "/USD", timespans[i], calculated_timespan)
-    chainlink_prices = scripts.chainlink.get_better_price(coins[i] + "/USD", timespans[i], calculated_timespan)
+    tellor_series = price_series[i][0]
+    chainlink_series = price_series[i][1]
+
+    # Thin both series with LTTB over the same time buckets, so the x-axes line up
+    span = scripts.helpers.downsample.common_span([tellor_series.timestamps, chainlink_series.timestamps])
+    tellor_times, tellor_prices = scripts.helpers.downsample.downsample(tellor_series.timestamps, tellor_series.prices, chart_points, 'lttb', span)
+    chainlink_times, chainlink_prices = scripts.helpers.downsample.downsample(chainlink_series.timestamps, chainlink_series.prices, chart_points, 'lttb', span)
 
-    # Graph the values
+    # Graph the values, each against its own update times
     st.markdown('** Graph of Value of ' + coins[i] + '/USD **')
+    note_missing(coins[i] + '/USD', {"Tellor": tellor_series, "Chainlink": chainlink_series})
     fig, ax = plt.subplots()
-    ax.plot(tellor_timestamps, tellor_prices, label="Tellor")
-    ax.plot(tellor_timestamps, chainlink_prices, label="Chainlink")
+    ax.plot(tellor_times.astype('datetime64[s]'), tellor_prices, label="Tellor")
+    ax.plot(chainlink_times.astype('datetime64[s]'), chainlink_prices, label="Chainlink")
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
     ax.set_title("Prices for " + coins[i] + "/USD", fontweight="bold", fontsize="12")
     ax.set_xlabel("Time", fontsize="10")
     ax.set_ylabel("Price (in USD)", fontsize="10")
-    ax.set_xticks(tellor_timestamps[::5])
+    ax.legend()
+    st.pyplot(fig)
+
+"""
+***
+### ↔️ **Divergence Between Oracles**
+To see how far apart the oracles actually are, every oracle's price for a pair is put on a shared one-minute grid. An oracle's
+answer stands until its next update, so each grid point holds the latest answer at or before it. The spread at each point is the
+highest price minus the lowest, divided by the median of the oracles.
+
+Below are the worst deviation over each hour and the time-weighted average deviation over the same hour, over the window chosen
+above. DIA's on-chain updates are included whenever they have been ingested into the local store.
+"""
+
+for i in range(0, len(coins)):
+
+    # Put every oracle with history for this pair on one grid
+    named_series = {
+        "Tellor": price_series[i][0],
+        "Chainlink": price_series[i][1],
+    }
+    if scripts.helpers.catalog.supports(pairs[i], "dia"):
+        named_series["DIA"] = scripts.dia.get_history_series(pairs[i], calculated_timespan)
+    divergence = scripts.helpers.divergence.from_series(coins[i] + "/USD", named_series)
+    peak, mean = divergence.rolling(scripts.helpers.divergence.WINDOW)
+    summary = divergence.summary()
+
+    # Print the headline numbers
+    st.markdown('** Divergence of ' + coins[i] + '/USD across ' + ', '.join(divergence.columns) + ' **')
+    if summary['at'] is None:
+        st.text('Not enough overlapping history to compare oracles')
+        continue
+    st.text('Largest deviation: ' + str(round(summary['max'] * 100, 3)) + '% at ' + str(datetime.fromtimestamp(summary['at'])))
+    st.text('Time-weighted average deviation: ' + str(round(summary['mean'] * 100, 3)) + '%')
+
+    # Graph the hourly worst and average deviation, thinned like the price charts
+    peak_plot = scripts.helpers.downsample.downsample(divergence.grid, np.nan_to_num(peak), chart_points, 'minmax')
+    mean_plot = scripts.helpers.downsample.downsample(divergence.grid, np.nan_to_num(mean), chart_points, 'lttb')
+    fig, ax = plt.subplots()
+    ax.plot(peak_plot[0].astype('datetime64[s]'), peak_plot[1] * 100, label="Worst in past hour")
+    ax.plot(mean_plot[0].astype('datetime64[s]'), mean_plot[1] * 100, label="Average over past hour")
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
+    ax.set_title("Deviation Between Oracles for " + coins[i] + "/USD", fontweight="bold", fontsize="12")
+    ax.set_xlabel("Time", fontsize="10")
+    ax.set_ylabel("Deviation from Median (%)", fontsize="10")
     ax.legend()
     st.pyplot(fig)
 
@@ -202,31 +271,51 @@ updated to when the next requested was started.
 # Adding slider functionality to look farther back in time
 rounds_past = st.slider('Slide to choose a number below:', 2, 300, 300) # Change to 300 later on!
 
-# Arrays for two important times to be analyzed
-tellor_btc_times = []
-chainlink_btc_times = []    
+# Read every coin's stored update times (and the per-block gas used further down)
+time_series = []
+for i in range(0, len(coins)):
+    time_series.append([
+        scripts.tellor.read_time_series(coins[i] + "/USD", rounds_past),
+        scripts.chainlink.read_time_series(coins[i] + "/USD", rounds_past),
+    ])
+btc_starts = [series.timestamps[0] for series in time_series[0] if len(series)]
+block_gas = scripts.gas.read_block_gas(min(btc_starts)) if btc_starts else scripts.gas.BlockGas.from_rows([])
+
+# Interval statistics for BTC, used again by the histograms
+tellor_btc_stats = None
+chainlink_btc_stats = None
 
 # Looping through each coin
 for i in range(0, len(coins)):
 
-    # Grab time changes
-    tellor_times, tellor_timestamps = scripts.tellor.grab_time_change(str(coins[i] + "/USD"), rounds_past)
-    chainlink_times, chainlink_timestamps = scripts.chainlink.grab_time_change(coins[i] + "/USD", rounds_past)
+    # Grab time changes; each interval belongs to the update that ended it
+    tellor_series = time_series[i][0]
+    chainlink_series = time_series[i][1]
+    tellor_times = tellor_series.intervals()
+    chainlink_times = chainlink_series.intervals()
+    tellor_stats = scripts.helpers.stats.from_timestamps("Tellor", coins[i] + "/USD", tellor_series.timestamps)
+    chainlink_stats = scripts.helpers.stats.from_timestamps("Chainlink", coins[i] + "/USD", chainlink_series.timestamps)
 
-    # Save BTC times for future reference
+    # Save BTC statistics for future reference
     if (i  == 0):
-        tellor_btc_times = tellor_times
-        chainlink_btc_times = chainlink_times
+        tellor_btc_stats = tellor_stats
+        chainlink_btc_stats = chainlink_stats
 
     # Print out values for specific coin
     st.markdown('** Graph of time in between requests of ' + coins[i] + ' **')
-    st.text('Average time in between each request for Tellor: ' + str(np.average(tellor_times)) + ' seconds')
-    st.text('Average time in between each request for Chainlink: ' + str(np.average(chainlink_times)) + ' seconds')
+    note_missing(coins[i] + '/USD', {"Tellor": tellor_series, "Chainlink": chainlink_series})
+    st.text('Average time in between each request for Tellor: ' + str(tellor_stats.moments.mean) + ' seconds')
+    st.text('Average time in between each request for Chainlink: ' + str(chainlink_stats.moments.mean) + ' seconds')
+
+    # Thin with min/max buckets on a shared grid, so every slow request is still drawn
+    span = scripts.helpers.downsample.common_span([tellor_series.timestamps[1:], chainlink_series.timestamps[1:]])
+    tellor_plot = scripts.helpers.downsample.downsample(tellor_series.timestamps[1:], tellor_times, chart_points, 'minmax', span)
+    chainlink_plot = scripts.helpers.downsample.downsample(chainlink_series.timestamps[1:], chainlink_times, chart_points, 'minmax', span)
 
     # Graph values
     fig, ax = plt.subplots()
-    ax.plot(chainlink_timestamps, tellor_times, label="Tellor")
-    ax.plot(chainlink_timestamps, chainlink_times, label="Chainlink")
+    ax.plot(tellor_plot[0].astype('datetime64[s]'), tellor_plot[1], label="Tellor")
+    ax.plot(chainlink_plot[0].astype('datetime64[s]'), chainlink_plot[1], label="Chainlink")
 
     # Format axes
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%m-%d'))
@@ -254,11 +343,13 @@ and analyze the standard deviation.
 """
 #### Tellor
 """
-st.text("Mean of Tellor times: " + str(np.mean(tellor_btc_times)) + " seconds")
-st.text("Median of Tellor times: " + str(np.median(tellor_btc_times)) + " seconds")
-st.text("Standard Deviation of Tellor times: " + str(np.std(tellor_btc_times)) + " seconds")
+tellor_summary = tellor_btc_stats.summary()
+st.text("Mean of Tellor times: " + str(tellor_summary['mean']) + " seconds")
+st.text("Median of Tellor times: " + str(tellor_summary['p50']) + " seconds")
+st.text("95th / 99th percentile of Tellor times: " + str(tellor_summary['p95']) + " / " + str(tellor_summary['p99']) + " seconds")
+st.text("Standard Deviation of Tellor times: " + str(tellor_summary['std']) + " seconds")
 fig, ax = plt.subplots()
-ax.hist(tellor_btc_times, bins=15)
+plot_histogram(ax, tellor_btc_stats.histogram)
 ax.set_title("Standard Deviation of Tellor Request Times for BTC", fontsize="12")
 ax.set_xlabel("Total Time to Fulfill Request (s)", fontsize="10")
 ax.set_ylabel("Frequencies", fontsize="10")
@@ -268,11 +359,13 @@ st.pyplot(fig)
 """
 #### Chainlink
 """
-st.text("Mean of Chainlink times: " + str(np.mean(chainlink_btc_times)) + " seconds")
-st.text("Median of Chainlink times: " + str(np.median(chainlink_btc_times)) + " seconds")
-st.text("Standard Deviation of Chainlink times: " + str(np.std(chainlink_btc_times)) + " seconds")
+chainlink_summary = chainlink_btc_stats.summary()
+st.text("Mean of Chainlink times: " + str(chainlink_summary['mean']) + " seconds")
+st.text("Median of Chainlink times: " + str(chainlink_summary['p50']) + " seconds")
+st.text("95th / 99th percentile of Chainlink times: " + str(chainlink_summary['p95']) + " / " + str(chainlink_summary['p99']) + " seconds")
+st.text("Standard Deviation of Chainlink times: " + str(chainlink_summary['std']) + " seconds")
 fig, ax = plt.subplots()
-ax.hist(chainlink_btc_times, bins=15)
+plot_histogram(ax, chainlink_btc_stats.histogram)
 ax.set_title("Standard Deviation of Chainlink Request Times for BTC", fontsize="12")
 ax.set_xlabel("Total Time to Fulfill Request (s)", fontsize="10")
 ax.set_ylabel("Frequencies", fontsize="10")
@@ -284,37 +377,43 @@ st.pyplot(fig)
 Another metric I decided to investigate involved analyzing the gas estimates for retrieving data from each specific oracle.
 Simply put, gas refers to the cost needed in order to perform a transaction on a blockchain network. Transactions fees are
 equal to the product of the units of gas used and the price per unit. However, the units of gas is ultimately fixed [11]. In order
-to calculate each gas price, I utilized the `estimate_gas()` function within `web3.py`.
+to calculate each gas estimate, I utilized `eth_estimateGas`, batched over every read path of every oracle by the collector.
 
 It's also important to note that the amount of gas required is also highly dependent on the amount of data being sent back
-from the smart contract and the function being called.
+from the smart contract and the function being called. Oracles with a bulk read (Band's `getReferenceDataBulk`, Tellor's
+`getLastValues` and `getLastValuesAll`) are compared by the gas paid per value returned.
 """
 
-# Grabbing all gas prices for calling BTC!
-gas_prices = []
-gas_prices.append(scripts.tellor.grab_gas_estimate("BTC/USD"))
-gas_prices.append(scripts.chainlink.grab_gas_estimate("BTC/USD"))
-gas_prices.append(scripts.dia.grab_gas_estimate("Bitcoin"))
-gas_prices.append(scripts.band.grab_gas_estimate("BTC"))
+# Grabbing the gas estimates for calling BTC, from the collector's last gas profile
+gas_profile = scripts.helpers.store.load_profile()
+single_reads = scripts.gasprofile.single_reads(gas_profile)
+gas_prices = [single_reads.get((scripts.helpers.catalog.NAMES[key], "BTC/USD")) or 0 for key in ['tellor', 'chainlink', 'band', 'dia']]
 st.markdown("** Graph of Gas Estimates for Grabbing Current Value **")
 
 # Print all results!
 for i in range(0, len(oracles)):
-    st.text('Average Gas Price for Single Value Request for ' + oracle_names[i] + ': ' + str(gas_prices[i]) + ' Gwei')
+    st.text('Gas Estimate for Single Value Request for ' + oracle_names[i] + ': ' + str(gas_prices[i]) + ' gas')
 
 # Graph Results
 fig, ax = plt.subplots()
 ax.bar(oracle_names,gas_prices)
 ax.set_title("Graph of Gas Estimates for Different Oracles", fontsize="12")
 ax.set_xlabel("Oracle", fontsize="10")
-ax.set_ylabel("Gas Price (Gwei)", fontsize="10")
+ax.set_ylabel("Gas (units)", fontsize="10")
 st.pyplot(fig)
 
+# Average gas per value of every read path, single and bulk, across all profiled pairs
+st.markdown("** Gas per Value for Each Read Path **")
+profile_rows = pd.DataFrame([row for row in gas_profile if row['gas'] is not None], columns=['oracle', 'function', 'pairs', 'values', 'gas'])
+profile_rows['gas_per_value'] = profile_rows['gas'] / profile_rows['values']
+st.table(profile_rows.groupby(['oracle', 'function'])[['values', 'gas', 'gas_per_value']].mean().round(0))
+
 """
 ***
 ### 🕰 x ⛽️ **Change in Request Time vs. Gas**
 When looking at request time, the last relevant portion to note is how the time to fulfill each request changes
-with fluctuating gas prices. Note that changing gas prices are due to increased demand on the blockchain.
+with fluctuating gas prices. Note that changing gas prices are due to increased demand on the blockchain. Each request
+is matched to the gas price (base fee plus median priority fee) of the block closest to the time it was fulfilled.
 
 In addition to plotting the scatterplot, the equation for the best-fit line, found using regression, is calculated.
 From this data, we can also provide the corresponding correlation and p-value. A smaller absolute value of the correlation
@@ -323,46 +422,44 @@ indicates that there is less of a relationship between gas prices and request ti
 ** For Reference: ** The number of rounds to look back is determined by the previous slider.
 """
 
-# Getting proper gas times and time differences between each request
-chainlink_times, chainlink_timestamps = scripts.chainlink.grab_time_change("BTC/USD", rounds_past)
-tellor_times, tellor_timestamps = scripts.tellor.grab_time_change("BTC/USD", rounds_past)
-gas_prices, gas_times = scripts.gas.get_timestamps(rounds_past)
+# scipy is only needed for the correlations below, so it is imported here to keep start-up quick
+from scipy import stats
 
-# Getting the corresponding gas prices for Chainlink, and plotting
-chainlink_prices = scripts.gas.get_corresponding_prices(chainlink_timestamps, gas_times, gas_prices)
-fig, ax = plt.subplots()
-ax.scatter(chainlink_times, chainlink_prices)
-m, b = np.polyfit(chainlink_times, chainlink_prices, 1)
-ax.plot(chainlink_times, m*(np.array(chainlink_times).astype(np.float64)) + b)
-chainlink_corr = stats.pearsonr(chainlink_times, chainlink_prices)
-
-st.markdown('** Scatter Plot of Request Time vs. Gas Price for Chainlink **')
-st.text('Linear Regression: m = ' + str(m) + ', b = ' + str(b))
-st.text('Pearson Correlation Coefficient: r = ' + str(chainlink_corr[0]))
-st.text('P-Value: p = ' + str(chainlink_corr[1]))
-
-ax.set_title("Request Time vs. Gas Price for Chainlink", fontsize="12")
-ax.set_xlabel("Time to Fulfill Request (s)", fontsize="10")
-ax.set_ylabel("Gas Price (Gwei)", fontsize="10")
-st.pyplot(fig)
+# Getting proper gas times and time differences between each request (BTC was read from the store above)
+chainlink_series = time_series[0][1]
+tellor_series = time_series[0][0]
+chainlink_times = chainlink_series.intervals()
+tellor_times = tellor_series.intervals()
+
+# Draws request time against the gas price of the nearest block (within gas.PRICE_TOLERANCE) for one oracle,
+# fitting and correlating only the updates that matched a block, as report.regression does
+def plot_gas_scatter(name, series, times):
+    prices = np.asarray(scripts.gas.get_corresponding_prices(series.timestamps[1:], block_gas.timestamps, block_gas.prices(),
+                                                             tolerance=scripts.gas.PRICE_TOLERANCE))
+    matched = ~np.isnan(prices)
+    st.markdown('** Scatter Plot of Request Time vs. Gas Price for ' + name + ' **')
+    if np.sum(matched) < 2 or np.ptp(times[matched]) == 0:
+        st.info('Not enough ' + name + ' updates with collected block gas yet.')
+        return
+    times, prices, timestamps = times[matched], prices[matched], series.timestamps[1:][matched]
+    fig, ax = plt.subplots()
+    shown = scripts.helpers.downsample.downsample_indices(timestamps, times, chart_points, 'minmax')
+    ax.scatter(times[shown], prices[shown])
+    m, b = np.polyfit(times, prices, 1)
+    ax.plot(times[shown], m*(times[shown].astype(np.float64)) + b)
+    corr = stats.pearsonr(times, prices)
+
+    st.text('Linear Regression: m = ' + str(m) + ', b = ' + str(b))
+    st.text('Pearson Correlation Coefficient: r = ' + str(corr[0]))
+    st.text('P-Value: p = ' + str(corr[1]))
+
+    ax.set_title("Request Time vs. Gas Price for " + name, fontsize="12")
+    ax.set_xlabel("Time to Fulfill Request (s)", fontsize="10")
+    ax.set_ylabel("Gas Price (Gwei)", fontsize="10")
+    st.pyplot(fig)
 
-# Getting the corresponding gas prices for Tellor, and plotting
-tellor_prices = scripts.gas.get_corresponding_prices(tellor_timestamps, gas_times, gas_prices)
-fig, ax = plt.subplots()
-ax.scatter(tellor_times, tellor_prices)
-m, b = np.polyfit(tellor_times, tellor_prices, 1)
-ax.plot(tellor_times, m*(np.array(tellor_times).astype(np.float64)) + b)
-tellor_corr = stats.pearsonr(tellor_times, tellor_prices)
-
-st.markdown('** Scatter Plot of Request Time vs. Gas Price for Tellor **')
-st.text('Linear Regression: m = ' + str(m) + ', b = ' + str(b))
-st.text('Pearson Correlation Coefficient: r = ' + str(tellor_corr[0]))
-st.text('P-Value: p = ' + str(tellor_corr[1]))
-
-ax.set_title("Request Time vs. Gas Price for Tellor", fontsize="12")
-ax.set_xlabel("Time to Fulfill Request (s)", fontsize="10")
-ax.set_ylabel("Gas Price (Gwei)", fontsize="10")
-st.pyplot(fig)
+plot_gas_scatter("Chainlink", chainlink_series, chainlink_times)
+plot_gas_scatter("Tellor", tellor_series, tellor_times)
 
 """
 ***
@@ -388,4 +485,21 @@ st.pyplot(fig)
 [10] https://github.com/cpondoc/oracle-diff
 
 [11] https://www.investopedia.com/terms/g/gas-ethereum.asp
-"""
\ No newline at end of file
+"""
+
+# RPC usage of the collector since it started, per function that made the requests, as it last saved it
+if show_rpc_usage:
+    summary = scripts.helpers.metrics.load(scripts.helpers.metrics.SUMMARY_PATH)
+    st.sidebar.markdown('** RPC Usage (collector) **')
+    if summary is None:
+        st.sidebar.text('Nothing saved yet: the collector saves its usage every minute.')
+    else:
+        usage = pd.DataFrame(summary['rows'])
+        if not usage.empty:
+            columns = ['count', 'hits', 'misses', 'seconds', 'sent', 'received', 'errors']
+            usage = usage.groupby(['caller', 'method', 'function'], dropna=False, as_index=False)[columns].sum()
+            usage['ms'] = (usage['seconds'] * 1000 / usage['count']).round(1)
+            usage = usage.sort_values('count', ascending=False)
+            usage = usage[['caller', 'method', 'function', 'count', 'hits', 'misses', 'ms', 'sent', 'received', 'errors']]
+        st.sidebar.text('Saved at ' + str(datetime.fromtimestamp(summary['time'])))
+        st.sidebar.dataframe(usage)
@@ -0,0 +1,46 @@
+'''
+Shared fixtures: every test runs from the repository root with its own store, and talks to the
+endpoint it is given instead of mainnet
+'''
+
+import os
+import pytest
+import scripts.helpers.cache
+import scripts.helpers.contract
+import scripts.helpers.store
+import tests.localchain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(scripts.helpers.store, 'STORE_PATH', str(tmp_path / 'history.db'))
+    monkeypatch.setattr(scripts.helpers.store, '_connection', None)
+    scripts.helpers.cache.clear()
+    yield scripts.helpers.store
+
+@pytest.fixture
+def use_rpc(monkeypatch):
+    '''
+    Points the shared pool and Web3 instance at the given endpoint URLs
+    '''
+    def point(*urls):
+        monkeypatch.setattr(scripts.helpers.contract, 'RPC_URL', urls[0])
+        monkeypatch.setattr(scripts.helpers.contract, 'RPC_URLS', list(urls))
+        monkeypatch.setattr(scripts.helpers.contract, '_pool', None)
+        monkeypatch.setattr(scripts.helpers.contract, '_web3', None)
+        monkeypatch.setattr(scripts.helpers.contract, '_contracts', {})
+        scripts.helpers.cache.clear()
+    return point
+
+@pytest.fixture(scope='session')
+def chain():
+    '''
+    A local dev chain (see localchain.py); tests using it are skipped when none is available
+    '''
+    url, cleanup = tests.localchain.chain_url()
+    if url is None:
+        pytest.skip('no local chain: install anvil or eth-tester, or set ORACLE_DIFF_TEST_CHAIN')
+    yield tests.localchain.Chain(url)
+    cleanup()
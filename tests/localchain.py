@@ -0,0 +1,192 @@
+'''
+File: localchain.py
+A local development chain for tests, plus a tiny EVM assembler for mock contracts
+
+Notes:
+- chain_url() uses, in order: ORACLE_DIFF_TEST_CHAIN (URL of a running anvil or other dev node), an anvil
+  binary on the PATH, or eth-tester served over HTTP in-process. Tests are skipped when none is available
+- eth-tester has no HTTP server of its own, so serve() puts one in front of web3's EthereumTesterProvider.
+  Run this file as a script (python tests/localchain.py 8546) to serve it from another environment,
+  e.g. one where eth-tester installs next to a newer web3
+- Mock contracts are assembled by hand, so no Solidity compiler is needed (see emitter())
+'''
+
+''' Libraries '''
+import http.server
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import requests
+
+''' Constants '''
+OPCODES = {'STOP': 0x00, 'SUB': 0x03, 'LT': 0x10, 'EQ': 0x14, 'ADDRESS': 0x30, 'CALLDATALOAD': 0x35,
+           'CALLDATASIZE': 0x36, 'CALLDATACOPY': 0x37, 'CODECOPY': 0x39, 'DUP1': 0x80, 'MSTORE': 0x52,
+           'JUMPI': 0x57, 'JUMPDEST': 0x5b, 'PUSH1': 0x60, 'RETURN': 0xf3, 'LOG0': 0xa0} # The few opcodes the mocks use
+GAS = 3000000 # Gas sent with every test transaction
+
+def assemble(lines):
+    '''
+    Assembles 'OPCODE [byte]' lines into hex bytecode. 'name:' marks a label (a JUMPDEST is
+    emitted there) and 'PUSH1 @name' pushes its offset
+    '''
+    labels = {}
+    offset = 0
+    for line in lines:
+        if line.endswith(':'):
+            labels[line[:-1]] = offset
+        offset += 2 if line.startswith('PUSH1') else 1
+    code = bytearray()
+    for line in lines:
+        if line.endswith(':'):
+            code.append(OPCODES['JUMPDEST'])
+            continue
+        name, _, argument = line.partition(' ')
+        code.append(OPCODES[name] if not name.startswith('LOG') else OPCODES['LOG0'] + int(name[3:]))
+        if argument:
+            code.append(labels[argument[1:]] if argument.startswith('@') else int(argument, 0))
+    return code.hex()
+
+def emitter(topics):
+    '''
+    Runtime code of a mock that, for calldata of `topics` 32-byte words followed by the event data,
+    emits a log with those topics and that data. Shorter calldata is treated as a view call: with no
+    arguments it returns 1 (e.g. phaseId()), otherwise its own address (e.g. phaseAggregators(1))
+    '''
+    lines = ['PUSH1 ' + hex(32 * topics), 'CALLDATASIZE', 'LT', 'PUSH1 @view', 'JUMPI']
+    for i in reversed(range(topics)):
+        lines += ['PUSH1 ' + hex(32 * i), 'CALLDATALOAD']
+    lines += ['PUSH1 ' + hex(32 * topics), 'CALLDATASIZE', 'SUB', 'DUP1', 'PUSH1 ' + hex(32 * topics), 'PUSH1 0',
+              'CALLDATACOPY', 'PUSH1 0', 'LOG' + str(topics), 'STOP']
+    lines += ['view:', 'PUSH1 4', 'CALLDATASIZE', 'EQ', 'PUSH1 @constant', 'JUMPI', 'ADDRESS', 'PUSH1 1', 'PUSH1 @answer', 'JUMPI']
+    lines += ['constant:', 'PUSH1 1', 'answer:', 'PUSH1 0', 'MSTORE', 'PUSH1 32', 'PUSH1 0', 'RETURN']
+    return assemble(lines)
+
+def deployer(runtime):
+    '''
+    Init code that deploys runtime (hex) as is
+    '''
+    size = len(runtime) // 2
+    return assemble(['PUSH1 ' + hex(size), 'DUP1', 'PUSH1 11', 'PUSH1 0', 'CODECOPY', 'PUSH1 0', 'RETURN']) + runtime
+
+def to_json(value):
+    '''
+    eth-tester answers with Python values; a node answers with hex quantities and data
+    '''
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    if isinstance(value, dict) or hasattr(value, 'items'):
+        return {key: to_json(elem) for key, elem in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(elem) for elem in value]
+    return value
+
+def serve(port=0):
+    '''
+    Starts eth-tester behind a JSON-RPC HTTP server on a thread. Returns (server, url)
+    '''
+    from web3 import Web3, EthereumTesterProvider
+    provider = EthereumTesterProvider()
+    web3 = Web3(provider)
+    request = provider.request_func(web3, web3.middleware_onion)
+    lock = threading.Lock()
+
+    def answer(call):
+        with lock:
+            reply = request(call['method'], call.get('params', []))
+        return dict(to_json(reply), id=call.get('id'), jsonrpc='2.0')
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            data = json.dumps([answer(call) for call in body] if isinstance(body, list) else answer(body)).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:' + str(server.server_address[1])
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class Chain:
+    '''
+    A dev chain at url, with helpers to deploy mocks and send transactions from its first account
+    '''
+
+    def __init__(self, url):
+        self.url = url
+        self.account = self.rpc('eth_accounts', [])[0]
+
+    def rpc(self, method, params):
+        reply = requests.post(self.url, json={'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}).json()
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+        return reply['result']
+
+    def transact(self, to, data):
+        '''
+        Sends a transaction and returns its receipt
+        '''
+        transaction = {'from': self.account, 'data': data, 'gas': hex(GAS)}
+        if to is not None:
+            transaction['to'] = to
+        tx_hash = self.rpc('eth_sendTransaction', [transaction])
+        for _ in range(100):
+            receipt = self.rpc('eth_getTransactionReceipt', [tx_hash])
+            if receipt is not None:
+                return receipt
+            time.sleep(0.05)
+        raise TimeoutError('transaction ' + tx_hash + ' was not mined')
+
+    def deploy(self, runtime):
+        return self.transact(None, '0x' + deployer(runtime))['contractAddress']
+
+    def block_number(self):
+        return int(self.rpc('eth_blockNumber', []), 16)
+
+def chain_url():
+    '''
+    Returns (url, cleanup) of a dev chain, or (None, None) when none can be started here
+    '''
+    if os.environ.get('ORACLE_DIFF_TEST_CHAIN'):
+        return os.environ['ORACLE_DIFF_TEST_CHAIN'], lambda: None
+    if shutil.which('anvil'):
+        port = free_port()
+        process = subprocess.Popen(['anvil', '--port', str(port), '--silent'])
+        url = 'http://127.0.0.1:' + str(port)
+        for _ in range(100):
+            try:
+                requests.post(url, json={'jsonrpc': '2.0', 'id': 1, 'method': 'eth_chainId', 'params': []})
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        return url, process.terminate
+    try:
+        import eth_tester
+    except ImportError:
+        return None, None
+    server, url = serve()
+    return url, server.shutdown
+
+if __name__ == "__main__":
+    server, url = serve(int(sys.argv[1]) if len(sys.argv) > 1 else 8546)
+    print('eth-tester listening on ' + url)
+    threading.Event().wait()
@@ -0,0 +1,52 @@
+'''
+File: stubrpc.py
+Stand-in JSON-RPC endpoints for exercising the pool: each one answers from a script of replies
+'''
+
+''' Libraries '''
+import http.server
+import json
+import threading
+import time
+
+class StubEndpoint:
+    '''
+    An HTTP JSON-RPC server on a free local port. replies is a list of (status, headers, delay)
+    used one per request; once it runs out every request gets a normal answer
+    '''
+
+    def __init__(self, replies=(), delay=0.0):
+        self.replies = list(replies)
+        self.delay = delay
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append(time.monotonic())
+                    status, headers, delay = stub.replies.pop(0) if stub.replies else (200, {}, stub.delay)
+                time.sleep(delay)
+                calls = body if isinstance(body, list) else [body]
+                answers = [{'jsonrpc': '2.0', 'id': call['id'], 'result': hex(len(stub.requests))} for call in calls]
+                data = json.dumps(answers if isinstance(body, list) else answers[0]).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:' + str(self.server.server_address[1])
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,52 @@
+'''
+As-of joins between two time series
+'''
+
+from datetime import datetime
+import numpy as np
+import scripts.helpers.align
+
+def test_exact_matches_in_every_direction():
+    times = [10, 20, 30]
+    for direction in ['backward', 'forward', 'nearest']:
+        assert scripts.helpers.align.match_indices(times, [10, 20, 30], direction).tolist() == [0, 1, 2]
+
+def test_directions_pick_the_expected_side():
+    other = [10, 20]
+    assert scripts.helpers.align.match_indices([5, 14, 16, 25], other, 'backward').tolist() == [-1, 0, 0, 1]
+    assert scripts.helpers.align.match_indices([5, 14, 16, 25], other, 'forward').tolist() == [0, 1, 1, -1]
+    assert scripts.helpers.align.match_indices([5, 14, 16, 25], other, 'nearest').tolist() == [0, 0, 1, 1]
+
+def test_nearest_tie_goes_backward():
+    assert scripts.helpers.align.match_indices([15], [10, 20]).tolist() == [0]
+
+def test_tolerance_boundary_is_inclusive():
+    other = [100]
+    assert scripts.helpers.align.match_indices([124, 125, 76, 75], other, tolerance=24).tolist() == [0, -1, 0, -1]
+
+def test_unsorted_other_times_map_back_to_original_positions():
+    other = [30, 10, 20]
+    assert scripts.helpers.align.match_indices([11, 29, 21], other).tolist() == [1, 0, 2]
+    assert scripts.helpers.align.align([11, 29, 21], other, [3.0, 1.0, 2.0]).tolist() == [1.0, 3.0, 2.0]
+
+def test_duplicate_timestamps_match_one_of_them():
+    other = [10, 20, 20, 30]
+    assert scripts.helpers.align.match_indices([20], other, 'backward').tolist() == [2]
+    assert scripts.helpers.align.match_indices([20], other, 'forward').tolist() == [1]
+    assert scripts.helpers.align.align([20, 20], other, [1.0, 2.0, 2.0, 3.0]).tolist() == [2.0, 2.0]
+
+def test_empty_inputs():
+    assert scripts.helpers.align.match_indices([10, 20], []).tolist() == [-1, -1]
+    assert np.isnan(scripts.helpers.align.align([10, 20], [], [])).all()
+    assert scripts.helpers.align.match_indices([], [10, 20]).tolist() == []
+    assert scripts.helpers.align.align([], [10, 20], [1.0, 2.0]).tolist() == []
+
+def test_partly_overlapping_series_leave_nan_outside_tolerance():
+    times = [0, 50, 100, 150, 200]
+    values = scripts.helpers.align.align(times, [100, 150, 200, 250], [1.0, 2.0, 3.0, 4.0], tolerance=10)
+    assert np.isnan(values[:2]).all()
+    assert values[2:].tolist() == [1.0, 2.0, 3.0]
+
+def test_datetimes_match_their_unix_times():
+    times = [datetime.fromtimestamp(1_600_000_000), datetime.fromtimestamp(1_600_000_100)]
+    assert scripts.helpers.align.match_indices(times, [1_600_000_000, 1_600_000_090]).tolist() == [0, 1]
@@ -0,0 +1,48 @@
+'''
+eth_call cache namespaces
+'''
+
+import scripts.helpers.cache
+
+CALL = {'to': '0xAbC', 'data': '0x1234'}
+
+def test_namespaces_do_not_share_entries():
+    scripts.helpers.cache.save(CALL, 100, '0xlatest', 'latest')
+    assert scripts.helpers.cache.lookup(CALL, 100, 'pinned') is None
+    assert scripts.helpers.cache.lookup(CALL, 100, 'final') is None
+    assert scripts.helpers.cache.lookup(CALL, 100, 'latest') == '0xlatest'
+
+def test_final_entries_outlive_the_head():
+    scripts.helpers.cache.save(CALL, 100, '0xfinal', 'final')
+    assert scripts.helpers.cache.lookup(CALL, 250, 'final') == '0xfinal'
+    assert scripts.helpers.cache.lookup({'to': '0xabc', 'data': '0x1234'}, 7, 'final') == '0xfinal'
+
+def test_disk_tier_keeps_pinned_and_final(tmp_path, monkeypatch):
+    monkeypatch.setattr(scripts.helpers.cache, 'DISK_PATH', str(tmp_path / 'calls.db'))
+    monkeypatch.setattr(scripts.helpers.cache, '_disk', None)
+    scripts.helpers.cache.save(CALL, 100, '0xpinned', 'pinned')
+    scripts.helpers.cache.save(CALL, 100, '0xlatest', 'latest')
+    scripts.helpers.cache.clear()
+    assert scripts.helpers.cache.lookup(CALL, 100, 'pinned') == '0xpinned'
+    assert scripts.helpers.cache.lookup(CALL, 100, 'latest') is None
+
+def test_batch_call_with_final_skips_the_head_block(monkeypatch):
+    import scripts.helpers.contract
+    import scripts.tellor
+    sent = []
+    def send_batch(payload):
+        sent.append(payload)
+        return {call['id']: {'jsonrpc': '2.0', 'id': call['id'], 'result': '0x' + format(call['id'] * 100, '064x')} for call in payload}
+    def block_number():
+        raise AssertionError('the head block is not needed')
+    monkeypatch.setattr(scripts.helpers.contract, 'send_batch', send_batch)
+    monkeypatch.setattr(scripts.helpers.contract, 'block_number', block_number)
+    calls = [scripts.tellor.tellor_contract.functions.getTimestampbyRequestIDandIndex(1, index) for index in range(4)]
+    final = lambda function, timestamp: timestamp < 200
+    assert scripts.helpers.contract.batch_call(calls, final=final) == [0, 100, 200, 300]
+    assert all(call['params'][1] == 'latest' for call in sent[0])
+
+    # Finished rows come from the cache, the others are asked again
+    assert scripts.helpers.contract.batch_call(calls, final=final) == [0, 100, 200, 300]
+    assert [call['id'] for call in sent[1]] == [2, 3]
+    assert scripts.helpers.cache.stats['hits'] >= 2
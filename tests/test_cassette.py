@@ -0,0 +1,96 @@
+'''
+Cassette recording sessions
+'''
+
+import multiprocessing
+import time
+import pytest
+import scripts.helpers.cassette
+
+@pytest.fixture(autouse=True)
+def fresh_clock(monkeypatch):
+    monkeypatch.setenv(scripts.helpers.cassette.CLOCK_VARIABLE, '')
+    monkeypatch.setattr(scripts.helpers.cassette, '_clocks', {})
+
+def record(path, key):
+    cassette = scripts.helpers.cassette.Cassette(path, 'record', pool=object(), session=object())
+    cassette.append('rpc', key, 0.1, {'result': key})
+    cassette.save()
+
+def test_new_session_replaces_the_file(tmp_path):
+    path = str(tmp_path / 'session.json.gz')
+    record(path, 'first')
+    record(path, 'second')
+    assert list(scripts.helpers.cassette.Cassette(path).tapes['rpc']) == ['second']
+
+def test_workers_merge_into_the_session(tmp_path):
+    path = str(tmp_path / 'session.json.gz')
+    record(path, 'parent')
+    worker = multiprocessing.get_context('spawn').Process(target=record, args=(path, 'worker'))
+    worker.start()
+    worker.join()
+    assert sorted(scripts.helpers.cassette.Cassette(path).tapes['rpc']) == ['parent', 'worker']
+
+class TellorNode:
+    '''
+    Answers the Tellor reads of get_price_series: three values, ten minutes apart, the newest
+    a minute old, so only the oldest is past the dispute period when recorded
+    '''
+
+    def __init__(self):
+        import scripts.tellor
+        functions = scripts.tellor.tellor_contract.functions
+        self.selectors = {functions.getNewValueCountbyRequestId(0)._encode_transaction_data()[:10]: 'count',
+                          functions.getIndexForDataBefore(0, 0)._encode_transaction_data()[:10]: 'before',
+                          functions.getTimestampbyRequestIDandIndex(0, 0)._encode_transaction_data()[:10]: 'timestamp',
+                          functions.retrieveData(0, 0)._encode_transaction_data()[:10]: 'value'}
+        self.first = int(time.time()) - scripts.tellor.DISPUTE_PERIOD - 1200
+
+    def answer(self, call):
+        if call['method'] == 'eth_blockNumber':
+            return '0x10'
+        data = call['params'][0]['data']
+        args = [int(data[10 + 64 * i:74 + 64 * i], 16) for i in range((len(data) - 10) // 64)]
+        kind = self.selectors[data[:10]]
+        if kind == 'count':
+            words = [3]
+        elif kind == 'before':
+            words = [1, 0] if args[1] >= self.first else [0, 0]
+        elif kind == 'timestamp':
+            words = [self.first + 600 * args[1] + (scripts.tellor.DISPUTE_PERIOD if args[1] else 0)]
+        else:
+            words = [args[1] % 1000 + 5]
+        return '0x' + ''.join('%064x' % word for word in words)
+
+    def post(self, payload):
+        calls = payload if isinstance(payload, list) else [payload]
+        replies = [{'jsonrpc': '2.0', 'id': call['id'], 'result': self.answer(call)} for call in calls]
+        return replies if isinstance(payload, list) else replies[0]
+
+def test_replay_with_the_clock_moved_forward(tmp_path, monkeypatch, store):
+    import scripts.helpers.cache
+    import scripts.helpers.contract
+    import scripts.tellor
+    path = str(tmp_path / 'session.json.gz')
+    monkeypatch.setattr(scripts.helpers.cassette, 'PATH', path)
+    monkeypatch.setattr(scripts.helpers.cassette, 'MODE', 'record')
+    recorder = scripts.helpers.cassette.Cassette(path, 'record', pool=TellorNode(), session=object())
+    monkeypatch.setattr(scripts.helpers.contract, '_pool', recorder)
+    recorded = scripts.tellor.get_price_series('BTC/USD', None, 2)
+    settled = store.load_newest(scripts.tellor.STORE_NAME, str(scripts.tellor.feed_id('BTC/USD')), 10)
+    recorder.save()
+
+    # A week later, offline, with a fresh store and cache
+    wall_clock = time.time
+    monkeypatch.setattr(time, 'time', lambda: wall_clock() + 7 * 24 * 60 * 60)
+    monkeypatch.setattr(scripts.helpers.cassette, '_clocks', {})
+    monkeypatch.setattr(scripts.helpers.cassette, 'MODE', 'replay')
+    monkeypatch.setattr(scripts.helpers.contract, '_pool', scripts.helpers.cassette.Cassette(path))
+    monkeypatch.setattr(store, 'STORE_PATH', str(tmp_path / 'replay.db'))
+    monkeypatch.setattr(store, '_connection', None)
+    scripts.helpers.cache.clear()
+    replayed = scripts.tellor.get_price_series('BTC/USD', None, 2)
+    assert replayed.answers.tolist() == recorded.answers.tolist()
+    assert replayed.timestamps.tolist() == recorded.timestamps.tolist()
+    assert store.load_newest(scripts.tellor.STORE_NAME, str(scripts.tellor.feed_id('BTC/USD')), 10) == settled
+    assert len(settled) == 1
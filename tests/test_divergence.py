@@ -0,0 +1,72 @@
+'''
+Cross-oracle divergence
+'''
+
+import numpy as np
+import pytest
+import scripts.helpers.divergence
+
+def rounds(start, count, seed):
+    rng = np.random.default_rng(seed)
+    timestamps = start + np.cumsum(rng.integers(30, 900, count))
+    prices = 2000.0 + np.cumsum(rng.normal(0.0, 2.0, count))
+    return timestamps, prices
+
+FEEDS = {
+    'chainlink': rounds(1_600_000_000, 400, 1),
+    'tellor': rounds(1_600_003_000, 150, 2),
+    'band': rounds(1_599_990_000, 300, 3),
+}
+
+def full_rebuild():
+    divergence = scripts.helpers.divergence.Divergence('ETH/USD')
+    for name, (timestamps, prices) in FEEDS.items():
+        divergence.update(name, timestamps, prices)
+    return divergence
+
+def assert_same(incremental, rebuilt):
+    assert incremental.grid.tolist() == rebuilt.grid.tolist()
+    assert sorted(incremental.columns) == sorted(rebuilt.columns)
+    for name in rebuilt.columns:
+        np.testing.assert_array_equal(incremental.columns[name], rebuilt.columns[name])
+
+def test_incremental_updates_equal_a_full_rebuild():
+    incremental = scripts.helpers.divergence.Divergence('ETH/USD')
+    cuts = {name: np.linspace(0, len(timestamps), 7).astype(int) for name, (timestamps, _) in FEEDS.items()}
+    for batch in range(6):
+        for name, (timestamps, prices) in FEEDS.items():
+            low, high = cuts[name][batch], cuts[name][batch + 1]
+            incremental.update(name, timestamps[low:high], prices[low:high])
+    assert_same(incremental, full_rebuild())
+
+def test_rounds_already_seen_are_ignored():
+    divergence = full_rebuild()
+    for name, (timestamps, prices) in FEEDS.items():
+        divergence.update(name, timestamps[-50:], prices[-50:] + 100.0)
+    assert_same(divergence, full_rebuild())
+
+def test_columns_step_with_the_latest_round():
+    divergence = scripts.helpers.divergence.Divergence('ETH/USD', step=60)
+    divergence.update('a', [120, 300], [1.0, 2.0])
+    divergence.update('b', [60, 240], [1.5, 1.0])
+    assert divergence.grid.tolist() == [60, 120, 180, 240, 300]
+    assert np.isnan(divergence.columns['a'][0])
+    assert divergence.columns['a'][1:].tolist() == [1.0, 1.0, 1.0, 2.0]
+    assert divergence.columns['b'].tolist() == [1.5, 1.5, 1.5, 1.0, 1.0]
+    absolute, relative = divergence.spread()
+    assert np.isnan(absolute[0])
+    assert absolute[1:].tolist() == [0.5, 0.5, 0.0, 1.0]
+    assert relative[1:] == pytest.approx([0.4, 0.4, 0.0, 2 / 3])
+
+def test_rolling_and_windows_agree_with_the_spread():
+    divergence = full_rebuild()
+    spread = divergence.spread()[1]
+    width = scripts.helpers.divergence.WINDOW // divergence.step
+    peak, mean = divergence.rolling()
+    end = len(spread) - 1
+    assert peak[end] == pytest.approx(np.nanmax(spread[end - width + 1:]))
+    assert mean[end] == pytest.approx(np.nanmean(spread[end - width + 1:]))
+    assert np.isnan(peak[:width - 1]).all()
+    windows = divergence.windows()
+    assert len(windows) == -(-len(spread) // width)
+    assert max(row[1] for row in windows if not np.isnan(row[1])) == pytest.approx(divergence.summary()['max'])
@@ -0,0 +1,58 @@
+'''
+Chart downsampling
+'''
+
+import numpy as np
+import pytest
+import scripts.helpers.downsample
+
+def noisy_series(count, seed=7):
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.integers(1, 60, count))
+    values = rng.normal(100.0, 5.0, count)
+    values[count // 3] = 500.0
+    values[2 * count // 3] = -300.0
+    return times, values
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_point_budget_is_respected(method):
+    times, values = noisy_series(5000)
+    for max_points in [3, 10, 101, 1000]:
+        chosen = scripts.helpers.downsample.downsample_indices(times, values, max_points, method)
+        assert 0 < len(chosen) <= max_points
+        assert (np.diff(chosen) > 0).all()
+
+@pytest.mark.parametrize('method', ['lttb', 'minmax'])
+def test_short_series_are_untouched(method):
+    times, values = noisy_series(50)
+    assert scripts.helpers.downsample.downsample_indices(times, values, 50, method).tolist() == list(range(50))
+
+def test_lttb_keeps_both_ends_and_spikes():
+    times, values = noisy_series(5000)
+    chosen = scripts.helpers.downsample.downsample_indices(times, values, 200, 'lttb')
+    assert chosen[0] == 0 and chosen[-1] == len(times) - 1
+    assert np.argmax(values) in chosen
+    assert np.argmin(values) in chosen
+
+def test_minmax_keeps_the_extrema_of_every_bucket():
+    times, values = noisy_series(5000)
+    max_points = 100
+    chosen = scripts.helpers.downsample.downsample_indices(times, values, max_points, 'minmax')
+    edges = np.linspace(times[0], times[-1], max_points // 2 + 1)
+    for group in scripts.helpers.downsample.group_by_bucket(times, edges):
+        assert group[np.argmin(values[group])] in chosen
+        assert group[np.argmax(values[group])] in chosen
+
+def test_shared_span_gives_one_grid():
+    times_a, values_a = noisy_series(3000, seed=1)
+    times_b = times_a[len(times_a) // 2:]
+    span = scripts.helpers.downsample.common_span([times_a, times_b, []])
+    assert span == (times_a[0], times_a[-1])
+    thinned, _ = scripts.helpers.downsample.downsample(times_b, values_a[len(times_a) // 2:], 100, 'minmax', span)
+    assert len(thinned) <= 100
+    assert thinned[0] >= times_b[0] and thinned[-1] <= times_b[-1]
+
+def test_unknown_method():
+    times, values = noisy_series(100)
+    with pytest.raises(ValueError):
+        scripts.helpers.downsample.downsample_indices(times, values, 10, 'mean')
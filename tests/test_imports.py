@@ -0,0 +1,31 @@
+'''
+Lazy imports from many threads at once
+'''
+
+import subprocess
+import sys
+import tests.conftest
+
+PROBE = '''
+import threading
+import scripts.band, scripts.tellor
+import scripts.helpers.contract
+errors = []
+def run(step):
+    try:
+        step()
+    except Exception as error:
+        errors.append(repr(error))
+steps = [scripts.helpers.contract.get_pool, scripts.helpers.contract.get_web3,
+         lambda: scripts.tellor.tellor_contract.functions, lambda: scripts.band.band_contract.functions] * 3
+threads = [threading.Thread(target=run, args=(step,)) for step in steps]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(errors)
+'''
+
+def test_first_requests_from_many_threads():
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=tests.conftest.ROOT, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,62 @@
+'''
+Event-log ingestion against mock contracts on a local chain
+'''
+
+import time
+from eth_abi import encode_abi
+from eth_utils import event_abi_to_log_topic
+import scripts.chainlink
+import scripts.dia
+import scripts.helpers.contract
+import scripts.helpers.logs
+import tests.localchain
+
+def topic(abi_path, name):
+    event = [item for item in scripts.helpers.contract.get_abi(abi_path) if item.get('type') == 'event' and item['name'] == name][0]
+    return event_abi_to_log_topic(event)
+
+def word(value, kind='uint256'):
+    return encode_abi([kind], [value])
+
+def test_chainlink_rounds_from_events(chain, use_rpc, store):
+    use_rpc(chain.url)
+    aggregator = chain.deploy(tests.localchain.emitter(3))
+    first = chain.block_number()
+    now = int(time.time())
+    for round_num, answer in [(1, 100), (2, -5), (3, 300)]:
+        started = topic(scripts.chainlink.ABI_PATH, 'NewRound') + word(round_num) + word('0x' + '00' * 20, 'address') + word(now - 10 * (4 - round_num))
+        chain.transact(aggregator, '0x' + started.hex())
+        updated = topic(scripts.chainlink.ABI_PATH, 'AnswerUpdated') + word(answer, 'int256') + word(round_num) + word(now - 5 * (4 - round_num))
+        chain.transact(aggregator, '0x' + updated.hex())
+
+    # The mock answers phaseAggregators() with its own address, so it is proxy and aggregator at once
+    assert scripts.chainlink.ingest_logs(aggregator, first, 'latest', phase=1) == 3
+    offset = 1 << scripts.chainlink.PHASE_OFFSET
+    rows = store.load_range(scripts.chainlink.STORE_NAME, aggregator.lower(), offset, offset + 10)
+    assert [row[0] - offset for row in rows] == [1, 2, 3]
+    assert [row[1] for row in rows] == [100, -5, 300]
+    assert rows[0][2] == now - 30 and rows[0][3] == now - 15
+
+def test_dia_sync_is_incremental(chain, use_rpc, store, monkeypatch):
+    use_rpc(chain.url)
+    contract = chain.deploy(tests.localchain.emitter(1))
+    monkeypatch.setattr(scripts.dia, 'ADDRESS', contract)
+    monkeypatch.setattr(scripts.dia, 'dia_contract', scripts.helpers.contract.LazyContract('contracts/dia.json', contract))
+    monkeypatch.setattr(scripts.helpers.logs, 'CONFIRMATIONS', 0)
+    new_coin_info = topic('contracts/dia.json', 'newCoinInfo')
+    now = int(time.time())
+
+    def update(price, timestamp):
+        data = encode_abi(['string', 'string', 'uint256', 'uint256', 'uint256'], ['Bitcoin', 'BTC', price, 0, timestamp])
+        chain.transact(contract, '0x' + (new_coin_info + data).hex())
+
+    update(5000000000, now - 7200)
+    update(5100000000, now - 3600)
+    assert scripts.dia.sync_logs(1) == 2
+    assert scripts.dia.sync_logs(1) == 0
+    update(5200000000, now - 60)
+    assert scripts.dia.sync_logs(1) == 1
+
+    series = scripts.dia.get_history_series('BTC/USD', 1)
+    assert list(series.timestamps) == [now - 7200, now - 3600, now - 60]
+    assert list(series.prices) == [50000.0, 51000.0, 52000.0]
@@ -0,0 +1,31 @@
+'''
+Dashboard read paths, which only look at the local store
+'''
+
+import scripts.chainlink
+import scripts.helpers.store
+
+PHASE = 1 << scripts.chainlink.PHASE_OFFSET
+
+def test_chainlink_reads_are_empty_before_the_first_sync():
+    assert len(scripts.chainlink.read_price_series('BTC/USD', 30)) == 0
+    assert len(scripts.chainlink.read_time_series('BTC/USD', 10)) == 0
+
+def test_chainlink_reads_use_stored_decimals():
+    address = scripts.chainlink.feed_address('BTC/USD').lower()
+    now = 2000000000
+    scripts.helpers.store.save_rounds(scripts.chainlink.STORE_NAME, address, [[PHASE + 1, 5000000, now - 60, now - 60, PHASE + 1],
+                                                                             [PHASE + 2, 6000000, now, now, PHASE + 2]])
+    scripts.helpers.store.save_value(scripts.chainlink.STORE_NAME, 'BTC/USD', 'decimals', 5, None, now)
+    series = scripts.chainlink.read_time_series('BTC/USD', 10)
+    assert series.prices.tolist() == [50.0, 60.0]
+
+def test_collector_sync_of_an_empty_feed_saves_nothing(monkeypatch):
+    import scripts.collector
+    import scripts.tellor
+    monkeypatch.setattr(scripts.tellor, 'sync_history', lambda id_num, num_rounds: -1)
+    monkeypatch.setattr(scripts.chainlink, 'sync_history', lambda address, num_rounds: [0, 0, 0, 0, 0, 8])
+    assert scripts.collector.sync('tellor', 'ETH/USD') == []
+    assert scripts.collector.sync('chainlink', 'BTC/USD') == []
+    assert scripts.helpers.store.load_values('price') == {}
+    assert len(scripts.chainlink.read_time_series('BTC/USD', 10)) == 0
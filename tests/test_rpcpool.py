@@ -0,0 +1,84 @@
+'''
+Endpoint pool behaviour against stand-in JSON-RPC servers
+'''
+
+import time
+import pytest
+import requests
+import scripts.helpers.rpcpool
+from tests.stubrpc import StubEndpoint
+
+REQUEST = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_blockNumber', 'params': []}
+
+@pytest.fixture
+def stubs():
+    made = []
+    def make(*args, **kwargs):
+        made.append(StubEndpoint(*args, **kwargs))
+        return made[-1]
+    yield make
+    for stub in made:
+        stub.close()
+
+@pytest.fixture(autouse=True)
+def quick(monkeypatch):
+    monkeypatch.setattr(scripts.helpers.rpcpool, 'RETRY_DELAY', 0.01)
+    monkeypatch.setattr(scripts.helpers.rpcpool, 'BACKOFF', 0.05)
+
+def test_single_endpoint_retries_after_429(stubs):
+    stub = stubs([(429, {}, 0), (429, {}, 0)])
+    pool = scripts.helpers.rpcpool.Pool([stub.url])
+    assert pool.post(REQUEST)['result'] == '0x3'
+    assert pool.status()[0]['rate_limited'] == 2
+
+    # The second 429 doubles the rest, and the retry waited it out
+    assert stub.requests[2] - stub.requests[1] >= 0.1
+
+def test_single_endpoint_honours_retry_after(stubs):
+    stub = stubs([(429, {'Retry-After': '0.3'}, 0)])
+    pool = scripts.helpers.rpcpool.Pool([stub.url])
+    start = time.monotonic()
+    assert pool.post(REQUEST)['result'] == '0x2'
+    assert time.monotonic() - start >= 0.3
+
+def test_single_endpoint_retries_server_errors(stubs):
+    stub = stubs([(502, {}, 0), (503, {}, 0)])
+    pool = scripts.helpers.rpcpool.Pool([stub.url])
+    assert pool.post(REQUEST)['result'] == '0x3'
+
+def test_retries_are_bounded(stubs):
+    stub = stubs([(500, {}, 0)] * 20)
+    pool = scripts.helpers.rpcpool.Pool([stub.url])
+    with pytest.raises(requests.HTTPError):
+        pool.post(REQUEST)
+    assert len(stub.requests) == scripts.helpers.rpcpool.RETRIES + 1
+
+def test_client_errors_are_not_retried(stubs):
+    stub = stubs([(400, {}, 0)] * 5)
+    pool = scripts.helpers.rpcpool.Pool([stub.url])
+    with pytest.raises(requests.HTTPError):
+        pool.post(REQUEST)
+    assert len(stub.requests) == 1
+
+def test_fails_over_to_the_next_endpoint(stubs):
+    broken, healthy = stubs([(500, {}, 0)] * 5), stubs()
+    pool = scripts.helpers.rpcpool.Pool([broken.url, healthy.url])
+    for _ in range(5):
+        assert 'result' in pool.post(REQUEST)
+    assert len(healthy.requests) == 5
+
+def test_slow_endpoint_is_hedged(stubs):
+    slow, fast = stubs(delay=2.0), stubs()
+    pool = scripts.helpers.rpcpool.Pool([slow.url, fast.url])
+    start = time.monotonic()
+    assert 'result' in pool.post(REQUEST)
+    assert time.monotonic() - start < 1.5
+    assert sum(endpoint['hedges'] for endpoint in pool.status()) == 1
+
+def test_token_bucket_caps_the_rate(stubs):
+    stub = stubs()
+    pool = scripts.helpers.rpcpool.Pool([stub.url], rate=20)
+    start = time.monotonic()
+    for _ in range(40):
+        pool.post(REQUEST)
+    assert time.monotonic() - start >= 0.8
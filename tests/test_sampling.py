@@ -0,0 +1,22 @@
+'''
+Evenly spaced sampling of rounds and value indices
+'''
+
+import scripts.chainlink
+import scripts.tellor
+
+PHASE = 1 << scripts.chainlink.PHASE_OFFSET
+
+def test_sample_rounds_spans_phases():
+    ranges = [[2, 1, 100], [1, 1, 50]]
+    assert scripts.chainlink.sample_rounds(ranges, PHASE + 10, 3) == [2 * PHASE + 100, 2 * PHASE + 30, PHASE + 10]
+
+def test_sample_rounds_with_one_value_or_none():
+    ranges = [[2, 1, 100], [1, 1, 50]]
+    assert scripts.chainlink.sample_rounds(ranges, PHASE + 10, 1) == [2 * PHASE + 100]
+    assert scripts.chainlink.sample_rounds(ranges, PHASE + 10, 0) == []
+
+def test_sample_indices_with_one_value_or_none():
+    assert scripts.tellor.sample_indices(0, 99, 3) == [99, 49, 0]
+    assert scripts.tellor.sample_indices(0, 99, 1) == [99]
+    assert scripts.tellor.sample_indices(0, 99, 0) == []
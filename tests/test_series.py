@@ -0,0 +1,22 @@
+'''
+Round series columns
+'''
+
+import numpy as np
+import scripts.helpers.series
+
+PHASE = 1 << scripts.helpers.series.PHASE_OFFSET
+
+def test_small_answers_are_int64():
+    series = scripts.helpers.series.RoundSeries.from_rows([[PHASE + 2, 200, 0, 20], [PHASE + 1, 100, 0, 10]], 2)
+    assert series.answers.dtype == np.int64
+    assert series.prices.tolist() == [1.0, 2.0]
+
+def test_answers_past_int64_are_kept_exactly():
+    # An 18-decimal feed (e.g. AMPL/USD) at a price above 9.22 passes 2 ** 63
+    answers = [12 * 10 ** 18, 2 ** 255]
+    series = scripts.helpers.series.RoundSeries.from_rows([[PHASE + 1, answers[0], 0, 10], [PHASE + 2, answers[1], 0, 20]], 18)
+    assert series.answers.tolist() == answers
+    assert series.prices.dtype == np.float64
+    assert series.prices[0] == 12.0
+    assert series[1:].answers.tolist() == answers[1:]
@@ -0,0 +1,103 @@
+'''
+Streaming interval statistics
+'''
+
+import random
+import numpy as np
+import pytest
+import scripts.helpers.stats
+
+RANK_ERROR = 0.03 # Allowed quantile rank error, well above the sketch's ~1.7 / k
+
+@pytest.fixture(autouse=True)
+def seeded():
+    random.seed(11)
+
+def intervals(count, seed=3):
+    return np.random.default_rng(seed).exponential(90.0, count)
+
+def rank(values, estimate):
+    return np.searchsorted(np.sort(values), estimate, side='right') / len(values)
+
+def test_moments_match_numpy():
+    values = intervals(10000)
+    moments = scripts.helpers.stats.Moments()
+    for value in values:
+        moments.update(value)
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(np.mean(values))
+    assert moments.std == pytest.approx(np.std(values))
+    assert (moments.low, moments.high) == (values.min(), values.max())
+
+def test_merged_moments_equal_one_pass():
+    values = intervals(5000)
+    parts = [scripts.helpers.stats.Moments() for _ in range(3)]
+    for part, chunk in zip(parts, np.array_split(values, [100, 4000])):
+        for value in chunk:
+            part.update(value)
+    merged = scripts.helpers.stats.Moments().merge(parts[0]).merge(parts[1]).merge(parts[2])
+    assert merged.count == len(values)
+    assert merged.mean == pytest.approx(np.mean(values))
+    assert merged.variance == pytest.approx(np.var(values))
+    assert (merged.low, merged.high) == (values.min(), values.max())
+
+def test_sketch_quantiles_are_within_rank_error():
+    values = intervals(50000)
+    sketch = scripts.helpers.stats.QuantileSketch()
+    for value in values:
+        sketch.update(value)
+    assert sketch.count == len(values)
+    assert sketch.size() < 4 * sketch.k
+    for q in [0.01, 0.25, 0.5, 0.9, 0.99]:
+        assert abs(rank(values, sketch.quantile(q)) - q) <= RANK_ERROR
+
+def test_merged_sketches_are_within_rank_error():
+    values = intervals(40000)
+    sketches = []
+    for chunk in np.array_split(values, 4):
+        sketch = scripts.helpers.stats.QuantileSketch()
+        for value in chunk:
+            sketch.update(value)
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.count == len(values)
+    for q in [0.05, 0.5, 0.95]:
+        assert abs(rank(values, merged.quantile(q)) - q) <= RANK_ERROR
+
+def test_empty_sketch():
+    assert np.isnan(scripts.helpers.stats.QuantileSketch().quantile(0.5))
+
+def test_histograms_add_up():
+    values = intervals(2000)
+    halves = [scripts.helpers.stats.Histogram(), scripts.helpers.stats.Histogram()]
+    for half, chunk in zip(halves, np.array_split(values, 2)):
+        for value in chunk:
+            half.update(value)
+    merged = halves[0].merge(halves[1])
+    counts, _ = np.histogram(values, bins=merged.edges)
+    assert merged.counts == counts.tolist()
+    assert merged.overflow == int((values >= merged.edges[-1]).sum())
+    with pytest.raises(ValueError):
+        merged.merge(scripts.helpers.stats.Histogram(width=30))
+
+def test_interval_stats_round_trip_and_merge():
+    timestamps = np.cumsum(np.rint(intervals(3001)).astype(int)) + 1_600_000_000
+    whole = scripts.helpers.stats.from_timestamps('chainlink', 'ETH/USD', timestamps)
+    gaps = np.diff(timestamps)
+    assert whole.moments.count == len(gaps)
+    assert whole.moments.mean == pytest.approx(gaps.mean())
+
+    # Newest first gives the same gaps
+    backwards = scripts.helpers.stats.from_timestamps('chainlink', 'ETH/USD', timestamps[::-1])
+    assert backwards.moments.mean == pytest.approx(gaps.mean())
+
+    # Two stretches sharing their boundary update merge into the whole history
+    first = scripts.helpers.stats.from_timestamps('chainlink', 'ETH/USD', timestamps[:1001])
+    second = scripts.helpers.stats.from_timestamps('chainlink', 'ETH/USD', timestamps[1000:])
+    (restored,) = scripts.helpers.stats.loads(scripts.helpers.stats.dumps([first.merge(second)]))
+    assert restored.moments.count == len(gaps)
+    assert restored.moments.std == pytest.approx(gaps.std())
+    assert restored.histogram.counts == whole.histogram.counts
+    assert abs(rank(gaps, restored.summary()['p95']) - 0.95) <= RANK_ERROR